@@ -0,0 +1,210 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""
+Benchmark offline das ETAPAS 5-10 do dublar_tech_v2 com entradas sintéticas
+(ASR/MT/TTS substituídos por fakes determinísticos, ver fixtures.py)
+
+Mede split, fade, sync, concat, pós-processo e mux em 100/1k/10k segmentos
+e grava um JSON comparável entre commits (tempo, CPU, RSS, subprocessos, E/S)
+Sem ffmpeg no PATH as ETAPAS 9-10 (e o render concat) são puladas e marcadas;
+--render onepass sem ffmpeg mede a renderização única gravando só o dub_raw.wav
+
+Uso:
+    python benchmarks/bench_pipeline.py [--sizes 100,1000,10000] [--sync smart]
+        [--render timeline] [--audio-engine numpy] [--out resultado.json]
+        [--compare resultado_anterior.json] [--keep] [--verbose]
+
+Atenção: 10k segmentos geram ~1.5GB de WAVs temporários
+"""
+
+import io, os, sys, json, time, shutil, platform, tempfile, argparse, subprocess, contextlib
+from datetime import datetime
+from pathlib import Path
+
+ROOT = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(ROOT))
+sys.path.insert(0, str(Path(__file__).resolve().parent))
+
+import numpy as np
+import dub_audio, dub_metrics
+import dublar_tech_v2 as d
+from fixtures import fake_asr, fake_translate, fake_tts, make_source_wav, make_video, have_ffmpeg
+
+def git_commit():
+    try:
+        rev = subprocess.check_output(["git", "rev-parse", "--short", "HEAD"], cwd=ROOT, text=True).strip()
+        dirty = subprocess.check_output(["git", "status", "--porcelain", "--untracked-files=no"],
+                                        cwd=ROOT, text=True).strip()
+        return rev + ("-dirty" if dirty else "")
+    except Exception:
+        return "desconhecido"
+
+def run_size(n, args, root):
+    work = Path(root, f"n{n}")
+    shutil.rmtree(work, ignore_errors=True)
+    work.mkdir(parents=True)
+    sr = 24000
+
+    # Fixtures (fora da medição): áudio original, vídeo e segmentos
+    segs = fake_asr(n, seed=args.seed, maxdur=args.maxdur)
+    translations = fake_translate(segs, seed=args.seed)
+    audio_src = make_source_wav(Path(work, "audio_src.wav"), segs, seed=args.seed)
+    total_duration = d.ffprobe_duration(audio_src)
+    video = make_video(Path(work, "video.mp4"), total_duration) if have_ffmpeg() else None
+
+    rec = dub_metrics.Recorder(job=f"n{n}")
+    skipped = []
+    out = io.StringIO()
+    with contextlib.redirect_stdout(sys.stdout if args.verbose else out):
+        with rec.stage("4_traducao_fake"):
+            segs_trad = [d.build_translated_segment(s, t, "pt", simplify=True) for s, t in zip(segs, translations)]
+
+        with rec.stage("vad_pausas"):
+            pause_index = dub_audio.PauseIndex(d.detect_speech_pauses(audio_src, min_silence_dur=0.3))
+
+        with rec.stage("5_split"):
+            segs_split = d.split_long_segments_vad(segs_trad, args.maxdur, pause_index=pause_index)
+
+        with rec.stage("6_tts_fake"):
+            seg_files = fake_tts(segs_split, work, sr=sr, seed=args.seed)
+
+        if args.render == "onepass":
+            with rec.stage("6.1-9_onepass"):
+                dub_final, _ = d.render_onepass(seg_files, segs_split, work, sr, sr, fade=args.fade, sync=args.sync,
+                                                tol=args.tolerance, maxstretch=args.maxstretch,
+                                                total_duration=total_duration,
+                                                postprocess=have_ffmpeg() and args.loudnorm == "dynamic",
+                                                pause_index=pause_index)
+                if have_ffmpeg() and args.loudnorm == "measured":
+                    dub_final = d.postprocess_audio(dub_final, work, sr, loudnorm="measured")
+            if have_ffmpeg():
+                with rec.stage("10_mux"):
+                    d.mux_video(video, dub_final, Path(work, "dublado.mp4"), "128k")
+            else:
+                skipped += ["pós-processo do onepass (ffmpeg ausente)", "10_mux (ffmpeg ausente)"]
+            return finish(n, rec, work, segs_split, total_duration, skipped, args)
+
+        with rec.stage("6.1_fade"):
+            xf_files = []
+            for i, p in enumerate(seg_files, 1):
+                xf = Path(work, f"seg_{i:04d}_xf.wav")
+                t0 = time.perf_counter()
+                d.safe_fade(p, xf, work, args.fade)
+                rec.segment("fade", i, time.perf_counter() - t0)
+                xf_files.append(xf)
+
+        with rec.stage("7_sync"):
+            if args.sync == "elastic":
+                data = [(p, max(0.05, s["end"] - s["start"]), s) for p, s in zip(xf_files, segs_split)]
+                fixed = [r[0] for r in d.sync_elastic(data, work, sr, args.tolerance, args.maxstretch,
+                                                      pause_index=pause_index, total_duration=total_duration)]
+            else:
+                fixed = []
+                for i, (p, s) in enumerate(zip(xf_files, segs_split), 1):
+                    target = max(0.05, s["end"] - s["start"])
+                    t0 = time.perf_counter()
+                    synced, ratio = d.sync_segment(p, target, args.sync, work, sr, args.tolerance, args.maxstretch)
+                    rec.segment("sync", i, time.perf_counter() - t0, ratio=round(ratio, 4))
+                    fixed.append(synced)
+
+        if args.render == "concat" and not have_ffmpeg():
+            skipped.append("8_concat (ffmpeg ausente)")
+            dub_raw = None
+        else:
+            with rec.stage("8_concat"):
+                dub_raw = d.concat_segments(fixed, work, sr, segs_trad=segs_split, preserve_gaps=True,
+                                            render=args.render, total_duration=total_duration)
+
+        if dub_raw is not None and have_ffmpeg():
+            with rec.stage("9_posprocesso"):
+                dub_final = d.postprocess_audio(dub_raw, work, sr, loudnorm=args.loudnorm)
+            with rec.stage("10_mux"):
+                d.mux_video(video, dub_final, Path(work, "dublado.mp4"), "128k")
+        else:
+            skipped += ["9_posprocesso (ffmpeg ausente)", "10_mux (ffmpeg ausente)"]
+
+    return finish(n, rec, work, segs_split, total_duration, skipped, args)
+
+def finish(n, rec, work, segs_split, total_duration, skipped, args):
+    summary = rec.summary()
+    rec.close()
+    if not args.keep:
+        shutil.rmtree(work, ignore_errors=True)
+    return {"segments_in": n, "segments_split": len(segs_split), "audio_s": round(total_duration, 2),
+            "total_wall_s": summary["total_wall_s"], "stages": summary["stages"],
+            "segments": summary["segments"], "skipped": skipped}
+
+def compare(old_path, new):
+    with open(old_path, "r", encoding="utf-8") as f:
+        old = json.load(f)
+    print(f"\nComparação com {old_path} ({old['meta'].get('commit')} -> {new['meta'].get('commit')})")
+    print(f"  {'segmentos':>9}  {'etapa':<16} {'antes':>9} {'agora':>9} {'razão':>7}")
+    for n, res in new["results"].items():
+        prev = old["results"].get(n)
+        if not prev:
+            continue
+        for stage, m in res["stages"].items():
+            a = prev["stages"].get(stage, {}).get("wall_s")
+            if a is None:
+                continue
+            b = m["wall_s"]
+            ratio = f"{b / a:>6.2f}x" if a >= 0.001 else "     -"
+            print(f"  {n:>9}  {stage:<16} {a:>8.3f}s {b:>8.3f}s {ratio}")
+
+def main():
+    ap = argparse.ArgumentParser(description="Benchmark offline das ETAPAS 5-10 (fixtures sintéticas)")
+    ap.add_argument("--sizes", default="100,1000,10000", help="Números de segmentos, separados por vírgula")
+    ap.add_argument("--sync", choices=["none","fit","pad","smart","elastic"], default="smart")
+    ap.add_argument("--render", choices=["concat","timeline","onepass"], default="timeline")
+    ap.add_argument("--loudnorm", choices=["dynamic","measured"], default="dynamic")
+    ap.add_argument("--audio-engine", choices=["numpy","ffmpeg"], default="numpy")
+    ap.add_argument("--tolerance", type=float, default=0.0)
+    ap.add_argument("--maxstretch", type=float, default=2.0)
+    ap.add_argument("--maxdur", type=float, default=10.0)
+    ap.add_argument("--fade", type=float, default=0.02)
+    ap.add_argument("--seed", type=int, default=42)
+    ap.add_argument("--workdir", default=None, help="Onde gerar os arquivos (padrão: diretório temporário)")
+    ap.add_argument("--keep", action="store_true", help="Mantém os arquivos gerados")
+    ap.add_argument("--out", default=None, help="Arquivo JSON de saída (padrão: benchmarks/results/)")
+    ap.add_argument("--compare", default=None, help="JSON de uma execução anterior para comparar")
+    ap.add_argument("--verbose", action="store_true", help="Mostra a saída das etapas")
+    args = ap.parse_args()
+
+    if args.audio_engine == "ffmpeg" and not have_ffmpeg():
+        print("--audio-engine ffmpeg exige ffmpeg no PATH"); sys.exit(1)
+    d.AUDIO_ENGINE = args.audio_engine
+    sizes = [int(x) for x in args.sizes.split(",") if x.strip()]
+    root = Path(args.workdir) if args.workdir else Path(tempfile.mkdtemp(prefix="dublar_bench_"))
+
+    commit = git_commit()
+    meta = {"commit": commit, "timestamp": datetime.now().isoformat(timespec="seconds"),
+            "python": platform.python_version(), "platform": platform.platform(),
+            "numpy": np.__version__, "cpu_count": os.cpu_count(), "ffmpeg": have_ffmpeg(),
+            "args": {k: v for k, v in vars(args).items() if k not in ("out", "compare", "workdir")}}
+
+    results = {}
+    for n in sizes:
+        print(f"\n=== {n} segmentos ===")
+        res = run_size(n, args, root)
+        results[str(n)] = res
+        for stage, m in res["stages"].items():
+            print(f"  {stage:<16} {m['wall_s']:>8.3f}s  CPU {m['cpu_s']:>7.2f}s  "
+                  f"subproc {m['subprocess_count']:>6}  RSS {m['process_peak_rss_mb']} MB")
+        for s in res["skipped"]:
+            print(f"  [SKIP] {s}")
+    if not args.workdir and not args.keep:
+        shutil.rmtree(root, ignore_errors=True)
+
+    data = {"meta": meta, "results": results}
+    out = Path(args.out) if args.out else Path(ROOT, "benchmarks", "results",
+                                                    f"bench_{commit}_{datetime.now():%Y%m%d_%H%M%S}.json")
+    out.parent.mkdir(parents=True, exist_ok=True)
+    with open(out, "w", encoding="utf-8") as f:
+        json.dump(data, f, ensure_ascii=False, indent=2)
+    print(f"\nResultados: {out}")
+
+    if args.compare:
+        compare(args.compare, data)
+
+if __name__ == "__main__":
+    main()
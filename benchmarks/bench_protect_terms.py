@@ -0,0 +1,81 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""
+Micro-benchmark: protect_technical_terms (matcher único) vs implementação antiga
+(um regex por termo + reconstrução da string a cada ocorrência)
+
+Uso:
+    python benchmarks/bench_protect_terms.py [--segments 1000] [--repeat 5]
+"""
+
+import re, sys, time, random, argparse
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+from dublar_tech_v2 import (PRESERVE_TERMS, TECH_GLOSSARY, protect_technical_terms,
+                            restore_technical_terms, canonical_protected_text)
+
+def protect_technical_terms_legacy(text):
+    """Cópia da versão anterior, usada como referência"""
+    protected = text
+    replacements = {}
+    for i, term in enumerate(sorted(PRESERVE_TERMS, key=len, reverse=True)):
+        pattern = r'\b' + re.escape(term) + r'\b'
+        matches = list(re.finditer(pattern, protected, re.IGNORECASE))
+        for match in reversed(matches):
+            original = match.group()
+            placeholder = f"__TECH{i:03d}__"
+            replacements[placeholder] = original
+            protected = protected[:match.start()] + placeholder + protected[match.end():]
+    return protected, replacements
+
+def make_transcript(n, seed=42):
+    """Transcrição sintética: frases comuns misturadas com termos técnicos"""
+    rng = random.Random(seed)
+    filler = ("now we are going to open the file and then we check if the value "
+              "is correct so let me show you how this works in practice").split()
+    terms = sorted(PRESERVE_TERMS | set(TECH_GLOSSARY))
+    segs = []
+    for _ in range(n):
+        words = []
+        for _ in range(rng.randint(8, 30)):
+            w = rng.choice(terms) if rng.random() < 0.25 else rng.choice(filler)
+            words.append(w.upper() if rng.random() < 0.05 else w)
+        segs.append(" ".join(words) + ".")
+    return segs
+
+def bench(fn, segs, repeat):
+    best = float("inf")
+    for _ in range(repeat):
+        t0 = time.perf_counter()
+        for s in segs:
+            fn(s)
+        best = min(best, time.perf_counter() - t0)
+    return best
+
+def main():
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--segments", type=int, default=1000)
+    ap.add_argument("--repeat", type=int, default=5)
+    args = ap.parse_args()
+
+    segs = make_transcript(args.segments)
+
+    # Mesma semântica: mesmos termos protegidos e restauração idêntica
+    # (a numeração dos placeholders pode diferir em empates de tamanho)
+    for s in segs:
+        new_p, new_r = protect_technical_terms(s)
+        old_p, old_r = protect_technical_terms_legacy(s)
+        assert canonical_protected_text(new_p, new_r) == canonical_protected_text(old_p, old_r), s
+        assert restore_technical_terms(new_p, new_r) == restore_technical_terms(old_p, old_r), s
+
+    t_old = bench(protect_technical_terms_legacy, segs, args.repeat)
+    t_new = bench(protect_technical_terms, segs, args.repeat)
+
+    print(f"Segmentos: {len(segs)} | Termos: {len(PRESERVE_TERMS)}")
+    print(f"  Antigo (regex por termo): {t_old*1000:8.1f} ms")
+    print(f"  Novo (matcher único):     {t_new*1000:8.1f} ms")
+    print(f"  Speedup: {t_old / max(t_new, 1e-9):.1f}x")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,109 @@
+# -*- coding: utf-8 -*-
+"""
+Fixtures sintéticas e fakes determinísticos para os benchmarks
+- make_source_wav: "fala" (ruído modulado) com silêncios entre segmentos e pausas internas
+- fake_asr / fake_translate: segmentos e traduções sem Whisper/M2M100
+- fake_tts: seg_XXXX.wav senoidais com duração proporcional ao texto
+- make_video: vídeo minúsculo via lavfi (None se não houver ffmpeg)
+Tudo derivado de uma seed: mesmas entradas em qualquer máquina/commit
+"""
+
+import sys, random, shutil, subprocess
+from pathlib import Path
+import numpy as np
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+import dub_audio
+
+WORDS_EN = ("now we open the file and check if the value is correct so let me show "
+            "you how this function works with the array and the database query").split()
+WORDS_PT = ("agora abrimos o arquivo e verificamos se o valor está correto então vou "
+            "mostrar como esta função funciona com o array e a query do banco").split()
+
+def fake_asr(n, seed=42, maxdur=10.0):
+    """
+    n segmentos com timestamps crescentes
+    ~4% são longos (> maxdur, >= 16 palavras) para exercitar o split
+    """
+    rng = random.Random(seed)
+    segs, t = [], 0.5
+    for i in range(n):
+        if rng.random() < 0.04:
+            dur = maxdur + rng.uniform(1.0, 4.0)
+            words = rng.randint(24, 40)
+        else:
+            dur = rng.uniform(0.6, 1.6)
+            words = max(2, int(dur * rng.uniform(2.0, 3.2)))
+        text = " ".join(rng.choice(WORDS_EN) for _ in range(words)) + "."
+        segs.append({"start": round(t, 3), "end": round(t + dur, 3), "text": text})
+        t += dur + rng.uniform(0.15, 0.5)
+    return segs
+
+def fake_translate(segs, seed=42):
+    """Tradução determinística: palavras em português, mesmo número de palavras ±10%"""
+    rng = random.Random(seed + 1)
+    out = []
+    for s in segs:
+        words = s["text"].rstrip(".").split()
+        n = max(1, int(len(words) * rng.uniform(0.9, 1.1)))
+        out.append(" ".join(rng.choice(WORDS_PT) for _ in range(n)) + ".")
+    return out
+
+def make_source_wav(path, segs, sr=16000, seed=42, block_s=60.0):
+    """
+    Áudio "original" em blocos (não aloca o arquivo inteiro):
+    ruído modulado dentro dos segmentos (pausas de 0.4s a cada ~3s nos longos), quase silêncio fora
+    """
+    rng = np.random.default_rng(seed)
+    total = segs[-1]["end"] + 1.0 if segs else 1.0
+    n = int(total * sr)
+    starts = np.array([s["start"] for s in segs])
+    ends = np.array([s["end"] for s in segs])
+    path = Path(path)
+    tmp = path.with_name(path.name + ".tmp")
+    block = int(block_s * sr)
+    with open(tmp, "wb") as f:
+        f.write(dub_audio.wav_header_pcm16(n, sr))
+        for b0 in range(0, n, block):
+            t = (np.arange(b0, min(b0 + block, n)) / sr)
+            i = np.searchsorted(starts, t, side="right") - 1
+            inside = (i >= 0) & (t < ends[np.clip(i, 0, None)])
+            # pausas internas: 0.4s a cada 3s dentro do segmento
+            rel = t - starts[np.clip(i, 0, None)]
+            inside &= ~((rel % 3.0) > 2.6)
+            env = 0.25 * (0.6 + 0.4 * np.sin(2 * np.pi * 4.0 * t))
+            y = rng.standard_normal(len(t)) * np.where(inside, env, 0.002)
+            f.write(dub_audio._pcm16(y).tobytes())
+    tmp.replace(path)
+    return path
+
+def fake_tts(segs_trad, workdir, sr=24000, seed=42, wps=2.5):
+    """
+    seg_XXXX.wav determinísticos: senoide (frequência por índice) com envelope
+    Duração = palavras / wps com ±35% de variação: mistura casos de pad, fit e tolerância
+    """
+    rng = random.Random(seed + 2)
+    files = []
+    for i, s in enumerate(segs_trad, 1):
+        words = len((s.get("text_trad") or "").split()) or 1
+        dur = max(0.2, words / wps * rng.uniform(0.65, 1.35))
+        t = np.arange(int(dur * sr)) / sr
+        f0 = 160.0 + (i % 7) * 15.0
+        y = 0.3 * np.sin(2 * np.pi * f0 * t) * (0.7 + 0.3 * np.sin(2 * np.pi * 3.0 * t))
+        out = Path(workdir, f"seg_{i:04d}.wav")
+        dub_audio.write_wav(out, y.astype(np.float32), sr)
+        files.append(out)
+    return files
+
+def have_ffmpeg():
+    return bool(shutil.which("ffmpeg") and shutil.which("ffprobe"))
+
+def make_video(path, duration, size="160x90", rate=5):
+    """Vídeo de teste (testsrc via lavfi, sem áudio); None se não houver ffmpeg"""
+    if not have_ffmpeg():
+        return None
+    subprocess.run(["ffmpeg", "-y", "-v", "error", "-f", "lavfi",
+                    "-i", f"testsrc=size={size}:rate={rate}:duration={duration:.3f}",
+                    "-c:v", "libx264", "-preset", "ultrafast", "-pix_fmt", "yuv420p", str(path)],
+                   check=True)
+    return Path(path)
@@ -0,0 +1,629 @@
+# dub_audio.py
+# Motor de áudio em processo (NumPy) usado pelas etapas 6.1 e 7
+# Substitui as chamadas ffmpeg por segmento em safe_fade/sync_fit/sync_pad:
+# cada segmento é lido uma vez como array, processado em memória e só o
+# arquivo final é escrito (PCM 16-bit mono, mesmo formato que o ffmpeg gerava)
+
+import os, json, math, time, struct, threading
+from pathlib import Path
+import numpy as np
+
+import dub_metrics
+from dub_cache import file_checksum, write_json_atomic
+
+# ---------------- Leitura/escrita de WAV ----------------
+WAVE_FORMAT_PCM = 0x0001
+WAVE_FORMAT_IEEE_FLOAT = 0x0003
+WAVE_FORMAT_EXTENSIBLE = 0xFFFE
+
+# Últimos arquivos escritos pelo motor (evita decodificar de novo o _xf na etapa 7)
+_RECENT = {}
+_RECENT_MAX = 8
+_RECENT_LOCK = threading.Lock()  # write_wav pode ser chamado de várias threads (modo --stream)
+
+def parse_wav_header(path):
+    """
+    Lê o cabeçalho RIFF de um WAV PCM/float
+    Retorna dict com format, channels, sr, bits, block_align, data_offset, data_size
+    Levanta ValueError se não for um WAV suportado
+    """
+    path = Path(path)
+    file_size = path.stat().st_size
+    with open(path, "rb") as f:
+        riff = f.read(12)
+        if len(riff) < 12 or riff[:4] != b"RIFF" or riff[8:12] != b"WAVE":
+            raise ValueError(f"não é WAV RIFF: {path.name}")
+
+        fmt = None
+        while True:
+            hdr = f.read(8)
+            if len(hdr) < 8:
+                break
+            cid, csize = hdr[:4], struct.unpack("<I", hdr[4:])[0]
+            if cid == b"fmt ":
+                raw = f.read(csize)
+                if csize < 16 or len(raw) < 16:
+                    raise ValueError(f"chunk fmt curto ({len(raw)} bytes): {path.name}")
+                tag, ch, sr, _, block_align, bits = struct.unpack("<HHIIHH", raw[:16])
+                if tag == WAVE_FORMAT_EXTENSIBLE and len(raw) >= 26:
+                    tag = struct.unpack("<H", raw[24:26])[0]
+                fmt = {"format": tag, "channels": ch, "sr": sr,
+                       "bits": bits, "block_align": block_align}
+                if csize % 2:
+                    f.seek(1, 1)
+            elif cid == b"data":
+                if fmt is None:
+                    raise ValueError(f"chunk data antes de fmt: {path.name}")
+                offset = f.tell()
+                # ffmpeg em pipe/stream escreve tamanho 0 ou 0xFFFFFFFF
+                if csize in (0, 0xFFFFFFFF) or offset + csize > file_size:
+                    csize = file_size - offset
+                csize -= csize % max(fmt["block_align"], 1)
+                fmt["data_offset"] = offset
+                fmt["data_size"] = csize
+                return fmt
+            else:
+                f.seek(csize + (csize % 2), 1)
+    raise ValueError(f"WAV sem chunk data: {path.name}")
+
+# ---------------- Duração (cabeçalho + cache) ----------------
+# (caminho absoluto, mtime_ns, tamanho) -> duração em segundos
+_DURATION_CACHE = {}
+
+def _ffprobe_duration(path):
+    import subprocess
+    cmd = ["ffprobe", "-v", "error", "-show_entries", "format=duration",
+           "-of", "default=nk=1:nw=1", str(path)]
+    t0 = time.perf_counter()
+    try:
+        out = subprocess.check_output(cmd, text=True).strip()
+        return max(0.0, float(out))
+    except Exception:
+        return 0.0
+    finally:
+        dub_metrics.record_subprocess(cmd, time.perf_counter() - t0)
+
+def probe_duration(path):
+    """
+    Duração de um arquivo de áudio em segundos (0.0 se não existir/ilegível)
+    WAV PCM/float: lida direto do cabeçalho RIFF; outros containers: ffprobe
+    Resultado memoizado por caminho+mtime+tamanho (arquivo reescrito invalida)
+    """
+    path = Path(path)
+    try:
+        st = path.stat()
+    except OSError:
+        return 0.0
+    key = (str(path.resolve()), st.st_mtime_ns, st.st_size)
+    if key in _DURATION_CACHE:
+        return _DURATION_CACHE[key]
+
+    try:
+        fmt = parse_wav_header(path)
+        dur = fmt["data_size"] / float(fmt["block_align"] * fmt["sr"]) if fmt["sr"] else 0.0
+    except (ValueError, OSError, struct.error):
+        dur = _ffprobe_duration(path)
+
+    _DURATION_CACHE[key] = dur
+    return dur
+
+def _dtype_for(fmt):
+    tag, bits = fmt["format"], fmt["bits"]
+    if tag == WAVE_FORMAT_PCM and bits in (8, 16, 24, 32):
+        return {8: "u1", 16: "<i2", 24: None, 32: "<i4"}[bits]
+    if tag == WAVE_FORMAT_IEEE_FLOAT and bits in (32, 64):
+        return "<f4" if bits == 32 else "<f8"
+    raise ValueError(f"formato WAV não suportado (tag={tag}, bits={bits})")
+
+def _to_float(raw, fmt):
+    """Converte bytes/array crus do chunk data para float32 em [-1, 1]"""
+    tag, bits = fmt["format"], fmt["bits"]
+    if tag == WAVE_FORMAT_PCM and bits == 24:
+        b = np.frombuffer(raw, dtype=np.uint8).reshape(-1, 3)
+        x = (b[:, 0].astype(np.int32) | (b[:, 1].astype(np.int32) << 8)
+             | (b[:, 2].astype(np.int32) << 16))
+        x = np.where(x >= 1 << 23, x - (1 << 24), x)
+        return (x / float(1 << 23)).astype(np.float32)
+    dt = _dtype_for(fmt)
+    x = np.frombuffer(raw, dtype=dt) if isinstance(raw, (bytes, bytearray)) else np.asarray(raw)
+    if tag == WAVE_FORMAT_IEEE_FLOAT:
+        return x.astype(np.float32)
+    if bits == 8:
+        return ((x.astype(np.float32) - 128.0) / 128.0)
+    return (x.astype(np.float32) / float(1 << (bits - 1)))
+
+def read_wav(path):
+    """Lê WAV como (array float32 mono, samplerate)"""
+    path = Path(path)
+    st = path.stat()
+    key = str(path.resolve())
+    hit = _RECENT.get(key)
+    if hit and hit[0] == (st.st_mtime_ns, st.st_size):
+        return hit[1].copy(), hit[2]
+
+    fmt = parse_wav_header(path)
+    with open(path, "rb") as f:
+        f.seek(fmt["data_offset"])
+        raw = f.read(fmt["data_size"])
+    dub_metrics.count_bytes(read=len(raw))
+    y = _to_float(raw, fmt)
+    ch = max(fmt["channels"], 1)
+    if ch > 1:
+        y = y[: len(y) - len(y) % ch].reshape(-1, ch).mean(axis=1)
+    return y.astype(np.float32, copy=False), fmt["sr"]
+
+def read_wav_range(path, start_s, end_s=None):
+    """Lê só o trecho [start_s, end_s) de um WAV (seek direto no chunk data): (float32 mono, sr)"""
+    fmt = parse_wav_header(path)
+    ba, sr = fmt["block_align"], fmt["sr"]
+    n = fmt["data_size"] // ba
+    a = min(max(int(round(start_s * sr)), 0), n)
+    b = n if end_s is None else min(max(int(round(end_s * sr)), a), n)
+    with open(path, "rb") as f:
+        f.seek(fmt["data_offset"] + a * ba)
+        raw = f.read((b - a) * ba)
+    dub_metrics.count_bytes(read=len(raw))
+    y = _to_float(raw, fmt)
+    ch = max(fmt["channels"], 1)
+    if ch > 1:
+        y = y[: len(y) - len(y) % ch].reshape(-1, ch).mean(axis=1)
+    return y.astype(np.float32, copy=False), sr
+
+def _pcm16(y):
+    # Mesma conversão do ffmpeg (float -> s16 com arredondamento e clipping)
+    return np.clip(np.rint(np.asarray(y, dtype=np.float64) * 32768.0), -32768, 32767).astype("<i2")
+
+def wav_header_pcm16(num_samples, sr, channels=1):
+    data_size = num_samples * 2 * channels
+    return (b"RIFF" + struct.pack("<I", 36 + data_size) + b"WAVE"
+            + b"fmt " + struct.pack("<IHHIIHH", 16, WAVE_FORMAT_PCM, channels, sr,
+                                    sr * 2 * channels, 2 * channels, 16)
+            + b"data" + struct.pack("<I", data_size))
+
+def write_wav(path, y, sr):
+    """Escreve WAV PCM 16-bit mono de forma atômica (tmp + replace)"""
+    path = Path(path)
+    pcm = _pcm16(y)
+    tmp = path.with_name(path.name + ".tmp")
+    with open(tmp, "wb") as f:
+        f.write(wav_header_pcm16(len(pcm), sr))
+        f.write(pcm.tobytes())
+    os.replace(tmp, path)
+    dub_metrics.count_bytes(written=pcm.nbytes)
+
+    st = path.stat()
+    key = str(path.resolve())
+    _DURATION_CACHE[(key, st.st_mtime_ns, st.st_size)] = len(pcm) / float(sr)
+    with _RECENT_LOCK:
+        _RECENT[key] = ((st.st_mtime_ns, st.st_size), pcm.astype(np.float32) / 32768.0, sr)
+        while len(_RECENT) > _RECENT_MAX:
+            _RECENT.pop(next(iter(_RECENT)))
+    return path
+
+# ---------------- Operações DSP ----------------
+def resample(y, sr_in, sr_out):
+    if sr_in == sr_out or len(y) == 0:
+        return y
+    try:
+        from math import gcd
+        from scipy.signal import resample_poly
+        g = gcd(sr_in, sr_out)
+        return resample_poly(y, sr_out // g, sr_in // g).astype(np.float32)
+    except ImportError:
+        n_out = int(round(len(y) * sr_out / sr_in))
+        t_out = np.arange(n_out) * (sr_in / sr_out)
+        return np.interp(t_out, np.arange(len(y)), y).astype(np.float32)
+
+def apply_fade(y, sr, fad=0.02):
+    """Equivalente a afade=t=in:d=fad,areverse,afade=t=in:d=fad,areverse (curva linear)"""
+    y = np.array(y, dtype=np.float32, copy=True)
+    n = min(int(round(fad * sr)), len(y))
+    if n <= 0:
+        return y
+    ramp = (np.arange(n, dtype=np.float32) / n)
+    y[:n] *= ramp
+    y[len(y) - n:] *= ramp[::-1]
+    return y
+
+def pad_to(y, sr, duration):
+    """apad=pad_dur=...: completa com silêncio até a duração"""
+    n = int(round(duration * sr))
+    if len(y) >= n:
+        return y
+    return np.concatenate([y, np.zeros(n - len(y), dtype=np.float32)])
+
+def trim_to(y, sr, duration):
+    """atrim=duration=...: corta na duração (nunca aumenta)"""
+    return y[: int(round(duration * sr))]
+
+def change_tempo(y, sr, ratio):
+    """
+    Muda a velocidade sem alterar o tom (WSOLA), como o atempo do ffmpeg
+    ratio > 1 acelera (áudio mais curto), ratio < 1 desacelera
+    """
+    y = np.asarray(y, dtype=np.float32)
+    if len(y) == 0 or abs(ratio - 1.0) < 1e-6:
+        return y.copy()
+
+    win = max(int(sr * 0.030), 64)
+    hop_out = win // 2
+    hop_in = hop_out * ratio
+    tol = max(int(sr * 0.010), 8)
+    dec = 4  # busca de correlação em sinal decimado (custo /16)
+
+    window = np.hanning(win).astype(np.float32)
+    n_out = int(round(len(y) / ratio))
+    n_frames = n_out // hop_out + 2
+
+    x = np.concatenate([np.zeros(tol, np.float32), y, np.zeros(win + tol + int(hop_in) * 2, np.float32)])
+    out = np.zeros(n_frames * hop_out + win, dtype=np.float32)
+    norm = np.zeros_like(out)
+
+    prev = tol  # posição (em x) do último trecho copiado
+    for k in range(n_frames):
+        nominal = tol + int(round(k * hop_in))
+        if k == 0:
+            pos = nominal
+        else:
+            # Continuação natural do trecho anterior
+            natural = x[prev + hop_out: prev + hop_out + win: dec]
+            lo = max(nominal - tol, 0)
+            region = x[lo: nominal + tol + win: dec]
+            if len(natural) and len(region) >= len(natural):
+                corr = np.correlate(region, natural, mode="valid")
+                pos = lo + int(np.argmax(corr)) * dec
+            else:
+                pos = nominal
+        frame = x[pos: pos + win]
+        if len(frame) < win:
+            break
+        o = k * hop_out
+        out[o: o + win] += frame * window
+        norm[o: o + win] += window
+        prev = pos
+
+    norm[norm < 1e-6] = 1.0
+    return (out / norm)[:n_out]
+
+def process_file(in_path, out_path, sr=None, fade=None, tempo=None, pad=None, trim=None):
+    """
+    Processa um segmento em memória e escreve só o arquivo final
+    Ordem igual às cadeias -af usadas antes: fade -> atempo -> apad -> atrim
+    sr: taxa de saída (None mantém a do arquivo, como o safe_fade fazia)
+    """
+    y, sr_in = read_wav(in_path)
+    y, sr_out = process_array(y, sr_in, sr=sr, fade=fade, tempo=tempo, pad=pad, trim=trim)
+    write_wav(out_path, y, sr_out)
+    return Path(out_path)
+
+def process_array(y, sr_in, sr=None, fade=None, tempo=None, pad=None, trim=None):
+    """Mesma cadeia do process_file sobre um array; retorna (y, sr_saída)"""
+    if fade:
+        y = apply_fade(y, sr_in, fade)
+    if tempo and abs(tempo - 1.0) > 1e-6:
+        y = change_tempo(y, sr_in, tempo)
+    sr_out = sr or sr_in
+    y = resample(y, sr_in, sr_out)
+    if pad is not None:
+        y = pad_to(y, sr_out, len(y) / sr_out + max(pad, 0.0))
+    if trim is not None:
+        y = trim_to(y, sr_out, trim)
+    return y, sr_out
+
+# ---------------- VAD por energia (pausas naturais) ----------------
+def pauses_from_mask(silent, hop_s, min_silence_dur=0.3):
+    """
+    Agrupa frames silenciosos consecutivos em pausas (start, end) em segundos
+    Vetorizado (diff/flatnonzero); mesma semântica do loop frame a frame:
+    a pausa termina no primeiro frame com fala e pausa aberta no fim é descartada
+    """
+    m = np.asarray(silent, dtype=np.int8)
+    if m.size == 0:
+        return []
+    edges = np.diff(np.concatenate(([0], m)))
+    starts = np.flatnonzero(edges == 1)
+    ends = np.flatnonzero(edges == -1)
+    starts = starts[:len(ends)]
+    keep = (ends - starts) * hop_s >= min_silence_dur
+    return [(float(s * hop_s), float(e * hop_s)) for s, e in zip(starts[keep], ends[keep])]
+
+def stream_rms(path, frame_s=0.025, hop_s=0.010, block_s=60.0):
+    """
+    RMS por frame lendo o WAV em blocos (memmap), sem carregar/reamostrar tudo
+    Frames centrados com padding de zeros, como librosa.feature.rms(center=True)
+    Retorna (rms, hop_s_efetivo)
+    """
+    fmt = parse_wav_header(path)
+    dt = _dtype_for(fmt)
+    if dt is None:
+        raise ValueError("WAV 24-bit não suportado no modo streaming")
+    ch = max(fmt["channels"], 1)
+    sr = fmt["sr"]
+    n = fmt["data_size"] // fmt["block_align"]
+    data = np.memmap(path, dtype=dt, mode="r", offset=fmt["data_offset"], shape=(n, ch))
+
+    frame = int(round(sr * frame_s)); hop = int(round(sr * hop_s)); half = frame // 2
+    n_frames = 1 + n // hop
+    rms = np.empty(n_frames, dtype=np.float32)
+    per_block = max(int(block_s * sr) // hop, 1)
+
+    for k0 in range(0, n_frames, per_block):
+        k1 = min(k0 + per_block, n_frames)
+        a = k0 * hop - half
+        b = (k1 - 1) * hop - half + frame
+        lo, hi = max(a, 0), min(b, n)
+        x = _to_float(np.array(data[lo:hi]).reshape(-1), dict(fmt, channels=1)) if hi > lo else np.zeros(0, np.float32)
+        if ch > 1:
+            x = x.reshape(-1, ch).mean(axis=1)
+        sq = np.zeros(b - a, dtype=np.float64)
+        sq[lo - a: lo - a + len(x)] = x.astype(np.float64) ** 2
+        cs = np.concatenate(([0.0], np.cumsum(sq)))
+        starts = np.arange(k1 - k0) * hop
+        rms[k0:k1] = np.sqrt(np.maximum(cs[starts + frame] - cs[starts], 0.0) / frame)
+    del data
+    return rms, hop / float(sr)
+
+def detect_pauses_stream(path, min_silence_dur=0.3, percentile=20):
+    """Pausas naturais de um WAV grande via RMS em blocos + agrupamento vetorizado"""
+    rms, hop_s = stream_rms(path)
+    if rms.size == 0:
+        return []
+    threshold = np.percentile(rms, percentile)
+    return pauses_from_mask(rms < threshold, hop_s, min_silence_dur)
+
+class PauseIndex:
+    """
+    Pausas ordenadas com busca por bisect: "pausas que começam em [start, end)"
+    em O(log n) por consulta (antes: filtro da lista inteira por segmento)
+    Compartilhado entre o split (ETAPA 5) e a sincronização elástica
+    """
+
+    def __init__(self, pauses=()):
+        pairs = sorted((float(a), float(b)) for a, b in pauses)
+        self.starts = np.array([a for a, _ in pairs], dtype=np.float64)
+        self.ends = np.array([b for _, b in pairs], dtype=np.float64)
+
+    def __len__(self):
+        return len(self.starts)
+
+    def within(self, start, end):
+        """Pausas com start <= p_start < end, em ordem"""
+        i = int(np.searchsorted(self.starts, start, side="left"))
+        j = int(np.searchsorted(self.starts, end, side="left"))
+        return list(zip(self.starts[i:j].tolist(), self.ends[i:j].tolist()))
+
+    def covering(self, t):
+        """Pausa que contém o instante t (p_start <= t < p_end) ou None"""
+        i = int(np.searchsorted(self.starts, t, side="right")) - 1
+        if i >= 0 and self.ends[i] > t:
+            return float(self.starts[i]), float(self.ends[i])
+        return None
+
+# ---------------- Sincronização elástica (ETAPA 7) ----------------
+ELASTIC_SMOOTH = 0.5       # peso da suavidade entre vizinhos (velocidade de fala sem saltos)
+ELASTIC_CONTIGUOUS = 0.5   # só suaviza vizinhos separados por menos que isso (s)
+ELASTIC_PAUSE_SLACK = 0.1  # pausa que começa até isso depois do fim do segmento ainda conta (s)
+
+def solve_tridiagonal(lower, diag, upper, rhs):
+    """
+    Sistema tridiagonal (lower[i] = A[i+1, i], upper[i] = A[i, i+1])
+    scipy.linalg.solve_banded se disponível; senão algoritmo de Thomas
+    """
+    n = len(diag)
+    try:
+        from scipy.linalg import solve_banded
+        ab = np.zeros((3, n))
+        ab[0, 1:] = upper
+        ab[1] = diag
+        ab[2, :-1] = lower
+        return solve_banded((1, 1), ab, rhs)
+    except ImportError:
+        c = np.zeros(n); d = np.zeros(n)
+        c[0] = upper[0] / diag[0] if n > 1 else 0.0
+        d[0] = rhs[0] / diag[0]
+        for i in range(1, n):
+            m = diag[i] - lower[i - 1] * c[i - 1]
+            if i < n - 1:
+                c[i] = upper[i] / m
+            d[i] = (rhs[i] - lower[i - 1] * d[i - 1]) / m
+        x = d
+        for i in range(n - 2, -1, -1):
+            x[i] -= c[i] * x[i + 1]
+        return x
+
+def elastic_targets(actual, starts, ends, maxstretch=1.35, pauses=None, total_duration=None, max_iter=5):
+    """
+    Alvo de duração de cada segmento, resolvido para a lista inteira de uma vez
+    (mínimos quadrados no log da velocidade r = duração real / alvo):
+    - preferência: ocupar o próprio slot; se não couber, usar antes o silêncio até a
+      próxima fala (limitado à pausa natural do original, se houver PauseIndex) e só
+      então acelerar
+    - suavidade: vizinhos contíguos com velocidades parecidas (sistema tridiagonal)
+    - limites: 1/maxstretch <= r <= maxstretch e nunca invadir o início do próximo segmento
+      (variáveis que batem no limite são fixadas e o resto é resolvido de novo)
+    Só usa durações pré-calculadas: nenhum áudio é tocado aqui
+    """
+    a = np.asarray(actual, dtype=np.float64)
+    n = len(a)
+    if n == 0:
+        return []
+    s = np.asarray(starts, dtype=np.float64)
+    e = np.asarray(ends, dtype=np.float64)
+    slot = np.maximum(e - s, 0.05)
+
+    # Janela livre de cada segmento: até o próximo início (e até o fim da pausa natural)
+    order = np.argsort(s, kind="stable")
+    nxt = np.empty(n)
+    nxt[order[:-1]] = s[order[1:]]
+    nxt[order[-1]] = total_duration if total_duration else np.inf
+    if pauses is not None and len(pauses):
+        j = np.searchsorted(pauses.starts, e + ELASTIC_PAUSE_SLACK, side="right") - 1
+        pend = np.where(j >= 0, pauses.ends[np.clip(j, 0, None)], -np.inf)
+        nxt = np.minimum(nxt, np.maximum(e, pend))
+    window = np.maximum(nxt - s, slot)
+
+    ok = a > 0
+    a_ = np.where(ok, a, slot)
+    want = np.where(a_ <= slot, a_ / slot, np.maximum(a_ / window, 1.0))
+    lo = np.log(np.maximum(a_ / window, 1.0 / maxstretch))
+    hi = np.full(n, np.log(maxstretch))
+    lo = np.minimum(lo, hi)
+
+    # Suavidade só entre vizinhos na mesma "frase" (gap curto), na ordem de início
+    gap = s[order[1:]] - e[order[:-1]]
+    lam = np.where(gap < ELASTIC_CONTIGUOUS, ELASTIC_SMOOTH, 0.0)
+
+    w = ok.astype(np.float64)
+    p = np.log(want)
+    x = np.clip(p, lo, hi)
+    if n > 1:
+        for _ in range(max_iter):
+            # Variáveis no limite viram restrições de igualdade (peso alto)
+            w_it, p_it = w[order].copy(), p[order].copy()
+            fixed = (x[order] <= lo[order] + 1e-9) | (x[order] >= hi[order] - 1e-9)
+            w_it[fixed] = 1e6; p_it[fixed] = x[order][fixed]
+            diag = w_it + 1e-9 + np.r_[lam, 0.0] + np.r_[0.0, lam]
+            xs = solve_tridiagonal(-lam, diag, -lam, w_it * p_it)
+            new = np.empty(n); new[order] = xs
+            new = np.clip(new, lo, hi)
+            done = np.allclose(new, x, atol=1e-6)
+            x = new
+            if done:
+                break
+
+    targets = np.where(ok, a_ / np.exp(x), slot)
+    return np.maximum(targets, 0.05).tolist()
+
+# ---------------- Renderização em linha do tempo (ETAPA 8) ----------------
+def render_timeline(seg_files, starts, out_path, sr, total_duration=None):
+    """
+    Escreve dub_raw.wav numa única passada: aloca o WAV inteiro (memmap, sem
+    carregar tudo na RAM) com o tamanho do vídeo e posiciona cada segmento no seu
+    timestamp de início. Silêncio = zeros; sem arquivos sil_XXXX.wav, sem concat
+    e sem deriva acumulada. Segmentos sobrepostos são somados (com clipping)
+    """
+    out_path = Path(out_path)
+    offsets = [int(round(max(float(t), 0.0) * sr)) for t in starts]
+    lengths = [int(round(probe_duration(p) * sr)) for p in seg_files]
+    n = max([o + l for o, l in zip(offsets, lengths)] + [int(round((total_duration or 0.0) * sr))])
+
+    tmp = out_path.with_name(out_path.name + ".tmp")
+    header = wav_header_pcm16(n, sr)
+    with open(tmp, "wb") as f:
+        f.write(header)
+        f.truncate(len(header) + n * 2)
+
+    if n > 0:
+        mm = np.memmap(tmp, dtype="<i2", mode="r+", offset=len(header), shape=(n,))
+        for p, off in zip(seg_files, offsets):
+            y, sr_in = read_wav(p)
+            pcm = _pcm16(resample(y, sr_in, sr))[: max(n - off, 0)]
+            if len(pcm) == 0:
+                continue
+            region = mm[off: off + len(pcm)]
+            if region.any():
+                mixed = region.astype(np.int32) + pcm.astype(np.int32)
+                region[:] = np.clip(mixed, -32768, 32767).astype("<i2")
+            else:
+                region[:] = pcm
+        mm.flush()
+        del mm
+
+    os.replace(tmp, out_path)
+    dub_metrics.count_bytes(written=len(header) + n * 2)
+    return out_path
+
+def stream_timeline(items, sr, write, total_duration=None, block_s=10.0):
+    """
+    Mixa a linha do tempo em fluxo, sem alocar o áudio inteiro:
+    items = (início_s, y) em ordem de início; write(pcm16) recebe blocos já prontos
+    Só o trecho ainda sujeito a sobreposição fica em memória (segmentos sobrepostos
+    são somados, clipping na conversão). Retorna o total de amostras escritas
+    """
+    block = max(int(block_s * sr), 1)
+    buf = np.zeros(0, dtype=np.float32)
+    pos = 0  # amostra (na saída) correspondente a buf[0]
+
+    def emit(y):
+        for i in range(0, len(y), block):
+            write(_pcm16(y[i: i + block]).tobytes())
+
+    def silence(n):
+        while n > 0:
+            k = min(n, block)
+            write(bytes(2 * k))
+            n -= k
+
+    for start, y in items:
+        off = max(int(round(float(start) * sr)), pos)
+        if off > pos:
+            k = min(off - pos, len(buf))
+            emit(buf[:k])
+            buf = buf[k:]
+            silence(off - pos - k)
+            pos = off
+        if len(y) > len(buf):
+            buf = np.concatenate([buf, np.zeros(len(y) - len(buf), dtype=np.float32)])
+        buf[: len(y)] += y
+
+    emit(buf)
+    pos += len(buf)
+    total = int(round((total_duration or 0.0) * sr))
+    silence(total - pos)
+    return max(pos, total)
+
+# ---------------- Loudnorm em duas passadas (medição em cache) ----------------
+LOUDNORM_TARGET = {"I": -16, "TP": -1.5, "LRA": 11}
+_LOUDNORM_KEYS = ("input_i", "input_tp", "input_lra", "input_thresh", "target_offset")
+
+def _loudnorm_args(target):
+    return f"I={target['I']}:TP={target['TP']}:LRA={target['LRA']}"
+
+def loudnorm_measure(path, cache_path=None, target=LOUDNORM_TARGET):
+    """
+    1ª passada do loudnorm: mede I/TP/LRA/thresh e o offset do arquivo
+    Com cache_path (JSON no workdir), a medição é reutilizada enquanto o
+    conteúdo do arquivo (sha1) e o alvo não mudarem
+    """
+    import subprocess
+    key = f"{file_checksum(path)}:{_loudnorm_args(target)}"
+    cache = {}
+    if cache_path and Path(cache_path).exists():
+        try:
+            with open(cache_path, "r", encoding="utf-8") as f:
+                cache = json.load(f)
+        except (OSError, ValueError):
+            cache = {}
+    if key in cache:
+        print(f"[LOUDNORM] Medição reutilizada ({Path(path).name} sem mudanças)")
+        return cache[key]
+
+    cmd = ["ffmpeg", "-hide_banner", "-nostats", "-i", str(path),
+           "-af", f"loudnorm={_loudnorm_args(target)}:print_format=json", "-f", "null", "-"]
+    print(">>", " ".join(cmd))
+    t0 = time.perf_counter()
+    try:
+        err = subprocess.run(cmd, check=True, capture_output=True, text=True).stderr
+    finally:
+        dub_metrics.record_subprocess(cmd, time.perf_counter() - t0)
+    data = json.loads(err[err.rindex("{"): err.rindex("}") + 1])
+    measured = {k: float(data[k]) for k in _LOUDNORM_KEYS}
+    print(f"[LOUDNORM] Medido: I={measured['input_i']:.1f} LUFS, TP={measured['input_tp']:.1f} dBTP, "
+          f"LRA={measured['input_lra']:.1f} LU")
+
+    if cache_path:
+        cache[key] = measured
+        write_json_atomic(cache_path, cache)
+    return measured
+
+def loudnorm_filter(measured=None, target=LOUDNORM_TARGET):
+    """loudnorm dinâmico (sem medição) ou linear com os valores da 1ª passada"""
+    base = f"loudnorm={_loudnorm_args(target)}"
+    if not measured:
+        return base
+    if not all(math.isfinite(measured[k]) for k in _LOUDNORM_KEYS):
+        print("  [AVISO] Medição de loudness inválida (áudio em silêncio?), usando loudnorm dinâmico")
+        return base
+    return (f"{base}:measured_I={measured['input_i']}:measured_TP={measured['input_tp']}"
+            f":measured_LRA={measured['input_lra']}:measured_thresh={measured['input_thresh']}"
+            f":offset={measured['target_offset']}:linear=true")
@@ -0,0 +1,274 @@
+# dub_cache.py
+# Caches e manifestos persistentes do pipeline de dublagem
+# - SegmentManifest: estado por segmento da ETAPA 6 (resume granular do TTS)
+# - TTSCache: cache de áudio endereçado por conteúdo, compartilhado entre vídeos
+# - TranslationMemory: memória de tradução por segmento (M2M100)
+
+import os, json, time, shutil, sqlite3, difflib, hashlib, unicodedata
+from pathlib import Path
+from datetime import datetime
+
+def normalize_text(text):
+    """NFC + espaços colapsados (mesma frase com espaçamento diferente = mesma chave)"""
+    return " ".join(unicodedata.normalize("NFC", text or "").split())
+
+def text_hash(text):
+    """Hash estável do texto normalizado"""
+    return hashlib.sha1(normalize_text(text).encode("utf-8")).hexdigest()
+
+def default_cache_dir():
+    """Diretório de cache do usuário (DUBLAR_CACHE_DIR sobrescreve)"""
+    env = os.environ.get("DUBLAR_CACHE_DIR")
+    if env:
+        return Path(env)
+    base = os.environ.get("XDG_CACHE_HOME") or os.environ.get("LOCALAPPDATA")
+    return Path(base or Path.home() / ".cache", "dublar")
+
+def file_checksum(path, chunk=1 << 20):
+    h = hashlib.sha1()
+    with open(path, "rb") as f:
+        for block in iter(lambda: f.read(chunk), b""):
+            h.update(block)
+    return h.hexdigest()
+
+def write_json_atomic(path, data):
+    path = Path(path)
+    tmp = path.with_name(path.name + ".tmp")
+    with open(tmp, "w", encoding="utf-8") as f:
+        json.dump(data, f, indent=2, ensure_ascii=False)
+    os.replace(tmp, path)
+
+# ---------------- Manifesto por segmento (ETAPA 6) ----------------
+class SegmentManifest:
+    """
+    Registra, para cada seg_XXXX.wav, o hash do texto, os parâmetros do TTS
+    (engine, voz, temperaturas) e o checksum do arquivo gerado
+    No resume só são sintetizados os segmentos ausentes ou desatualizados
+    Gravação em lote (a cada SAVE_EVERY registros ou SAVE_INTERVAL segundos) + flush()
+    no fim: perder os últimos registros num crash só custa re-sintetizar esses segmentos
+    """
+
+    FILENAME = "tts_manifest.json"
+    SAVE_EVERY = 50
+    SAVE_INTERVAL = 5.0
+
+    def __init__(self, workdir):
+        self.path = Path(workdir, self.FILENAME)
+        self.entries = {}
+        self._pending = 0
+        self._last_save = time.monotonic()
+        if self.path.exists():
+            try:
+                with open(self.path, "r", encoding="utf-8") as f:
+                    self.entries = json.load(f).get("segments", {})
+            except (OSError, ValueError):
+                print(f"  [AVISO] {self.FILENAME} corrompido, ignorando")
+                self.entries = {}
+
+    def is_fresh(self, idx, text, params, out_path):
+        """True se out_path existe e corresponde exatamente ao texto/parâmetros registrados"""
+        e = self.entries.get(str(idx))
+        if not e or not Path(out_path).exists():
+            return False
+        if e.get("text_hash") != text_hash(text) or e.get("params") != params:
+            return False
+        if e.get("file") != Path(out_path).name:
+            return False
+        try:
+            return file_checksum(out_path) == e.get("checksum")
+        except OSError:
+            return False
+
+    def record(self, idx, text, params, out_path, actual_dur=None):
+        self.entries[str(idx)] = {
+            "text_hash": text_hash(text),
+            "params": params,
+            "file": Path(out_path).name,
+            "checksum": file_checksum(out_path),
+            "actual_dur": actual_dur,
+            "timestamp": datetime.now().isoformat(),
+        }
+        self._pending += 1
+        if self._pending >= self.SAVE_EVERY or time.monotonic() - self._last_save >= self.SAVE_INTERVAL:
+            self.save()
+
+    def save(self):
+        write_json_atomic(self.path, {"segments": self.entries})
+        self._pending = 0
+        self._last_save = time.monotonic()
+
+    def flush(self):
+        """Grava os registros pendentes (chamar no fim da etapa, inclusive em erro)"""
+        if self._pending:
+            self.save()
+
+# ---------------- Cache de TTS endereçado por conteúdo ----------------
+class TTSCache:
+    """
+    Cache persistente de segmentos TTS, compartilhado entre execuções e vídeos
+    Chave: (engine, modelo, voz, text_temp, waveform_temp, texto normalizado)
+    Índice em SQLite com last_used para remoção LRU quando passa de max_bytes
+    Num acerto o WAV é ligado (hardlink) ou copiado para o workdir
+    A conexão pode ser usada por outra thread (modo --stream), uma de cada vez
+    """
+
+    def __init__(self, root=None, max_bytes=2 * 1024**3):
+        self.root = Path(root) if root else default_cache_dir() / "tts"
+        self.root.mkdir(parents=True, exist_ok=True)
+        self.max_bytes = int(max_bytes)
+        self.stats = {"hits": 0, "misses": 0, "stored": 0, "evicted": 0}
+        self.db = sqlite3.connect(str(self.root / "index.sqlite"), timeout=30, check_same_thread=False)
+        self.db.execute("""CREATE TABLE IF NOT EXISTS entries (
+            key TEXT PRIMARY KEY, file TEXT NOT NULL, size INTEGER NOT NULL,
+            last_used REAL NOT NULL)""")
+        self.db.commit()
+
+    @staticmethod
+    def make_key(params, text):
+        payload = json.dumps({"params": params, "text": normalize_text(text)},
+                             sort_keys=True, ensure_ascii=False)
+        return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+    def _file_for(self, key):
+        return self.root / key[:2] / f"{key}.wav"
+
+    def get(self, params, text, dest):
+        """Materializa o áudio em dest se existir no cache; retorna True num acerto"""
+        key = self.make_key(params, text)
+        row = self.db.execute("SELECT file FROM entries WHERE key=?", (key,)).fetchone()
+        src = self.root / row[0] if row else None
+        if src is None or not src.exists():
+            if row:
+                self.db.execute("DELETE FROM entries WHERE key=?", (key,))
+                self.db.commit()
+            self.stats["misses"] += 1
+            return False
+
+        dest = Path(dest)
+        tmp = dest.with_name(dest.name + ".tmp")
+        if tmp.exists():
+            tmp.unlink()
+        try:
+            os.link(src, tmp)
+        except OSError:
+            shutil.copyfile(src, tmp)
+        os.replace(tmp, dest)
+
+        self.db.execute("UPDATE entries SET last_used=? WHERE key=?", (time.time(), key))
+        self.db.commit()
+        self.stats["hits"] += 1
+        return True
+
+    def put(self, params, text, src):
+        """Guarda uma cópia de src no cache e aplica o limite de tamanho"""
+        key = self.make_key(params, text)
+        target = self._file_for(key)
+        target.parent.mkdir(parents=True, exist_ok=True)
+        tmp = target.with_name(target.name + ".tmp")
+        shutil.copyfile(src, tmp)
+        os.replace(tmp, target)
+        self.db.execute("INSERT OR REPLACE INTO entries (key, file, size, last_used) VALUES (?,?,?,?)",
+                        (key, str(target.relative_to(self.root)), target.stat().st_size, time.time()))
+        self.db.commit()
+        self.stats["stored"] += 1
+        self.evict()
+
+    def evict(self):
+        total = self.db.execute("SELECT COALESCE(SUM(size), 0) FROM entries").fetchone()[0]
+        if total <= self.max_bytes:
+            return
+        rows = self.db.execute("SELECT key, file, size FROM entries ORDER BY last_used ASC").fetchall()
+        for key, rel, size in rows:
+            if total <= self.max_bytes:
+                break
+            try:
+                (self.root / rel).unlink()
+            except OSError:
+                pass
+            self.db.execute("DELETE FROM entries WHERE key=?", (key,))
+            total -= size
+            self.stats["evicted"] += 1
+        self.db.commit()
+
+    def close(self):
+        self.db.close()
+
+# ---------------- Memória de tradução (segmento) ----------------
+class TranslationMemory:
+    """
+    Memória de tradução local em SQLite
+    Chave: (modelo, src, tgt, texto protegido normalizado, parâmetros de geração)
+    Busca exata por hash; busca aproximada opcional (difflib) para quase-duplicatas
+    com o mesmo modelo/idiomas/parâmetros (fuzzy = similaridade mínima, 0 desativa)
+    A conexão pode ser usada por outra thread (modo --stream), uma de cada vez
+    """
+
+    MAX_FUZZY_CANDIDATES = 2000
+
+    def __init__(self, path=None, fuzzy=0.0):
+        self.path = Path(path) if path else default_cache_dir() / "translation_memory.sqlite"
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        self.fuzzy = float(fuzzy or 0.0)
+        self.stats = {"exact_hits": 0, "fuzzy_hits": 0, "misses": 0, "stored": 0}
+        self.db = sqlite3.connect(str(self.path), timeout=30, check_same_thread=False)
+        self.db.execute("""CREATE TABLE IF NOT EXISTS tm (
+            key TEXT PRIMARY KEY, model TEXT NOT NULL, src TEXT NOT NULL, tgt TEXT NOT NULL,
+            params TEXT NOT NULL, text TEXT NOT NULL, translation TEXT NOT NULL,
+            last_used REAL NOT NULL)""")
+        self.db.execute("CREATE INDEX IF NOT EXISTS tm_ctx ON tm (model, src, tgt, params)")
+        self.db.commit()
+
+    @staticmethod
+    def _params(params):
+        return json.dumps(params or {}, sort_keys=True)
+
+    @classmethod
+    def make_key(cls, model, src, tgt, text, params):
+        payload = "\x1f".join([model, src, tgt, normalize_text(text), cls._params(params)])
+        return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+    def lookup(self, model, src, tgt, text, params=None):
+        """Retorna a tradução memorizada ou None"""
+        key = self.make_key(model, src, tgt, text, params)
+        row = self.db.execute("SELECT translation FROM tm WHERE key=?", (key,)).fetchone()
+        if row:
+            self.db.execute("UPDATE tm SET last_used=? WHERE key=?", (time.time(), key))
+            self.db.commit()
+            self.stats["exact_hits"] += 1
+            return row[0]
+
+        if self.fuzzy > 0:
+            norm = normalize_text(text)
+            n = len(norm)
+            # Razão de similaridade >= fuzzy implica tamanhos próximos
+            lo, hi = int(n * self.fuzzy / (2 - self.fuzzy)), int(n * (2 - self.fuzzy) / self.fuzzy) + 1
+            rows = self.db.execute(
+                "SELECT text, translation FROM tm WHERE model=? AND src=? AND tgt=? AND params=? "
+                "AND length(text) BETWEEN ? AND ? ORDER BY last_used DESC LIMIT ?",
+                (model, src, tgt, self._params(params), lo, hi, self.MAX_FUZZY_CANDIDATES)).fetchall()
+            best, best_ratio = None, self.fuzzy
+            for cand, translation in rows:
+                sm = difflib.SequenceMatcher(None, norm, cand, autojunk=False)
+                if sm.real_quick_ratio() < best_ratio or sm.quick_ratio() < best_ratio:
+                    continue
+                r = sm.ratio()
+                if r >= best_ratio:
+                    best, best_ratio = translation, r
+            if best is not None:
+                self.stats["fuzzy_hits"] += 1
+                return best
+
+        self.stats["misses"] += 1
+        return None
+
+    def store(self, model, src, tgt, text, translation, params=None):
+        key = self.make_key(model, src, tgt, text, params)
+        self.db.execute(
+            "INSERT OR REPLACE INTO tm (key, model, src, tgt, params, text, translation, last_used) "
+            "VALUES (?,?,?,?,?,?,?,?)",
+            (key, model, src, tgt, self._params(params), normalize_text(text), translation, time.time()))
+        self.db.commit()
+        self.stats["stored"] += 1
+
+    def close(self):
+        self.db.close()
@@ -0,0 +1,149 @@
+# dub_duration.py
+# Previsão da duração do TTS antes de sintetizar, aprendida do nosso próprio histórico
+# - um modelo por (engine, voz, idioma) em <cache>/duration_models.json
+# - regressão ridge sobre features baratas do texto (palavras, caracteres, pontuação)
+# - guarda só as estatísticas suficientes (X'X, X'y): cada segments.csv novo é somado
+#   sem reler os anteriores; linhas já vistas (texto + duração) são ignoradas
+# - com poucas amostras (< MIN_SAMPLES) vale a heurística fixa (palavras/s + pausas)
+#
+# Uso avulso (ingere CSVs antigos):
+#   python dub_duration.py --tts bark --voice v2/pt_speaker_1 --lang pt dub_work/segments.csv outro/segments.csv
+
+import re, csv, json, hashlib, argparse
+from pathlib import Path
+import numpy as np
+
+from dub_cache import default_cache_dir, normalize_text, write_json_atomic
+
+MODELS_FILE = "duration_models.json"
+MIN_SAMPLES = 30
+RIDGE = 2.0                 # puxa os coeficientes para a heurística (poucas amostras = heurística)
+MIN_DURATION = 0.5
+BASE_WPS = 2.5
+SPEED_FACTORS = {"pt": 1.0, "en": 1.1, "es": 0.95, "fr": 0.90}
+FEATURES = ("intercepto", "palavras", "caracteres/10", "fim_de_frase", "virgulas")
+
+def features(text):
+    text = text or ""
+    return np.array([1.0, len(text.split()), len(re.sub(r"\s+", "", text)) / 10.0,
+                     text.count(".") + text.count("?") + text.count("!"), text.count(",")])
+
+def heuristic_weights(lang):
+    """Coeficientes equivalentes à heurística antiga (estimate_tts_duration)"""
+    wps = BASE_WPS * SPEED_FACTORS.get((lang or "pt").lower(), 1.0)
+    return np.array([0.0, 1.0 / wps, 0.0, 0.3, 0.15])
+
+def model_key(engine, voice, lang):
+    return f"{engine}|{voice or '-'}|{(lang or 'pt').lower()}"
+
+def _row_id(text, actual):
+    return hashlib.sha1(f"{normalize_text(text)}\x1f{actual:.3f}".encode("utf-8")).hexdigest()[:16]
+
+class DurationModel:
+    """
+    predict(texto) -> segundos; max_words(duração) -> limite de palavras para a simplificação
+    update_from_csv(segments.csv) soma as linhas novas e reajusta; save() grava no cache
+    """
+
+    def __init__(self, engine, voice=None, lang="pt", path=None):
+        self.path = Path(path) if path else default_cache_dir() / MODELS_FILE
+        self.key = model_key(engine, voice, lang)
+        self.prior = heuristic_weights(lang)
+        k = len(FEATURES)
+        self.xtx, self.xty, self.n, self.seen = np.zeros((k, k)), np.zeros(k), 0, set()
+        self.stats = {"samples": 0, "added": 0, "mae_heuristic": None, "mae_model": None}
+        try:
+            with open(self.path, "r", encoding="utf-8") as f:
+                rec = json.load(f).get(self.key)
+        except (OSError, ValueError):
+            rec = None
+        if rec:
+            self.xtx, self.xty = np.array(rec["xtx"]), np.array(rec["xty"])
+            self.n, self.seen = int(rec["n"]), set(rec.get("seen", []))
+            self.stats.update({k: rec.get(k) for k in ("mae_heuristic", "mae_model")})
+        self.stats["samples"] = self.n
+        self.weights = self._fit()
+
+    @property
+    def trained(self):
+        return self.n >= MIN_SAMPLES
+
+    def _fit(self):
+        if not self.trained:
+            return self.prior
+        a = self.xtx + RIDGE * np.eye(len(FEATURES))
+        return np.linalg.solve(a, self.xty + RIDGE * self.prior)
+
+    def predict(self, text):
+        return max(float(features(text) @ self.weights), MIN_DURATION)
+
+    def max_words(self, duration, margin=1.1):
+        """Palavras que cabem em duration (segundos por palavra médios do histórico)"""
+        w = self.weights
+        chars_per_word = self.xtx[0, 2] / self.xtx[0, 1] if self.xtx[0, 1] > 0 else 0.55
+        per_word = w[1] + w[2] * chars_per_word
+        if per_word <= 0:
+            per_word = self.prior[1]
+        return max(int((duration * margin - max(w[0], 0.0)) / per_word), 1)
+
+    def update_from_csv(self, csv_path):
+        """Soma as linhas novas de um segments.csv (texto_trad, actual_dur); retorna quantas"""
+        rows = []
+        with open(csv_path, "r", encoding="utf-8", newline="") as f:
+            for r in csv.DictReader(f):
+                try:
+                    text, actual = r["texto_trad"], float(r["actual_dur"])
+                except (KeyError, TypeError, ValueError):
+                    continue
+                rid = _row_id(text, actual)
+                if actual > 0.05 and text.strip() and rid not in self.seen:
+                    self.seen.add(rid)
+                    rows.append((text, actual))
+        if not rows:
+            return 0
+        X = np.array([features(t) for t, _ in rows])
+        y = np.array([a for _, a in rows])
+        # Erro antes do ajuste nas linhas novas (avaliação honesta do modelo anterior)
+        self.stats["mae_heuristic"] = float(np.mean(np.abs(np.maximum(X @ self.prior, MIN_DURATION) - y)))
+        self.stats["mae_model"] = float(np.mean(np.abs(np.maximum(X @ self.weights, MIN_DURATION) - y)))
+        self.xtx += X.T @ X
+        self.xty += X.T @ y
+        self.n += len(rows)
+        self.stats["samples"] = self.n
+        self.stats["added"] += len(rows)
+        self.weights = self._fit()
+        return len(rows)
+
+    def save(self):
+        try:
+            with open(self.path, "r", encoding="utf-8") as f:
+                data = json.load(f)
+        except (OSError, ValueError):
+            data = {}
+        data[self.key] = {"xtx": self.xtx.tolist(), "xty": self.xty.tolist(), "n": self.n,
+                          "seen": sorted(self.seen), "weights": self.weights.tolist(),
+                          "mae_heuristic": self.stats["mae_heuristic"], "mae_model": self.stats["mae_model"]}
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        write_json_atomic(self.path, data)
+
+def main():
+    ap = argparse.ArgumentParser(description="Ajusta o modelo de duração do TTS com segments.csv existentes")
+    ap.add_argument("csv", nargs="+", help="Arquivos segments.csv")
+    ap.add_argument("--tts", default="bark")
+    ap.add_argument("--voice", default=None)
+    ap.add_argument("--lang", default="pt")
+    ap.add_argument("--path", default=None, help=f"Arquivo dos modelos (padrão: <cache>/{MODELS_FILE})")
+    args = ap.parse_args()
+
+    model = DurationModel(args.tts, args.voice, args.lang, path=args.path)
+    for p in args.csv:
+        print(f"  {p}: {model.update_from_csv(p)} linhas novas")
+    model.save()
+    print(f"[OK] {model.key}: {model.n} amostras ({'ajustado' if model.trained else 'heurística'})")
+    print("  " + ", ".join(f"{n}={w:.4f}" for n, w in zip(FEATURES, model.weights)))
+    if model.stats["added"]:
+        print(f"  Erro médio nas linhas novas: heurística {model.stats['mae_heuristic']:.3f}s, "
+              f"modelo anterior {model.stats['mae_model']:.3f}s")
+
+if __name__ == "__main__":
+    main()
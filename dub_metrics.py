@@ -0,0 +1,213 @@
+# dub_metrics.py
+# Instrumentação do pipeline de dublagem
+# - por etapa: tempo de parede, CPU (processo e filhos/ffmpeg), pico de RSS do processo,
+#   subprocessos (quantidade e tempo), carga de modelos e bytes lidos/escritos
+# - por segmento: tempo de TTS/fade/sync (agregado no logs.json, bruto no trace)
+# Saída: Recorder.summary() vai para o logs.json; trace opcional em JSON-lines
+# Os contadores são do processo: etapas sobrepostas (--stream/--batch) se somam
+
+import os, sys, json, time, threading
+from contextlib import contextmanager
+
+_LOCK = threading.Lock()
+_LOCAL = threading.local()
+_TRACES = {}      # caminho -> arquivo aberto (compartilhado entre jobs do lote)
+_ACTIVE = []      # recorders abertos (fecha o trace quando o último sai)
+
+# Contadores globais do processo
+COUNTERS = {"subprocess_count": 0, "subprocess_s": 0.0, "model_load_s": 0.0,
+            "audio_read_bytes": 0, "audio_write_bytes": 0}
+
+def _add(key, value):
+    with _LOCK:
+        COUNTERS[key] += value
+
+# ---------------- Ganchos (chamados por sh(), dub_audio e dub_models) ----------------
+def _owner():
+    """Recorder que recebe o evento: o da thread; sem ele, o único job aberto (workers do pool)"""
+    rec = current()
+    if rec is None:
+        with _LOCK:
+            rec = _ACTIVE[0] if len(_ACTIVE) == 1 else None
+    return rec
+
+def record_subprocess(cmd, seconds, cwd=None):
+    _add("subprocess_count", 1)
+    _add("subprocess_s", seconds)
+    rec = _owner()
+    if rec is not None:
+        prog = os.path.basename(str(cmd[0])) if cmd else "?"
+        rec.event("subprocess", prog=prog, seconds=round(seconds, 4), cwd=str(cwd) if cwd else None)
+
+def record_model_load(label, seconds):
+    _add("model_load_s", seconds)
+    rec = _owner()
+    if rec is not None:
+        rec.event("model_load", model=label, seconds=round(seconds, 3))
+
+def count_bytes(read=0, written=0):
+    """Bytes de áudio lidos/escritos pelo motor em processo (dub_audio)"""
+    if read:
+        _add("audio_read_bytes", int(read))
+    if written:
+        _add("audio_write_bytes", int(written))
+
+def current():
+    """Recorder da etapa ativa nesta thread (ou None)"""
+    return getattr(_LOCAL, "recorder", None)
+
+def segment(stage, idx, seconds, **extra):
+    """Registra o tempo de um segmento no recorder ativo desta thread (no-op sem recorder)"""
+    rec = current()
+    if rec is not None:
+        rec.segment(stage, idx, seconds, **extra)
+
+# ---------------- Recursos do processo ----------------
+def _peak_rss_mb():
+    """Pico de memória residente do processo inteiro (e dos filhos, separado) em MB, desde o início"""
+    try:
+        import resource
+        scale = 1024.0 * 1024.0 if sys.platform == "darwin" else 1024.0  # bytes no macOS, KB no Linux
+        own = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / scale
+        children = resource.getrusage(resource.RUSAGE_CHILDREN).ru_maxrss / scale
+        return own, children
+    except (ImportError, ValueError):
+        pass
+    try:
+        import psutil
+        mem = psutil.Process().memory_info()
+        return getattr(mem, "peak_wset", mem.rss) / (1024.0 * 1024.0), None
+    except Exception:
+        return None, None
+
+def _io_bytes():
+    """(lidos, escritos) em disco pelo processo; None se a plataforma não informa"""
+    try:
+        with open("/proc/self/io", "r") as f:
+            vals = dict(line.split(":") for line in f.read().splitlines() if ":" in line)
+        return int(vals["read_bytes"]), int(vals["write_bytes"])
+    except (OSError, KeyError, ValueError):
+        pass
+    try:
+        import psutil
+        io = psutil.Process().io_counters()
+        return io.read_bytes, io.write_bytes
+    except Exception:
+        return None
+
+def _snapshot():
+    t = os.times()
+    with _LOCK:
+        counters = dict(COUNTERS)
+    return {"wall": time.perf_counter(), "cpu": t.user + t.system,
+            "children_cpu": t.children_user + t.children_system,
+            "io": _io_bytes(), **counters}
+
+def _mb(n):
+    return round(n / (1024.0 * 1024.0), 2)
+
+# ---------------- Recorder ----------------
+class Recorder:
+    """
+    Coleta as métricas de um job (um vídeo)
+    Uso: with rec.stage("6_tts"): ... ; rec.segment("tts", idx, segundos)
+    """
+
+    def __init__(self, trace_path=None, job=None):
+        self.job = job
+        self.stages = {}
+        self.segments = {}
+        self.trace_path = str(trace_path) if trace_path else None
+        self._t0 = time.perf_counter()
+        if self.trace_path:
+            with _LOCK:
+                if self.trace_path not in _TRACES:
+                    _TRACES[self.trace_path] = open(self.trace_path, "a", encoding="utf-8")
+        _ACTIVE.append(self)
+
+    def event(self, kind, **fields):
+        if not self.trace_path:
+            return
+        rec = {"ts": round(time.time(), 3), "job": self.job, "type": kind,
+               "thread": threading.current_thread().name, **fields}
+        line = json.dumps(rec, ensure_ascii=False) + "\n"
+        with _LOCK:
+            f = _TRACES.get(self.trace_path)
+            if f is not None:
+                f.write(line)
+                f.flush()
+
+    @contextmanager
+    def stage(self, name):
+        """Mede a etapa e a torna a etapa ativa da thread (para segment())"""
+        prev = current()
+        _LOCAL.recorder = self
+        start = _snapshot()
+        self.event("stage_start", stage=name)
+        try:
+            yield self
+        finally:
+            _LOCAL.recorder = prev
+            self._finish_stage(name, start, _snapshot())
+
+    def _finish_stage(self, name, a, b):
+        own_rss, child_rss = _peak_rss_mb()
+        m = {
+            "wall_s": b["wall"] - a["wall"],
+            "cpu_s": b["cpu"] - a["cpu"],
+            "children_cpu_s": b["children_cpu"] - a["children_cpu"],
+            "subprocess_count": b["subprocess_count"] - a["subprocess_count"],
+            "subprocess_s": b["subprocess_s"] - a["subprocess_s"],
+            "model_load_s": b["model_load_s"] - a["model_load_s"],
+            "audio_read_mb": _mb(b["audio_read_bytes"] - a["audio_read_bytes"]),
+            "audio_write_mb": _mb(b["audio_write_bytes"] - a["audio_write_bytes"]),
+        }
+        if a["io"] and b["io"]:
+            m["disk_read_mb"] = _mb(b["io"][0] - a["io"][0])
+            m["disk_write_mb"] = _mb(b["io"][1] - a["io"][1])
+        m = {k: (round(v, 3) if isinstance(v, float) else v) for k, v in m.items()}
+        # ru_maxrss é o pico do processo desde o início (não da etapa): vale como marca d'água
+        m["process_peak_rss_mb"] = round(own_rss, 1) if own_rss is not None else None
+        if child_rss is not None:
+            m["process_children_peak_rss_mb"] = round(child_rss, 1)
+
+        with _LOCK:
+            prev = self.stages.get(name)
+            if prev:
+                # Etapa repetida (ex.: retentativas): soma os contadores
+                for k, v in m.items():
+                    if k.startswith("process_"):
+                        prev[k] = v
+                    elif isinstance(v, (int, float)):
+                        prev[k] = round(prev.get(k, 0) + v, 3)
+                prev["calls"] = prev.get("calls", 1) + 1
+            else:
+                self.stages[name] = m
+        self.event("stage", stage=name, **m)
+
+    def segment(self, stage, idx, seconds, **extra):
+        with _LOCK:
+            self.segments.setdefault(stage, []).append(seconds)
+        self.event("segment", stage=stage, idx=idx, seconds=round(seconds, 4), **extra)
+
+    def summary(self):
+        """Resumo para o logs.json (segmentos agregados: n, total, média, p95, máximo)"""
+        segs = {}
+        for stage, vals in self.segments.items():
+            v = sorted(vals)
+            segs[stage] = {"count": len(v), "total_s": round(sum(v), 3),
+                           "mean_s": round(sum(v) / len(v), 4),
+                           "p95_s": round(v[min(len(v) - 1, int(0.95 * len(v)))], 4),
+                           "max_s": round(v[-1], 4)}
+        return {"total_wall_s": round(time.perf_counter() - self._t0, 3),
+                "stages": self.stages, "segments": segs,
+                "trace": self.trace_path}
+
+    def close(self):
+        if self in _ACTIVE:
+            _ACTIVE.remove(self)
+        if self.trace_path and not any(r.trace_path == self.trace_path for r in _ACTIVE):
+            with _LOCK:
+                f = _TRACES.pop(self.trace_path, None)
+            if f is not None:
+                f.close()
@@ -0,0 +1,192 @@
+# dub_models.py
+# Registro de modelos residentes no processo (Whisper, M2M100, Bark, Coqui)
+# - carregamento preguiçoso: o modelo só é carregado na primeira vez que é pedido
+# - reuso: as chamadas seguintes (outros vídeos no mesmo processo) recebem o mesmo objeto
+# - release(): libera explicitamente (e esvazia o cache da GPU, se houver)
+# Cada processo tem o seu registro (workers do pool de TTS carregam o deles)
+# whisper_device(): testa a GPU uma vez por host (resultado em ~/.cache/dublar/device_probe.json)
+
+import gc, json, time, platform, threading
+
+import dub_metrics
+
+_MODELS = {}      # chave -> objeto carregado
+_FAILED = {}      # (tipo, device) -> erro: não tenta de novo neste processo
+_KEY_LOCKS = {}
+_LOCK = threading.Lock()
+LOAD_TIMES = {}   # "tipo:nome:device" -> segundos gastos carregando
+
+M2M100_DEFAULT = "facebook/m2m100_418M"
+
+def _label(key):
+    return ":".join(str(k) for k in key if k)
+
+def _get(key, loader):
+    """Retorna o modelo da chave, carregando-o uma única vez (thread-safe por chave)"""
+    with _LOCK:
+        lock = _KEY_LOCKS.setdefault(key, threading.Lock())
+    with lock:
+        if key in _MODELS:
+            print(f"[MODELO] Reutilizando {_label(key)} (já carregado)")
+            return _MODELS[key]
+        failed = _FAILED.get((key[0], key[2]))
+        if failed:
+            raise RuntimeError(f"{key[0]} em {key[2]} indisponível neste processo: {failed}")
+        t0 = time.time()
+        obj = loader()
+        LOAD_TIMES[_label(key)] = time.time() - t0
+        dub_metrics.record_model_load(_label(key), LOAD_TIMES[_label(key)])
+        _MODELS[key] = obj
+        print(f"[MODELO] {_label(key)} carregado em {LOAD_TIMES[_label(key)]:.1f}s")
+        return obj
+
+def is_loaded(kind, name=None):
+    return any(k[0] == kind and (name is None or k[1] == name) for k in _MODELS)
+
+def loaded():
+    return [_label(k) for k in _MODELS]
+
+# ---------------- Modelos ----------------
+def whisper(size="medium", device="cpu", compute_type="int8", cpu_threads=0):
+    """cpu_threads=0: padrão do CTranslate2; > 0 fixa as threads (workers do ASR em blocos)"""
+    def load():
+        from faster_whisper import WhisperModel
+        return WhisperModel(size, device=device, compute_type=compute_type, cpu_threads=cpu_threads)
+    return _get(("whisper", size, device, compute_type, cpu_threads or None), load)
+
+def m2m100(model_name=M2M100_DEFAULT):
+    """Retorna (tokenizer, modelo)"""
+    def load():
+        from transformers import AutoTokenizer, AutoModelForSeq2SeqLM
+        tok = AutoTokenizer.from_pretrained(model_name)
+        model = AutoModelForSeq2SeqLM.from_pretrained(model_name)
+        return tok, model
+    return _get(("m2m100", model_name, "auto", None), load)
+
+def bark():
+    """Carrega os modelos do Bark (ficam no cache global do próprio bark)"""
+    def load():
+        from bark import preload_models
+        preload_models()
+        return True
+    return _get(("bark", "suno/bark", "auto", None), load)
+
+def bark_history(voice):
+    """Prompt de voz do Bark (arquivo .npz ou nome de preset), carregado uma vez por voz"""
+    if not voice:
+        return None
+    def load():
+        try:
+            from bark.generation import load_history_prompt
+            return load_history_prompt(voice)
+        except Exception:
+            return voice
+    return _get(("bark_voice", voice, "cpu", None), load)
+
+def coqui(model_name, gpu=False):
+    def load():
+        from TTS.api import TTS
+        return TTS(model_name, gpu=gpu)
+    return _get(("coqui", model_name, "cuda" if gpu else "cpu", None), load)
+
+# ---------------- Teste de dispositivo (por host, em cache) ----------------
+DEVICE_PROBE_FILE = "device_probe.json"
+
+def _probe_path():
+    from dub_cache import default_cache_dir
+    return default_cache_dir() / DEVICE_PROBE_FILE
+
+def _load_probes():
+    try:
+        with open(_probe_path(), "r", encoding="utf-8") as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return {}
+
+def _save_probe(key, result):
+    from dub_cache import write_json_atomic
+    probes = _load_probes()
+    probes[key] = result
+    try:
+        _probe_path().parent.mkdir(parents=True, exist_ok=True)
+        write_json_atomic(_probe_path(), probes)
+    except OSError as e:
+        print(f"  [AVISO] Não foi possível gravar o teste de dispositivo: {e}")
+
+def _whisper_probe_key(size):
+    """Chave por host: muda com a versão do CTranslate2 e o número de GPUs visíveis"""
+    try:
+        import ctranslate2
+        version, n_cuda = ctranslate2.__version__, ctranslate2.get_cuda_device_count()
+    except Exception:
+        version, n_cuda = None, 0
+    return f"whisper:{size}:{platform.node()}:ct2-{version}:cuda{n_cuda}", n_cuda
+
+def whisper_device(size="medium", refresh=False):
+    """
+    (device, compute_type) do Whisper neste host
+    Sem resultado em cache: carrega na GPU e decodifica 1s sintético até o fim (o gerador
+    do faster-whisper é preguiçoso: erros de cuBLAS/cuDNN só aparecem decodificando).
+    Se passar, o modelo CUDA já fica residente; se falhar, fica marcado e o host vai para CPU
+    """
+    key, n_cuda = _whisper_probe_key(size)
+    hit = _load_probes().get(key)
+    if hit and not refresh:
+        print(f"[MODELO] Whisper neste host: {hit['device']} (teste em cache)")
+        return hit["device"], hit["compute_type"]
+
+    result = {"device": "cpu", "compute_type": "int8"}
+    if n_cuda > 0:
+        print("[MODELO] Testando Whisper na GPU (1s sintético)...")
+        try:
+            import numpy as np
+            model = whisper(size, device="cuda", compute_type="float16")
+            t = np.arange(16000, dtype=np.float32) / 16000
+            segments, _ = model.transcribe(0.1 * np.sin(2 * np.pi * 220 * t), language="en", vad_filter=False)
+            list(segments)
+            result = {"device": "cuda", "compute_type": "float16"}
+        except Exception as e:
+            print(f"[MODELO] GPU falhou no teste: {str(e)[:100]}")
+            mark_failed("whisper", "cuda", e)
+            result["error"] = str(e)[:200]
+    else:
+        result["error"] = "nenhuma GPU CUDA visível"
+    result["probed_at"] = time.strftime("%Y-%m-%d %H:%M:%S")
+    _save_probe(key, result)
+    print(f"[MODELO] Whisper neste host: {result['device']}")
+    return result["device"], result["compute_type"]
+
+def whisper_device_failed(size, err):
+    """A GPU passou no teste mas falhou no uso real: grava CPU para este host"""
+    key, _ = _whisper_probe_key(size)
+    _save_probe(key, {"device": "cpu", "compute_type": "int8", "error": str(err)[:200],
+                      "probed_at": time.strftime("%Y-%m-%d %H:%M:%S")})
+    mark_failed("whisper", "cuda", err)
+
+# ---------------- Liberação ----------------
+def mark_failed(kind, device, err):
+    """Registra que (tipo, device) falhou: libera o que houver e não tenta de novo"""
+    _FAILED[(kind, device)] = str(err)[:200]
+    release(kind, device=device)
+
+def release(kind=None, device=None):
+    """Libera os modelos do tipo (ou todos se kind=None); retorna quantos foram liberados"""
+    keys = [k for k in list(_MODELS) if (kind is None or k[0] == kind) and (device is None or k[2] == device)]
+    for k in keys:
+        _MODELS.pop(k, None)
+        if k[0] == "bark":
+            try:
+                from bark.generation import clean_models
+                clean_models()
+            except Exception:
+                pass
+    if keys:
+        gc.collect()
+        try:
+            import torch
+            if torch.cuda.is_available():
+                torch.cuda.empty_cache()
+        except Exception:
+            pass
+        print(f"[MODELO] Liberados: {', '.join(_label(k) for k in keys)}")
+    return len(keys)
@@ -0,0 +1,106 @@
+# dub_stages.py
+# Grafo de etapas endereçado por conteúdo (stages.json no workdir), como um sistema de build
+# - chave da etapa = hash(parâmetros da etapa + chave da etapa anterior)
+# - a etapa é reutilizada se a chave bate e os arquivos de saída estão intactos (tamanho + mtime)
+# - mudou um parâmetro ou sumiu um arquivo de saída: refaz essa etapa e todas as seguintes
+# - arquivo de saída editado à mão (ex.: asr_trad.json corrigido): é mantido e só as seguintes são refeitas
+# Etapas sem arquivo de saída registrado nunca são consideradas prontas (rodam sempre que alcançadas)
+
+import json, hashlib
+from pathlib import Path
+from datetime import datetime
+
+from dub_cache import write_json_atomic
+
+STAGES_FILE = "stages.json"
+
+def fingerprint(path):
+    """[tamanho, mtime_ns] do arquivo (None se não existe)"""
+    try:
+        st = Path(path).stat()
+    except OSError:
+        return None
+    return [st.st_size, st.st_mtime_ns]
+
+def stage_key(params, upstream=None):
+    blob = json.dumps({"params": params, "upstream": upstream}, sort_keys=True, ensure_ascii=False, default=str)
+    return hashlib.sha1(blob.encode("utf-8")).hexdigest()
+
+class StageGraph:
+    """
+    Uso: graph.plan([(num, nome, params), ...]) -> primeira etapa a refazer
+         graph.done(nome, [arquivos]) ao concluir cada etapa
+    """
+
+    def __init__(self, workdir, force=False):
+        self.workdir = Path(workdir)
+        self.path = Path(workdir, STAGES_FILE)
+        self.stages = {}
+        self.order = []
+        self.keys = {}
+        self.reasons = {}
+        if self.path.exists() and not force:
+            try:
+                with open(self.path, "r", encoding="utf-8") as f:
+                    self.stages = json.load(f).get("stages", {})
+            except (OSError, ValueError):
+                self.stages = {}
+
+    def exists(self):
+        return self.path.exists()
+
+    def _check(self, name):
+        """(motivo para refazer ou None, {arquivo: fingerprint novo} dos editados)"""
+        rec = self.stages.get(name)
+        if not rec:
+            return "nunca executada", {}
+        if rec.get("key") != self.keys[name]:
+            return "parâmetros ou etapa anterior mudaram", {}
+        outputs = rec.get("outputs")
+        if not outputs:
+            return "sem arquivo de saída", {}
+        edited = {}
+        for rel, fp in outputs.items():
+            now = fingerprint(Path(self.workdir, rel))
+            if now is None:
+                return f"{rel} ausente", {}
+            if now != fp:
+                edited[rel] = now
+        return None, edited
+
+    def plan(self, specs):
+        """Calcula as chaves em cadeia; retorna o número da primeira etapa a refazer (None = tudo pronto)"""
+        self.order = [name for _, name, _ in specs]
+        upstream, first, pending = None, None, None
+        for num, name, params in specs:
+            upstream = self.keys[name] = stage_key(params, upstream)
+            if first is not None:
+                continue
+            reason, edited = (pending, {}) if pending else self._check(name)
+            if reason:
+                self.reasons[name] = reason
+                first = num
+            elif edited:
+                # Adota a versão editada (gravada no próximo done) e refaz o que vem depois
+                self.stages[name]["outputs"].update(edited)
+                pending = f"{', '.join(edited)} editado(s): mantido(s), refazendo o que depende"
+        return first
+
+    def reason(self, name):
+        return self.reasons.get(name)
+
+    def done(self, name, outputs=None):
+        """Registra a etapa com a chave desta execução; as etapas seguintes deixam de valer"""
+        rec = {"key": self.keys.get(name), "done_at": datetime.now().isoformat(timespec="seconds"),
+               "outputs": None}
+        if outputs:
+            rec["outputs"] = {}
+            for p in outputs:
+                p = Path(p)
+                rel = p.name if p.parent.resolve() == self.workdir.resolve() else str(p.resolve())
+                rec["outputs"][rel] = fingerprint(p)
+        self.stages[name] = rec
+        if name in self.order:
+            for later in self.order[self.order.index(name) + 1:]:
+                self.stages.pop(later, None)
+        write_json_atomic(self.path, {"stages": self.stages})
@@ -2,16 +2,26 @@
 # Pipeline de dublagem com MELHORIAS DE SINCRONIZAÇÃO AVANÇADAS
 # Inclui: VAD, estimador de duração, densidade linguística, elastic sync, métricas
 
-import os, sys, json, csv, argparse, subprocess, shutil, re, warnings
+import os, sys, json, csv, time, argparse, subprocess, shutil, re, warnings
 from pathlib import Path
 import numpy as np
 
+import dub_audio, dub_models, dub_metrics
+from dub_cache import TranslationMemory
+
 warnings.filterwarnings("ignore")
 
 # ---------------- utilidades ----------------
+# Motor de áudio das etapas 6.1/7: "numpy" (em processo) ou "ffmpeg" (um processo por segmento)
+AUDIO_ENGINE = "numpy"
+
 def sh(cmd, cwd=None):
     print(">>", " ".join(map(str, cmd)))
-    subprocess.run(cmd, check=True, cwd=cwd)
+    t0 = time.perf_counter()
+    try:
+        subprocess.run(cmd, check=True, cwd=cwd)
+    finally:
+        dub_metrics.record_subprocess(cmd, time.perf_counter() - t0, cwd)
 
 def make_silence_wav(workdir, idx, dur, sr):
     out = Path(workdir, f"sil_{idx:04d}.wav")
@@ -29,16 +39,8 @@ def ensure_ffmpeg():
             sys.exit(1)
 
 def ffprobe_duration(path):
-    try:
-        out = subprocess.check_output([
-            "ffprobe", "-v", "error",
-            "-show_entries", "format=duration",
-            "-of", "default=nk=1:nw=1",
-            str(path)
-        ], text=True).strip()
-        return max(0.0, float(out))
-    except Exception:
-        return 0.0
+    # Lê o cabeçalho WAV (ffprobe só para outros containers), com cache por path+mtime+size
+    return dub_audio.probe_duration(path)
 
 def ts_stamp(t):
     h = int(t // 3600)
@@ -90,11 +92,19 @@ class LinguisticDensity:
         return words / max(duration, 0.1)
 
 # ---------------- NOVO: VAD - Voice Activity Detection ----------------
-def detect_speech_pauses(audio_path, min_silence_dur=0.3):
+def detect_speech_pauses(audio_path, min_silence_dur=0.3, streaming=True):
     """
     Detecta pausas naturais na fala usando análise de energia do áudio
     Retorna lista de (start, end) em segundos das pausas detectadas
+    streaming: lê o WAV em blocos (sem carregar/reamostrar o arquivo inteiro)
     """
+    if streaming:
+        try:
+            pauses = dub_audio.detect_pauses_stream(audio_path, min_silence_dur)
+            print(f"  Detectadas {len(pauses)} pausas naturais (>{min_silence_dur}s)")
+            return pauses
+        except (ValueError, OSError) as e:
+            print(f"  [AVISO] VAD em streaming indisponível ({e}), usando librosa")
     try:
         import librosa
         # Carrega áudio
@@ -112,23 +122,8 @@ def detect_speech_pauses(audio_path, min_silence_dur=0.3):
         # Detecta frames silenciosos
         silent_frames = rms < threshold
 
-        # Converte frames para timestamps
-        times = librosa.frames_to_time(np.arange(len(silent_frames)), sr=sr, hop_length=hop_length)
-
-        # Agrupa silêncios consecutivos
-        pauses = []
-        in_pause = False
-        pause_start = 0
-
-        for i, (is_silent, time) in enumerate(zip(silent_frames, times)):
-            if is_silent and not in_pause:
-                pause_start = time
-                in_pause = True
-            elif not is_silent and in_pause:
-                pause_dur = time - pause_start
-                if pause_dur >= min_silence_dur:
-                    pauses.append((pause_start, time))
-                in_pause = False
+        # Agrupa silêncios consecutivos (vetorizado)
+        pauses = dub_audio.pauses_from_mask(silent_frames, hop_length / sr, min_silence_dur)
 
         print(f"  Detectadas {len(pauses)} pausas naturais (>{min_silence_dur}s)")
         return pauses
@@ -171,30 +166,26 @@ def estimate_tts_duration(text, lang="pt", base_wps=2.5):
     return max(total, 0.5)  # Mínimo 0.5s
 
 # ---------------- etapa 3: ASR ----------------
-def transcribe_faster_whisper(wav_path, workdir, src_lang):
+def transcribe_faster_whisper(wav_path, workdir, src_lang, reprobe=False):
     print("\n=== ETAPA 3: Transcrição (Whisper) ===")
-    from faster_whisper import WhisperModel
 
-    # Tenta GPU primeiro, se falhar usa CPU
-    model = None
+    # Dispositivo escolhido uma vez por host (teste curto em cache, ver dub_models.whisper_device)
+    # Modelos residentes no processo (dub_models): se o teste passou na GPU, o modelo já está carregado
+    device, compute_type = dub_models.whisper_device("medium", refresh=reprobe)
+    model = dub_models.whisper("medium", device=device, compute_type=compute_type)
     try:
-        print("Tentando usar GPU (CUDA)...")
-        model = WhisperModel("medium", device="cuda", compute_type="float16")
-        print("✓ GPU carregada, testando...")
-        # Testa se realmente funciona
-        test_segments, _ = model.transcribe(str(wav_path), language=src_lang, vad_filter=True)
-        # Se chegou aqui, GPU funciona
-        print("✓ GPU funcionando!")
-        segments = test_segments
+        segments, _ = model.transcribe(str(wav_path), language=src_lang, vad_filter=True)
+        segs = [{"start": float(s.start), "end": float(s.end), "text": (s.text or "").strip()} for s in segments]
     except Exception as e:
-        print(f"✗ GPU falhou: {str(e)[:100]}")
+        if device != "cuda":
+            raise
+        # Raro depois do teste: registra CPU para este host e refaz
+        print(f"✗ GPU falhou na transcrição: {str(e)[:100]}")
         print("Usando CPU (mais lento mas confiável)...")
-        model = WhisperModel("medium", device="cpu", compute_type="int8")
+        dub_models.whisper_device_failed("medium", e)
+        model = dub_models.whisper("medium", device="cpu", compute_type="int8")
         segments, _ = model.transcribe(str(wav_path), language=src_lang, vad_filter=True)
-
-    segs = []
-    for s in segments:
-        segs.append({"start": float(s.start), "end": float(s.end), "text": (s.text or "").strip()})
+        segs = [{"start": float(s.start), "end": float(s.end), "text": (s.text or "").strip()} for s in segments]
 
     srt_path = Path(workdir, "asr.srt")
     json_path = Path(workdir, "asr.json")
@@ -207,12 +198,10 @@ def transcribe_faster_whisper(wav_path, workdir, src_lang):
     return json_path, srt_path, segs
 
 # ---------------- etapa 4: tradução ----------------
-def translate_segments_m2m100(segs, src, tgt, workdir):
+def translate_segments_m2m100(segs, src, tgt, workdir, tm=None):
     print("\n=== ETAPA 4: Tradução (facebook/m2m100_418M) ===")
-    from transformers import AutoTokenizer, AutoModelForSeq2SeqLM
     model_name = "facebook/m2m100_418M"
-    tok = AutoTokenizer.from_pretrained(model_name)
-    model = AutoModelForSeq2SeqLM.from_pretrained(model_name)
+    tok, model = dub_models.m2m100(model_name)
 
     src = (src or "en").lower()
     tgt = (tgt or "pt").lower()
@@ -220,8 +209,18 @@ def translate_segments_m2m100(segs, src, tgt, workdir):
         if src not in tok.lang_code_to_id: src = "en"
         if tgt not in tok.lang_code_to_id: tgt = "pt"
 
-    out, batch, idxs = [], [], []
+    out, batch, idxs = [None] * len(segs), [], []
     max_batch = 8
+    gen_params = {"max_new_tokens": 200}
+
+    def add(i, txt):
+        item = dict(segs[i])
+        item["text_trad"] = txt.strip()
+        # NOVO: Adiciona métricas de densidade
+        dur = item["end"] - item["start"]
+        item["original_wps"] = LinguisticDensity.calculate_wps(item.get("text", ""), dur)
+        item["trad_estimated_dur"] = estimate_tts_duration(txt.strip(), tgt)
+        out[i] = item
 
     def flush():
         nonlocal out, batch, idxs
@@ -229,23 +228,26 @@ def translate_segments_m2m100(segs, src, tgt, workdir):
             return
         tok.src_lang = src
         enc = tok(batch, return_tensors="pt", padding=True, truncation=True)
-        gen = model.generate(**enc, forced_bos_token_id=tok.get_lang_id(tgt), max_new_tokens=200)
+        gen = model.generate(**enc, forced_bos_token_id=tok.get_lang_id(tgt), **gen_params)
         texts = tok.batch_decode(gen, skip_special_tokens=True)
         for j, txt in enumerate(texts):
-            i = idxs[j]
-            item = dict(segs[i])
-            item["text_trad"] = txt.strip()
-            # NOVO: Adiciona métricas de densidade
-            dur = item["end"] - item["start"]
-            item["original_wps"] = LinguisticDensity.calculate_wps(item.get("text", ""), dur)
-            item["trad_estimated_dur"] = estimate_tts_duration(txt.strip(), tgt)
-            out.append(item)
+            if tm is not None:
+                tm.store(model_name, src, tgt, batch[j], txt.strip(), gen_params)
+            add(idxs[j], txt)
         batch.clear(); idxs.clear()
 
     for i, s in enumerate(segs):
+        # Memória de tradução: reaproveita segmentos já traduzidos
+        hit = tm.lookup(model_name, src, tgt, s.get("text",""), gen_params) if tm is not None else None
+        if hit is not None:
+            add(i, hit)
+            continue
         batch.append(s.get("text","")); idxs.append(i)
         if len(batch) >= max_batch: flush()
     flush()
+    if tm is not None:
+        print(f"Memória de tradução: {tm.stats['exact_hits']} exatos, "
+              f"{tm.stats['fuzzy_hits']} aproximados, {tm.stats['misses']} novos")
 
     srt_t = Path(workdir, "asr_trad.srt")
     json_t = Path(workdir, "asr_trad.json")
@@ -258,7 +260,7 @@ def translate_segments_m2m100(segs, src, tgt, workdir):
     return out, json_t, srt_t
 
 # ---------------- MELHORADO: etapa 5: split inteligente com VAD ----------------
-def split_long_segments_vad(segments, maxdur, audio_src_path=None):
+def split_long_segments_vad(segments, maxdur, audio_src_path=None, pause_index=None):
     """
     Split inteligente melhorado que considera:
     - Pausas naturais detectadas por VAD
@@ -270,11 +272,13 @@ def split_long_segments_vad(segments, maxdur, audio_src_path=None):
         print("Split desativado.")
         return segments
 
-    # Detecta pausas naturais no áudio original
-    pauses = []
-    if audio_src_path and Path(audio_src_path).exists():
-        print("Detectando pausas naturais no áudio...")
-        pauses = detect_speech_pauses(audio_src_path, min_silence_dur=0.3)
+    # Detecta pausas naturais no áudio original (ou reaproveita o índice já calculado)
+    if pause_index is None:
+        pauses = []
+        if audio_src_path and Path(audio_src_path).exists():
+            print("Detectando pausas naturais no áudio...")
+            pauses = detect_speech_pauses(audio_src_path, min_silence_dur=0.3)
+        pause_index = dub_audio.PauseIndex(pauses)
 
     out = []
     for s in segments:
@@ -288,7 +292,7 @@ def split_long_segments_vad(segments, maxdur, audio_src_path=None):
             continue
 
         # Verifica se há pausas naturais neste segmento
-        segment_pauses = [(p[0], p[1]) for p in pauses if start <= p[0] < end]
+        segment_pauses = pause_index.within(start, end)
 
         # Se há pausas naturais, usa elas como pontos de divisão
         if segment_pauses:
@@ -382,13 +386,8 @@ def tts_bark(segments, workdir, text_temp=0.6, wave_temp=0.6, history_prompt=Non
 
     print("Usando CPU para TTS (evita problemas de cuDNN)")
 
-    history = None
-    if history_prompt:
-        try:
-            from bark.generation import load_history_prompt
-            history = load_history_prompt(history_prompt)
-        except Exception:
-            history = history_prompt
+    dub_models.bark()
+    history = dub_models.bark_history(history_prompt)
 
     seg_files = []
     tsv = Path(workdir, "segments.csv")
@@ -404,8 +403,10 @@ def tts_bark(segments, workdir, text_temp=0.6, wave_temp=0.6, history_prompt=Non
             estimated = s.get("trad_estimated_dur", estimate_tts_duration(txt, "pt"))
 
             out = Path(workdir, f"seg_{i:04d}.wav")
+            t0 = time.perf_counter()
             audio = generate_audio(txt, history_prompt=history, text_temp=text_temp, waveform_temp=wave_temp)
             write(out, SAMPLE_RATE, audio)
+            dub_metrics.segment("tts", i, time.perf_counter() - t0)
 
             # NOVO: Mede duração real
             actual_dur = ffprobe_duration(out)
@@ -418,14 +419,13 @@ def tts_bark(segments, workdir, text_temp=0.6, wave_temp=0.6, history_prompt=Non
 
 def tts_coqui(segments, workdir, tgt_lang, speaker=None):
     print("\n=== ETAPA 6: TTS (Coqui) ===")
-    from TTS.api import TTS
     lang = (tgt_lang or "en").lower()
     if lang in ("pt","pt-br","pt_pt"):
         model_name = "tts_models/pt/cv/vits"; sample_rate = 22050
     else:
         model_name = "tts_models/en/ljspeech/tacotron2-DDC"; sample_rate = 22050
 
-    tts = TTS(model_name, gpu=False)
+    tts = dub_models.coqui(model_name, gpu=False)
     seg_files = []
     tsv = Path(workdir, "segments.csv")
     with open(tsv, "w", encoding="utf-8", newline="") as fcsv:
@@ -439,6 +439,7 @@ def tts_coqui(segments, workdir, tgt_lang, speaker=None):
             estimated = s.get("trad_estimated_dur", estimate_tts_duration(txt, tgt_lang))
 
             out = Path(workdir, f"seg_{i:04d}.wav")
+            t0 = time.perf_counter()
             if speaker:
                 try:
                     tts.tts_to_file(text=txt, file_path=str(out), speaker=speaker, language=tgt_lang)
@@ -446,6 +447,7 @@ def tts_coqui(segments, workdir, tgt_lang, speaker=None):
                     tts.tts_to_file(text=txt, file_path=str(out))
             else:
                 tts.tts_to_file(text=txt, file_path=str(out))
+            dub_metrics.segment("tts", i, time.perf_counter() - t0)
 
             actual_dur = ffprobe_duration(out)
             seg_files.append(out)
@@ -462,10 +464,27 @@ def atempo_chain(factor):
     chain.append(f"atempo={f:.6f}")
     return ",".join(chain)
 
+def apply_audio_chain(in_path, out_path, workdir, fchain, sr=None, **ops):
+    """
+    Aplica fade/tempo/pad/trim em memória (dub_audio) e escreve só o arquivo final
+    Usa ffmpeg com a cadeia -af equivalente se AUDIO_ENGINE="ffmpeg" ou se o WAV não for suportado
+    """
+    if AUDIO_ENGINE == "numpy":
+        try:
+            dub_audio.process_file(Path(workdir, in_path.name), Path(workdir, out_path.name), sr=sr, **ops)
+            return out_path
+        except (ValueError, OSError) as e:
+            print(f"  [AVISO] Motor NumPy falhou em {in_path.name} ({e}), usando ffmpeg")
+    cmd = ["ffmpeg","-y","-i", in_path.name, "-af", fchain]
+    if sr:
+        cmd += ["-ar", str(sr), "-ac","1"]
+    sh(cmd + [out_path.name], cwd=workdir)
+    return out_path
+
 def safe_fade(in_path, out_path, workdir, fad=0.02):
-    sh(["ffmpeg","-y","-i", in_path.name,
-        "-af", f"afade=t=in:ss=0:d={fad},areverse,afade=t=in:ss=0:d={fad},areverse",
-        out_path.name], cwd=workdir)
+    apply_audio_chain(in_path, out_path, workdir,
+                      f"afade=t=in:ss=0:d={fad},areverse,afade=t=in:ss=0:d={fad},areverse",
+                      fade=fad)
 
 def sync_fit(p, target, workdir, sr, tol, maxstretch):
     cur = ffprobe_duration(Path(workdir, p.name))
@@ -480,9 +499,10 @@ def sync_fit(p, target, workdir, sr, tol, maxstretch):
         out = Path(workdir, p.name.replace(".wav", "_fit.wav"))
         if diff >= 0:
             fchain = f"apad=pad_dur={diff:.6f},atrim=duration={target:.6f}"
+            apply_audio_chain(p, out, workdir, fchain, sr=sr, pad=diff, trim=target)
         else:
             fchain = f"atrim=duration={target:.6f}"
-        sh(["ffmpeg","-y","-i", p.name, "-af", fchain, "-ar", str(sr), "-ac","1", out.name], cwd=workdir)
+            apply_audio_chain(p, out, workdir, fchain, sr=sr, trim=target)
         return out, 1.0
 
     ratio = (cur / target) if target > 0 else 1.0
@@ -490,7 +510,7 @@ def sync_fit(p, target, workdir, sr, tol, maxstretch):
     f_atempo = atempo_chain(ratio)
     out = Path(workdir, p.name.replace(".wav", "_fit.wav"))
     fchain = f"{f_atempo},atrim=duration={target:.6f}"
-    sh(["ffmpeg","-y","-i", p.name, "-af", fchain, "-ar", str(sr), "-ac","1", out.name], cwd=workdir)
+    apply_audio_chain(p, out, workdir, fchain, sr=sr, tempo=ratio, trim=target)
     return out, ratio
 
 def sync_pad(p, target, workdir, sr):
@@ -499,12 +519,12 @@ def sync_pad(p, target, workdir, sr):
         return p, 1.0
     if cur >= target:
         out = Path(workdir, p.name.replace(".wav","_pad.wav"))
-        sh(["ffmpeg","-y","-i", p.name, "-af", f"atrim=duration={target:.6f}", "-ar", str(sr), "-ac","1", out.name], cwd=workdir)
+        apply_audio_chain(p, out, workdir, f"atrim=duration={target:.6f}", sr=sr, trim=target)
         return out, 1.0
     pad_dur = max(target - cur, 0.0)
     out = Path(workdir, p.name.replace(".wav","_pad.wav"))
-    sh(["ffmpeg","-y","-i", p.name, "-af", f"apad=pad_dur={pad_dur:.6f},atrim=duration={target:.6f}",
-        "-ar", str(sr), "-ac","1", out.name], cwd=workdir)
+    apply_audio_chain(p, out, workdir, f"apad=pad_dur={pad_dur:.6f},atrim=duration={target:.6f}",
+                      sr=sr, pad=pad_dur, trim=target)
     return out, 1.0
 
 def sync_smart(p, target, workdir, sr, tol, maxstretch):
@@ -519,51 +539,24 @@ def sync_smart(p, target, workdir, sr, tol, maxstretch):
         return p, 1.0
 
 # ---------------- NOVO: Elastic Sync com redistribuição ----------------
-def sync_elastic(segments_data, workdir, sr, tol=0.15, maxstretch=1.35):
+def sync_elastic(segments_data, workdir, sr, tol=0.15, maxstretch=1.35, pause_index=None, total_duration=None):
     """
     Sincronização elástica que redistribui tempo entre segmentos adjacentes
-    segments_data: lista de (path, target_duration, segment_info)
+    segments_data: lista de (path, target_duration, segment_info), não é modificada
+    Alvos resolvidos para a lista inteira de uma vez (dub_audio.elastic_targets)
     """
     print("\n=== Modo ELASTIC: Redistribuindo tempo entre segmentos ===")
 
     # Mede durações reais
-    actual_durations = []
-    for path, target, seg in segments_data:
-        actual = ffprobe_duration(Path(workdir, path.name))
-        actual_durations.append(actual)
-
-    # Calcula deslocamento acumulado
-    cumulative_offset = 0
-    adjusted_targets = []
-
-    for i, (path, target, seg) in enumerate(segments_data):
-        actual = actual_durations[i]
-        diff = actual - target
-
-        # Acumula deslocamento
-        cumulative_offset += diff
-
-        # Se deslocamento acumulado é grande, redistribui nos próximos segmentos
-        if abs(cumulative_offset) > 0.5 and i < len(segments_data) - 1:
-            # Distribui o offset nos próximos N segmentos
-            lookahead = min(5, len(segments_data) - i - 1)
-            compensation_per_seg = cumulative_offset / lookahead
-
-            # Ajusta alvos futuros
-            for j in range(i + 1, min(i + 1 + lookahead, len(segments_data))):
-                segments_data[j] = (
-                    segments_data[j][0],
-                    segments_data[j][1] - compensation_per_seg,
-                    segments_data[j][2]
-                )
-
-            cumulative_offset = 0
-
-        adjusted_targets.append(target)
+    actual_durations = [ffprobe_duration(Path(workdir, path.name)) for path, _, _ in segments_data]
+    segs = [seg for _, _, seg in segments_data]
+    adjusted_targets = dub_audio.elastic_targets(actual_durations, [s["start"] for s in segs],
+                                                 [s["end"] for s in segs], maxstretch,
+                                                 pauses=pause_index, total_duration=total_duration)
 
     # Aplica sync_fit com alvos ajustados
     results = []
-    for i, (path, target, seg) in enumerate(segments_data):
+    for (path, _, seg), target in zip(segments_data, adjusted_targets):
         adjusted_path, ratio = sync_fit(path, target, workdir, sr, tol, maxstretch)
         results.append((adjusted_path, ratio, seg))
 
@@ -613,8 +606,19 @@ def calculate_sync_metrics(segments_info):
     return metrics
 
 # ---------------- etapa 8: concat ----------------
-def concat_segments(seg_files, workdir, samplerate, segs_trad=None, preserve_gaps=False, gap_min=0.20):
+def concat_segments(seg_files, workdir, samplerate, segs_trad=None, preserve_gaps=False, gap_min=0.20,
+                    render="concat", total_duration=None):
     print("\n=== ETAPA 8: Concatenação ===")
+    out = Path(workdir, "dub_raw.wav")
+
+    # Linha do tempo: cada segmento no seu "start", numa única escrita
+    if render == "timeline" and segs_trad is not None and len(segs_trad) == len(seg_files):
+        print(f"Renderizando linha do tempo ({len(seg_files)} segmentos)...")
+        return dub_audio.render_timeline(seg_files, [s["start"] for s in segs_trad], out,
+                                         samplerate, total_duration)
+    if render == "timeline":
+        print("  [AVISO] Segmentos sem timestamps correspondentes, usando concat")
+
     lst = Path(workdir, "list.txt")
     files_for_concat = []
 
@@ -633,7 +637,6 @@ def concat_segments(seg_files, workdir, samplerate, segs_trad=None, preserve_gap
         for p in files_for_concat:
             f.write(f"file '{p.name}'\n")
 
-    out = Path(workdir, "dub_raw.wav")
     sh([
         "ffmpeg","-y","-f","concat","-safe","0","-i", lst.name,
         "-c:a","pcm_s16le","-ar", str(samplerate),"-ac","1", out.name
@@ -641,10 +644,14 @@ def concat_segments(seg_files, workdir, samplerate, segs_trad=None, preserve_gap
     return out
 
 # ---------------- etapa 9: pós ----------------
-def postprocess_audio(wav_in, workdir, samplerate):
+def postprocess_audio(wav_in, workdir, samplerate, loudnorm="dynamic"):
     print("\n=== ETAPA 9: Pós-processo ===")
     out = Path(workdir, "dub_final.wav")
     fx = "loudnorm=I=-16:TP=-1.5:LRA=11,afftdn=nf=-25,equalizer=f=6500:t=h:width=2000:g=-4"
+    if loudnorm == "measured":
+        # Duas passadas: medição em cache no workdir (pelo hash do dub_raw), normalização linear
+        measured = dub_audio.loudnorm_measure(Path(workdir, wav_in.name), Path(workdir, "loudnorm.json"))
+        fx = dub_audio.loudnorm_filter(measured) + ",afftdn=nf=-25,equalizer=f=6500:t=h:width=2000:g=-4"
     sh(["ffmpeg","-y","-i", wav_in.name, "-af", fx, "-ar", str(samplerate), "-ac","1", out.name], cwd=workdir)
     return out
 
@@ -675,15 +682,31 @@ def main():
     ap.add_argument("--texttemp", type=float, default=0.6)
     ap.add_argument("--wavetemp", type=float, default=0.6)
     ap.add_argument("--fade", type=float, default=0.02)
+    ap.add_argument("--audio-engine", choices=["numpy","ffmpeg"], default="numpy",
+                    help="Fade/sync em memória (numpy) ou via ffmpeg por segmento")
 
     ap.add_argument("--preserve-gaps", action="store_true")
     ap.add_argument("--gap-min", type=float, default=0.20)
+    ap.add_argument("--render", choices=["concat","timeline"], default="concat",
+                    help="ETAPA 8: concat (ffmpeg + silêncios) ou timeline (cada segmento no seu timestamp, uma passada)")
+    ap.add_argument("--loudnorm", choices=["dynamic","measured"], default="dynamic",
+                    help="ETAPA 9: loudnorm dinâmico (uma passada) ou medido (duas passadas, linear; medição em cache no workdir)")
     ap.add_argument("--enable-vad", action="store_true", help="Ativa detecção de pausas naturais")
+    ap.add_argument("--tm", dest="tm_path", default=None, help="Arquivo SQLite da memória de tradução (padrão: ~/.cache/dublar)")
+    ap.add_argument("--tm-fuzzy", type=float, default=0.0, help="Similaridade mínima para busca aproximada na memória (0 = só exata)")
+    ap.add_argument("--no-tm", action="store_true", help="Desativa a memória de tradução")
+    ap.add_argument("--workdir", default="dub_work", help="Diretório de trabalho (um por vídeo para rodar jobs lado a lado)")
+    ap.add_argument("--reprobe-device", action="store_true",
+                    help="Refaz o teste de GPU do Whisper (ignora o resultado em cache deste host)")
+    ap.add_argument("--trace", default=None, help="Grava eventos de etapa/segmento/subprocesso em JSON-lines neste arquivo")
 
     args = ap.parse_args()
 
+    global AUDIO_ENGINE
+    AUDIO_ENGINE = args.audio_engine
+
     ensure_ffmpeg()
-    workdir = Path("dub_work"); workdir.mkdir(exist_ok=True)
+    workdir = Path(args.workdir); workdir.mkdir(parents=True, exist_ok=True)
 
     video_in = Path(args.inp).resolve()
     if not video_in.exists():
@@ -692,84 +715,102 @@ def main():
     outdir = Path("dublado")
     outdir.mkdir(exist_ok=True)
     out_mp4 = Path(args.out) if args.out else (outdir / video_in.name)
+    rec = dub_metrics.Recorder(args.trace, job=workdir.name)
 
     print("\n=== ETAPA 2: Extração de áudio ===")
     audio_src = Path(workdir, "audio_src.wav")
-    sh(["ffmpeg","-y","-i", str(video_in), "-vn", "-ac","1","-ar","48000","-c:a","pcm_s16le", str(audio_src)])
+    with rec.stage("2_extracao"):
+        sh(["ffmpeg","-y","-i", str(video_in), "-vn", "-ac","1","-ar","48000","-c:a","pcm_s16le", str(audio_src)])
 
     # Etapas 3-5
-    asr_json, asr_srt, segs = transcribe_faster_whisper(audio_src, workdir, args.src)
-    segs_trad, trad_json, trad_srt = translate_segments_m2m100(segs, args.src, args.tgt, workdir)
-
-    # Split com VAD se habilitado
+    with rec.stage("3_transcricao"):
+        asr_json, asr_srt, segs = transcribe_faster_whisper(audio_src, workdir, args.src, reprobe=args.reprobe_device)
+    # Um vídeo por execução: nada a reaproveitar, a GPU/RAM fica para a tradução e o TTS
+    dub_models.release("whisper")
+    tm = None if args.no_tm else TranslationMemory(args.tm_path, fuzzy=args.tm_fuzzy)
+    with rec.stage("4_traducao"):
+        segs_trad, trad_json, trad_srt = translate_segments_m2m100(segs, args.src, args.tgt, workdir, tm=tm)
+    dub_models.release("m2m100")
+
+    # Split com VAD se habilitado (pausas indexadas uma vez, reusadas na sync)
+    pause_index = None
     if args.enable_vad:
-        segs_trad = split_long_segments_vad(segs_trad, args.maxdur, audio_src)
-    else:
-        # Usa função original simplificada
-        segs_trad = split_long_segments_vad(segs_trad, args.maxdur, None)
+        print("\nDetectando pausas naturais no áudio...")
+        with rec.stage("vad_pausas"):
+            pause_index = dub_audio.PauseIndex(detect_speech_pauses(audio_src, min_silence_dur=0.3))
+    with rec.stage("5_split"):
+        segs_trad = split_long_segments_vad(segs_trad, args.maxdur, None, pause_index=pause_index)
 
     # Etapa 6: TTS
-    if args.tts == "bark":
-        seg_files, sr_segs = tts_bark(segs_trad, workdir, text_temp=args.texttemp, wave_temp=args.wavetemp, history_prompt=args.voice)
-    else:
-        seg_files, sr_segs = tts_coqui(segs_trad, workdir, args.tgt, speaker=args.voice)
+    with rec.stage("6_tts"):
+        if args.tts == "bark":
+            seg_files, sr_segs = tts_bark(segs_trad, workdir, text_temp=args.texttemp, wave_temp=args.wavetemp, history_prompt=args.voice)
+        else:
+            seg_files, sr_segs = tts_coqui(segs_trad, workdir, args.tgt, speaker=args.voice)
 
     # Etapa 6.1: Fade
     if args.fade and args.fade > 0:
         print("\n=== ETAPA 6.1: Micro-fade ===")
         xf_files = []
-        for i, _ in enumerate(segs_trad, 1):
-            base = Path(workdir, f"seg_{i:04d}.wav")
-            out = Path(workdir, f"seg_{i:04d}_xf.wav")
-            safe_fade(base, out, workdir, args.fade)
-            xf_files.append(out)
+        with rec.stage("6.1_fade"):
+            for i, _ in enumerate(segs_trad, 1):
+                base = Path(workdir, f"seg_{i:04d}.wav")
+                out = Path(workdir, f"seg_{i:04d}_xf.wav")
+                t0 = time.perf_counter()
+                safe_fade(base, out, workdir, args.fade)
+                rec.segment("fade", i, time.perf_counter() - t0)
+                xf_files.append(out)
         seg_files = xf_files
 
     # Etapa 7: Sincronização
     print("\n=== ETAPA 7: Sincronização ===")
-    fixed = []
-    sync_info = []
-
-    if args.sync == "elastic":
-        # Prepara dados para elastic sync
-        segments_data = []
-        for i, s in enumerate(segs_trad, 1):
-            target = max(0.05, s["end"] - s["start"])
-            p = Path(workdir, f"seg_{i:04d}{'_xf' if (args.fade and args.fade > 0) else ''}.wav")
-            segments_data.append((p, target, s))
-
-        results = sync_elastic(segments_data, workdir, sr_segs, args.tolerance, args.maxstretch)
-        for path, ratio, seg in results:
-            fixed.append(path)
-            sync_info.append({
-                "target": seg["end"] - seg["start"],
-                "actual": ffprobe_duration(path),
-                "ratio": ratio
-            })
-    else:
-        # Sync normal
-        for i, s in enumerate(segs_trad, 1):
-            target = max(0.05, s["end"] - s["start"])
-            p = Path(workdir, f"seg_{i:04d}{'_xf' if (args.fade and args.fade > 0) else ''}.wav")
-
-            if args.sync == "none":
-                fixed.append(p)
-                ratio = 1.0
-            elif args.sync == "fit":
-                synced, ratio = sync_fit(p, target, workdir, sr_segs, args.tolerance, args.maxstretch)
-                fixed.append(synced)
-            elif args.sync == "pad":
-                synced, ratio = sync_pad(p, target, workdir, sr_segs)
-                fixed.append(synced)
-            elif args.sync == "smart":
-                synced, ratio = sync_smart(p, target, workdir, sr_segs, args.tolerance, args.maxstretch)
-                fixed.append(synced)
-
-            sync_info.append({
-                "target": target,
-                "actual": ffprobe_duration(fixed[-1]),
-                "ratio": ratio
-            })
+    with rec.stage("7_sync"):
+        fixed = []
+        sync_info = []
+
+        if args.sync == "elastic":
+            # Prepara dados para elastic sync
+            segments_data = []
+            for i, s in enumerate(segs_trad, 1):
+                target = max(0.05, s["end"] - s["start"])
+                p = Path(workdir, f"seg_{i:04d}{'_xf' if (args.fade and args.fade > 0) else ''}.wav")
+                segments_data.append((p, target, s))
+
+            results = sync_elastic(segments_data, workdir, sr_segs, args.tolerance, args.maxstretch,
+                                   pause_index=pause_index, total_duration=ffprobe_duration(audio_src))
+            for path, ratio, seg in results:
+                fixed.append(path)
+                sync_info.append({
+                    "target": seg["end"] - seg["start"],
+                    "actual": ffprobe_duration(path),
+                    "ratio": ratio
+                })
+        else:
+            # Sync normal
+            for i, s in enumerate(segs_trad, 1):
+                target = max(0.05, s["end"] - s["start"])
+                p = Path(workdir, f"seg_{i:04d}{'_xf' if (args.fade and args.fade > 0) else ''}.wav")
+
+                t0 = time.perf_counter()
+                if args.sync == "none":
+                    fixed.append(p)
+                    ratio = 1.0
+                elif args.sync == "fit":
+                    synced, ratio = sync_fit(p, target, workdir, sr_segs, args.tolerance, args.maxstretch)
+                    fixed.append(synced)
+                elif args.sync == "pad":
+                    synced, ratio = sync_pad(p, target, workdir, sr_segs)
+                    fixed.append(synced)
+                elif args.sync == "smart":
+                    synced, ratio = sync_smart(p, target, workdir, sr_segs, args.tolerance, args.maxstretch)
+                    fixed.append(synced)
+                rec.segment("sync", i, time.perf_counter() - t0, ratio=round(ratio, 4))
+
+                sync_info.append({
+                    "target": target,
+                    "actual": ffprobe_duration(fixed[-1]),
+                    "ratio": ratio
+                })
 
     seg_files = fixed
 
@@ -777,9 +818,13 @@ def main():
     metrics = calculate_sync_metrics(sync_info)
 
     # Etapas 8-10
-    dub_raw = concat_segments(seg_files, workdir, sr_segs, segs_trad=segs_trad, preserve_gaps=args.preserve_gaps, gap_min=args.gap_min)
-    dub_final = postprocess_audio(dub_raw, workdir, args.rate)
-    mux_video(video_in, dub_final, out_mp4, args.bitrate)
+    with rec.stage("8_concat"):
+        dub_raw = concat_segments(seg_files, workdir, sr_segs, segs_trad=segs_trad, preserve_gaps=args.preserve_gaps, gap_min=args.gap_min,
+                                  render=args.render, total_duration=ffprobe_duration(audio_src))
+    with rec.stage("9_posprocesso"):
+        dub_final = postprocess_audio(dub_raw, workdir, args.rate, loudnorm=args.loudnorm)
+    with rec.stage("10_mux"):
+        mux_video(video_in, dub_final, out_mp4, args.bitrate)
 
     # Logs
     logs = {
@@ -794,9 +839,14 @@ def main():
         "sync": args.sync, "tolerance": args.tolerance, "maxstretch": args.maxstretch,
         "maxdur": args.maxdur, "texttemp": args.texttemp, "wavetemp": args.wavetemp,
         "fade": args.fade, "preserve_gaps": args.preserve_gaps, "gap_min": args.gap_min,
+        "render": args.render, "loudnorm": args.loudnorm,
         "vad_enabled": args.enable_vad,
-        "sync_metrics": metrics
+        "sync_metrics": metrics,
+        "translation_memory": dict(tm.stats, path=str(tm.path)) if tm else None,
+        "model_load_s": dict(dub_models.LOAD_TIMES),
+        "instrumentation": rec.summary()
     }
+    rec.close()
     with open(Path(workdir, "logs.json"), "w", encoding="utf-8") as f:
         json.dump(logs, f, ensure_ascii=False, indent=2)
 
@@ -2,11 +2,16 @@
 # Pipeline de dublagem OTIMIZADO PARA CONTEÚDO TÉCNICO
 # Inclui: glossário técnico, tradução consciente de comprimento, preservação de termos
 
-import os, sys, json, csv, argparse, subprocess, shutil, re, warnings
+import os, sys, json, csv, time, argparse, subprocess, shutil, re, warnings, queue, threading
 from pathlib import Path
 import numpy as np
 from datetime import datetime
 
+import dub_audio, dub_models, dub_metrics
+from dub_duration import DurationModel
+from dub_stages import StageGraph, fingerprint
+from dub_cache import SegmentManifest, TTSCache, TranslationMemory, text_hash, write_json_atomic
+
 # Detecção automática de GPU/CUDA
 # Se quiser forçar CPU, descomente a linha abaixo:
 # os.environ["CUDA_VISIBLE_DEVICES"] = "-1"
@@ -27,6 +32,94 @@ def save_checkpoint(workdir, step_num, step_name):
         json.dump(checkpoint, f, indent=2, ensure_ascii=False)
     print(f"[CHECKPOINT] Etapa {step_num} salva: {step_name}")
 
+def stage_specs(args, video_in, out_mp4):
+    """Parâmetros que definem a saída de cada etapa (chaves do stages.json, em cadeia)"""
+    glossary = json.dumps([TECH_GLOSSARY, sorted(PRESERVE_TERMS)], sort_keys=True, ensure_ascii=False, default=str)
+    return [
+        (2, "2_extracao", {"video": str(Path(video_in).resolve()), "fp": fingerprint(video_in), "ar": 48000}),
+        (3, "3_transcricao", {"src": args.src, "model": "medium",
+                              "chunks": args.asr_chunk if args.asr_workers > 1 else None}),
+        (4, "4_traducao", {"src": args.src, "tgt": args.tgt, "model": M2M100_MODEL,
+                           "simplify": not args.no_simplify, "beams": args.mt_beams,
+                           "tm_fuzzy": None if args.no_tm else args.tm_fuzzy,
+                           "duration_model": not args.no_duration_model,
+                           "glossary": text_hash(glossary)}),
+        (5, "5_split", {"maxdur": args.maxdur, "vad": args.enable_vad}),
+        (6, "6_tts", {"tts": args.tts, "voice": args.voice, "texttemp": args.texttemp, "wavetemp": args.wavetemp,
+                      "resynth": resynth_options(args)}),
+        (7, "7_sync", {"fade": args.fade, "sync": args.sync, "tolerance": args.tolerance,
+                       "maxstretch": args.maxstretch, "engine": args.audio_engine,
+                       "onepass": args.render == "onepass"}),
+        (8, "8_concat", {"render": args.render, "preserve_gaps": args.preserve_gaps, "gap_min": args.gap_min}),
+        (9, "9_posprocesso", {"rate": args.rate, "loudnorm": args.loudnorm}),
+        (10, "10_mux", {"bitrate": args.bitrate, "out": str(Path(out_mp4).resolve())}),
+    ]
+
+def resynth_options(args):
+    """Parâmetros do laço de re-síntese da ETAPA 6 (None = desativado)"""
+    if not args.resynth_threshold or args.resynth_threshold <= 0:
+        return None
+    return {"threshold": args.resynth_threshold, "retries": args.resynth_retries, "budget": args.resynth_budget,
+            "src": args.src, "tgt": args.tgt}
+
+def stage_done(job, step_num, step_name, outputs=None):
+    """Checkpoint legível (checkpoint.json) + registro da etapa no grafo (stages.json)"""
+    save_checkpoint(job["workdir"], step_num, step_name)
+    names = {num: name for num, name, _ in job["specs"]}
+    job["graph"].done(names[step_num], outputs)
+
+def release_models(args, *kinds):
+    """
+    Um vídeo por execução: libera os modelos da etapa que acabou (a GPU/RAM fica para o TTS)
+    No --batch ficam residentes para o próximo vídeo e são liberados depois do último
+    """
+    if args.batch:
+        return
+    for kind in kinds:
+        if kind == "whisper":
+            close_asr_pools()
+        dub_models.release(kind)
+
+# Artefatos das ETAPAS 5 e 7 (relidos no resume)
+SPLIT_FILE = "segments_split.json"
+SYNC_MANIFEST = "sync_manifest.json"
+
+def save_split(workdir, segs):
+    path = Path(workdir, SPLIT_FILE)
+    write_json_atomic(path, {"segments": segs})
+    return path
+
+def load_split(workdir):
+    """Segmentos após o split (None se o arquivo não existe ou está corrompido)"""
+    try:
+        with open(Path(workdir, SPLIT_FILE), "r", encoding="utf-8") as f:
+            return json.load(f)["segments"]
+    except (OSError, ValueError, KeyError):
+        return None
+
+def save_sync_manifest(workdir, files, sync_info, sr):
+    """
+    Arquivos que a ETAPA 8 deve usar, em ordem (None no onepass: renderiza dos seg_XXXX.wav)
+    + métricas da sincronização
+    """
+    path = Path(workdir, SYNC_MANIFEST)
+    write_json_atomic(path, {"sr": sr, "files": [Path(p).name for p in files] if files is not None else None,
+                             "sync_info": sync_info})
+    return path
+
+def load_sync_manifest(workdir):
+    """Manifesto da ETAPA 7 (None se não existe ou falta algum arquivo listado)"""
+    try:
+        with open(Path(workdir, SYNC_MANIFEST), "r", encoding="utf-8") as f:
+            data = json.load(f)
+    except (OSError, ValueError):
+        return None
+    if data.get("files") is not None:
+        data["files"] = [Path(workdir, name) for name in data["files"]]
+        if not all(p.exists() for p in data["files"]):
+            return None
+    return data
+
 # ---------------- GLOSSÁRIO TÉCNICO ----------------
 TECH_GLOSSARY = {
     # Programação
@@ -144,25 +237,47 @@ PRESERVE_TERMS = {
     "Claude Code", "Cloud Code",  # Nomes de produtos
 }
 
+def _compile_term_matcher(terms):
+    """
+    Compila uma única alternância (termos mais longos primeiro) com word boundary
+    Retorna (regex, índice do placeholder por termo em minúsculas)
+    """
+    ordered = sorted(terms, key=lambda t: (-len(t), t))
+    index = {}
+    for i, term in enumerate(ordered):
+        index.setdefault(term.lower(), i)
+    pattern = r'\b(?:' + "|".join(re.escape(t) for t in ordered) + r')\b'
+    return re.compile(pattern, re.IGNORECASE), index
+
+# Compilado uma vez no import (antes: um regex por termo por segmento)
+_TERM_RE, _TERM_INDEX = _compile_term_matcher(PRESERVE_TERMS)
+
 def protect_technical_terms(text):
-    """Protege termos técnicos substituindo por placeholders"""
-    protected = text
+    """Protege termos técnicos substituindo por placeholders (uma única passada)"""
     replacements = {}
 
-    # Protege termos técnicos (case insensitive mas preserva case)
-    for i, term in enumerate(sorted(PRESERVE_TERMS, key=len, reverse=True)):
-        # Busca termo como palavra completa (word boundary)
-        pattern = r'\b' + re.escape(term) + r'\b'
-        matches = list(re.finditer(pattern, protected, re.IGNORECASE))
-
-        for match in reversed(matches):  # Reversed para não afetar índices
-            original = match.group()
-            placeholder = f"__TECH{i:03d}__"
-            replacements[placeholder] = original
-            protected = protected[:match.start()] + placeholder + protected[match.end():]
+    def _placeholder(match):
+        original = match.group()
+        placeholder = f"__TECH{_TERM_INDEX[original.lower()]:03d}__"
+        # Mesmo placeholder para todas as ocorrências; guarda a grafia da primeira
+        replacements.setdefault(placeholder, original)
+        return placeholder
 
+    # Protege termos técnicos (case insensitive mas preserva case)
+    protected = _TERM_RE.sub(_placeholder, text)
     return protected, replacements
 
+def canonical_protected_text(protected, replacements):
+    """
+    Forma canônica do texto protegido para a memória de tradução:
+    cada placeholder vira [[termo]], então a chave não depende da numeração
+    dos placeholders (que muda quando o glossário ganha termos)
+    """
+    canon = protected
+    for placeholder, original in replacements.items():
+        canon = canon.replace(placeholder, f"[[{original}]]")
+    return canon
+
 def restore_technical_terms(text, replacements):
     """Restaura termos técnicos protegidos"""
     restored = text
@@ -171,6 +286,123 @@ def restore_technical_terms(text, replacements):
     return restored
 
 # ---------------- TRADUÇÃO COM CONTROLE DE COMPRIMENTO ----------------
+M2M100_MODEL = "facebook/m2m100_418M"
+
+def length_bounds(text, src_lang, tgt_lang):
+    """Retorna (min_length, max_new_tokens) para a tradução de um segmento"""
+    # Calcula comprimento alvo (com margem de 10%)
+    src_words = len(text.split())
+    expansion_factor = LinguisticDensity.get_expansion_factor(src_lang, tgt_lang)
+    target_words = int(src_words * expansion_factor * 1.1)  # +10% margem
+    # CORRIGIDO: Aumenta limite para não cortar traduções
+    return max(target_words - 20, 10), min(target_words + 100, 512)
+
+def _per_item_length_processor(min_lens, max_new, eos_id, num_beams, start_len=1):
+    """
+    LogitsProcessor com min_length/max_new_tokens POR ITEM do batch
+    (o generate do transformers só aceita um limite para o batch inteiro)
+    """
+    import torch
+    from transformers import LogitsProcessor
+
+    min_t = torch.tensor(min_lens, dtype=torch.long)
+    max_t = torch.tensor(max_new, dtype=torch.long)
+
+    class PerItemLength(LogitsProcessor):
+        def __call__(self, input_ids, scores):
+            cur = input_ids.shape[-1]
+            item = torch.arange(scores.shape[0], device=scores.device) // num_beams
+            block_eos = cur < min_t.to(scores.device)[item]
+            scores[block_eos, eos_id] = -float("inf")
+            # O próximo token seria o max_new-ésimo gerado: força EOS nele
+            force_eos = (cur - start_len + 1) >= max_t.to(scores.device)[item]
+            if force_eos.any():
+                scores[force_eos] = -float("inf")
+                scores[force_eos, eos_id] = 0.0
+            return scores
+
+    return PerItemLength()
+
+def translate_batch_with_length_control(texts, src_lang, tgt_lang, tokenizer, model,
+                                        num_beams=5, batch_size=8, progress=None,
+                                        tm=None, model_name=M2M100_MODEL, max_tokens=None):
+    """
+    Versão em lote de translate_with_length_control
+    Agrupa segmentos de tamanho (em tokens) parecido para reduzir padding e
+    aplica min_length/max_new_tokens individuais a cada item
+    Retorna as traduções na mesma ordem de texts
+    progress: callback opcional chamado com o total já traduzido após cada lote
+    tm: TranslationMemory opcional consultada antes do model.generate
+    max_tokens: teto opcional de max_new_tokens por item (re-tradução mais curta da ETAPA 6)
+    """
+    prepared = [protect_technical_terms(t) for t in texts]
+    bounds = [length_bounds(t, src_lang, tgt_lang) for t in texts]
+    if max_tokens is not None:
+        bounds = [(min(lo, max(cap // 2, 1)), min(hi, cap)) for (lo, hi), cap in zip(bounds, max_tokens)]
+    results = [None] * len(texts)
+
+    # Memória de tradução: só vão para o modelo os segmentos não memorizados
+    tm_keys = {}
+    pending = list(range(len(texts)))
+    if tm is not None:
+        pending = []
+        for i, (protected, replacements) in enumerate(prepared):
+            key_text = canonical_protected_text(protected, replacements)
+            params = {"mode": "length_control", "min_length": bounds[i][0],
+                      "max_new_tokens": bounds[i][1], "num_beams": num_beams,
+                      "length_penalty": 0.8, "no_repeat_ngram_size": 3}
+            tm_keys[i] = (key_text, params)
+            hit = tm.lookup(model_name, src_lang, tgt_lang, key_text, params)
+            if hit is not None:
+                results[i] = hit
+            else:
+                pending.append(i)
+        if progress and len(pending) < len(texts):
+            progress(len(texts) - len(pending))
+    if not pending:
+        return results
+
+    from transformers import LogitsProcessorList
+
+    tokenizer.src_lang = src_lang
+    lengths = [len(ids) for ids in tokenizer([prepared[i][0] for i in pending], truncation=True, max_length=1024)["input_ids"]]
+    order = [pending[j] for j in sorted(range(len(pending)), key=lambda j: lengths[j])]
+    already = len(texts) - len(pending)
+
+    for b in range(0, len(order), max(batch_size, 1)):
+        idxs = order[b:b + batch_size]
+        encoded = tokenizer([prepared[i][0] for i in idxs], return_tensors="pt",
+                            padding=True, truncation=True, max_length=1024)
+        min_lens = [bounds[i][0] for i in idxs]
+        max_new = [bounds[i][1] for i in idxs]
+        processor = _per_item_length_processor(min_lens, max_new, tokenizer.eos_token_id, num_beams)
+
+        generated = model.generate(
+            **encoded,
+            forced_bos_token_id=tokenizer.get_lang_id(tgt_lang),
+            max_new_tokens=max(max_new),
+            num_beams=num_beams,
+            length_penalty=0.8,
+            no_repeat_ngram_size=3,
+            logits_processor=LogitsProcessorList([processor]),
+        )
+        decoded = tokenizer.batch_decode(generated, skip_special_tokens=True)
+        for i, raw in zip(idxs, decoded):
+            results[i] = _finish_translation(raw, prepared[i][1], tgt_lang)
+            if tm is not None:
+                tm.store(model_name, src_lang, tgt_lang, tm_keys[i][0], results[i], tm_keys[i][1])
+        if progress:
+            progress(already + b + len(idxs))
+
+    return results
+
+def _finish_translation(raw, replacements, tgt_lang):
+    # Restaura termos técnicos
+    translation = restore_technical_terms(raw, replacements)
+    # Corrige palavras em inglês que vazaram (comum no M2M100)
+    translation = fix_mixed_language(translation, tgt_lang)
+    return translation.strip()
+
 def translate_with_length_control(text, src_lang, tgt_lang, target_duration, tokenizer, model):
     """
     Traduz tentando manter comprimento similar ao original
@@ -178,10 +410,7 @@ def translate_with_length_control(text, src_lang, tgt_lang, target_duration, tok
     # Protege termos técnicos
     protected_text, replacements = protect_technical_terms(text)
 
-    # Calcula comprimento alvo (com margem de 10%)
-    src_words = len(text.split())
-    expansion_factor = LinguisticDensity.get_expansion_factor(src_lang, tgt_lang)
-    target_words = int(src_words * expansion_factor * 1.1)  # +10% margem
+    min_length, max_new_tokens = length_bounds(text, src_lang, tgt_lang)
 
     # Traduz
     tokenizer.src_lang = src_lang
@@ -192,23 +421,15 @@ def translate_with_length_control(text, src_lang, tgt_lang, target_duration, tok
     generated = model.generate(
         **encoded,
         forced_bos_token_id=tokenizer.get_lang_id(tgt_lang),
-        # CORRIGIDO: Aumenta limite para não cortar traduções
-        max_new_tokens=min(target_words + 100, 512),  # Permite traduções completas
-        min_length=max(target_words - 20, 10),
+        max_new_tokens=max_new_tokens,  # Permite traduções completas
+        min_length=min_length,
         num_beams=5,  # Melhor qualidade
         length_penalty=0.8,  # CORRIGIDO: Reduz penalidade para permitir traduções completas
         no_repeat_ngram_size=3,
     )
 
     translation = tokenizer.batch_decode(generated, skip_special_tokens=True)[0]
-
-    # Restaura termos técnicos
-    translation = restore_technical_terms(translation, replacements)
-
-    # Corrige palavras em inglês que vazaram (comum no M2M100)
-    translation = fix_mixed_language(translation, tgt_lang)
-
-    return translation.strip()
+    return _finish_translation(translation, replacements, tgt_lang)
 
 def fix_mixed_language(text, target_lang):
     """
@@ -294,9 +515,16 @@ def simplify_for_dubbing(text, max_words=None):
     return simplified
 
 # ---------------- Utilidades (mesmo código anterior) ----------------
+# Motor de áudio das etapas 6.1/7: "numpy" (em processo) ou "ffmpeg" (um processo por segmento)
+AUDIO_ENGINE = "numpy"
+
 def sh(cmd, cwd=None):
     print(">>", " ".join(map(str, cmd)))
-    subprocess.run(cmd, check=True, cwd=cwd)
+    t0 = time.perf_counter()
+    try:
+        subprocess.run(cmd, check=True, cwd=cwd)
+    finally:
+        dub_metrics.record_subprocess(cmd, time.perf_counter() - t0, cwd)
 
 def make_silence_wav(workdir, idx, dur, sr):
     out = Path(workdir, f"sil_{idx:04d}.wav")
@@ -314,16 +542,8 @@ def ensure_ffmpeg():
             sys.exit(1)
 
 def ffprobe_duration(path):
-    try:
-        out = subprocess.check_output([
-            "ffprobe", "-v", "error",
-            "-show_entries", "format=duration",
-            "-of", "default=nk=1:nw=1",
-            str(path)
-        ], text=True).strip()
-        return max(0.0, float(out))
-    except Exception:
-        return 0.0
+    # Lê o cabeçalho WAV (ffprobe só para outros containers), com cache por path+mtime+size
+    return dub_audio.probe_duration(path)
 
 def ts_stamp(t):
     h = int(t // 3600)
@@ -354,7 +574,15 @@ class LinguisticDensity:
         words = len(text.split())
         return words / max(duration, 0.1)
 
-def detect_speech_pauses(audio_path, min_silence_dur=0.3):
+def detect_speech_pauses(audio_path, min_silence_dur=0.3, streaming=True):
+    # Streaming: lê o WAV de 48 kHz em blocos, sem librosa.load/reamostragem
+    if streaming:
+        try:
+            pauses = dub_audio.detect_pauses_stream(audio_path, min_silence_dur)
+            print(f"  Detectadas {len(pauses)} pausas naturais (>{min_silence_dur}s)")
+            return pauses
+        except (ValueError, OSError) as e:
+            print(f"  [AVISO] VAD em streaming indisponível ({e}), usando librosa")
     try:
         import librosa
         y, sr = librosa.load(audio_path, sr=16000, mono=True)
@@ -363,21 +591,8 @@ def detect_speech_pauses(audio_path, min_silence_dur=0.3):
         rms = librosa.feature.rms(y=y, frame_length=frame_length, hop_length=hop_length)[0]
         threshold = np.percentile(rms, 20)
         silent_frames = rms < threshold
-        times = librosa.frames_to_time(np.arange(len(silent_frames)), sr=sr, hop_length=hop_length)
 
-        pauses = []
-        in_pause = False
-        pause_start = 0
-
-        for i, (is_silent, time) in enumerate(zip(silent_frames, times)):
-            if is_silent and not in_pause:
-                pause_start = time
-                in_pause = True
-            elif not is_silent and in_pause:
-                pause_dur = time - pause_start
-                if pause_dur >= min_silence_dur:
-                    pauses.append((pause_start, time))
-                in_pause = False
+        pauses = dub_audio.pauses_from_mask(silent_frames, hop_length / sr, min_silence_dur)
 
         print(f"  Detectadas {len(pauses)} pausas naturais (>{min_silence_dur}s)")
         return pauses
@@ -388,7 +603,10 @@ def detect_speech_pauses(audio_path, min_silence_dur=0.3):
         print(f"  [AVISO] Erro no VAD: {e}")
         return []
 
-def estimate_tts_duration(text, lang="pt", base_wps=2.5):
+def estimate_tts_duration(text, lang="pt", base_wps=2.5, model=None):
+    # Modelo aprendido do histórico (dub_duration) quando disponível; senão heurística fixa
+    if model is not None:
+        return model.predict(text)
     words = len(text.split())
     speed_factors = {"pt": 1.0, "en": 1.1, "es": 0.95, "fr": 0.90}
     factor = speed_factors.get(lang.lower(), 1.0)
@@ -399,55 +617,144 @@ def estimate_tts_duration(text, lang="pt", base_wps=2.5):
     return max(total, 0.5)
 
 # ---------------- ASR ----------------
-def transcribe_faster_whisper(wav_path, workdir, src_lang):
-    print("\n=== ETAPA 3: Transcrição (Whisper) ===")
-    from faster_whisper import WhisperModel
-    import torch
-
-    # Estima duração do áudio
-    audio_duration = ffprobe_duration(wav_path)
-    estimated_segments = int(audio_duration / 3)  # ~1 segmento a cada 3 segundos
-    estimated_time_min = int(audio_duration / 60)  # ~1min de processamento por 1min de áudio
-
-    print(f"\n{'='*60}")
-    print(f"  Duração do áudio: {int(audio_duration/60)}m {int(audio_duration%60)}s")
-    print(f"  Segmentos estimados: ~{estimated_segments}")
-    print(f"  Tempo estimado: ~{estimated_time_min} minuto(s)")
-    print(f"{'='*60}\n")
-
+def load_whisper_model():
     # Whisper: Força CPU (problema com cuBLAS 12 vs 11)
     # GPU será usada em Bark onde o ganho é maior (5-10x)
+    # Residente no processo (dub_models): vídeos seguintes reaproveitam o modelo
     print("Usando CPU para Whisper (evita incompatibilidade CUDA)...")
     print("  (GPU será usada no Bark TTS - onde o ganho é maior!)")
     device = "cpu"
     compute_type = "int8"
-    use_vad = True
 
     print(f"Carregando modelo Whisper medium ({device.upper()})...")
+    return dub_models.whisper("medium", device=device, compute_type=compute_type)
 
+def iter_whisper_segments(model, wav_path, src_lang, use_vad=True):
+    """Gera os segmentos à medida que o faster-whisper os decodifica (o gerador dele é preguiçoso)"""
     try:
-        model = WhisperModel("medium", device=device, compute_type=compute_type)
-        print("Transcrevendo áudio...")
         segments, info = model.transcribe(str(wav_path), language=src_lang, vad_filter=use_vad)
         print(f"[OK] Idioma detectado: {info.language} (confiança: {info.language_probability:.2f})")
     except Exception as e:
         print(f"ERRO na transcrição: {e}")
         raise
-
-    segs = []
-    print("\nProcessando segmentos...")
-    seg_count = 0
     for s in segments:
-        seg_count += 1
-        segs.append({"start": float(s.start), "end": float(s.end), "text": (s.text or "").strip()})
-        if seg_count % 10 == 0:
-            print(f"  Processados {seg_count} segmentos...")
+        yield {"start": float(s.start), "end": float(s.end), "text": (s.text or "").strip()}
 
-    print(f"\n{'='*60}")
-    print(f"  [OK] TOTAL: {len(segs)} segmentos transcritos")
-    print(f"  (Estimativa: {estimated_segments} | Real: {len(segs)})")
-    print(f"{'='*60}")
+# ASR em blocos: o áudio é cortado no meio de pausas (VAD por energia) e os blocos
+# são transcritos em paralelo num pool de processos (cada worker com seu modelo e
+# um número fixo de threads); os timestamps voltam para a linha do tempo original
+_ASR_STATE = {}
+_ASR_POOLS = {}
 
+def plan_asr_chunks(duration, pause_index, chunk_s=120.0):
+    """
+    Cortes [(início, fim)] de ~chunk_s: em cada alvo usa o meio da pausa mais próxima
+    (janela de ±chunk_s/2); sem pausa na janela, corta no próprio alvo
+    """
+    chunks, t = [], 0.0
+    while duration - t > chunk_s * 1.5:
+        goal = t + chunk_s
+        cands = pause_index.within(goal - chunk_s / 2, goal + chunk_s / 2) if pause_index is not None else []
+        if cands:
+            cut = min(((a + b) / 2 for a, b in cands), key=lambda m: abs(m - goal))
+        else:
+            print(f"  [AVISO] Sem pausa perto de {goal:.0f}s: corte seco no bloco de ASR")
+            cut = goal
+        chunks.append((t, cut))
+        t = cut
+    chunks.append((t, duration))
+    return chunks
+
+def _asr_worker_init(size, compute_type, threads):
+    _ASR_STATE["model"] = dub_models.whisper(size, device="cpu", compute_type=compute_type,
+                                             cpu_threads=threads or 0)
+
+def _asr_worker_chunk(job):
+    """Transcreve [t0, t1) do WAV (lido por seek, 16 kHz em memória); timestamps já absolutos"""
+    idx, wav_path, t0, t1, src_lang, use_vad = job
+    start = time.time()
+    y, sr = dub_audio.read_wav_range(wav_path, t0, t1)
+    y = dub_audio.resample(y, sr, 16000)
+    segments, info = _ASR_STATE["model"].transcribe(y, language=src_lang, vad_filter=use_vad)
+    out = [{"start": round(t0 + float(s.start), 3), "end": round(t0 + float(s.end), 3),
+            "text": (s.text or "").strip()} for s in segments]
+    return idx, out, time.time() - start
+
+def get_asr_pool(workers, threads=None, size="medium", compute_type="int8"):
+    import multiprocessing
+    key = (workers, threads, size, compute_type)
+    pool = _ASR_POOLS.get(key)
+    if pool is None:
+        ctx = multiprocessing.get_context("spawn")
+        pool = ctx.Pool(workers, initializer=_asr_worker_init, initargs=(size, compute_type, threads))
+        _ASR_POOLS[key] = pool
+    return pool
+
+def close_asr_pools(terminate=False):
+    for pool in _ASR_POOLS.values():
+        if terminate:
+            pool.terminate()
+        else:
+            pool.close()
+        pool.join()
+    _ASR_POOLS.clear()
+
+def _asr_norm(text):
+    return re.sub(r"[^\w]+", " ", text.lower()).strip()
+
+def stitch_asr_chunk(prev, segs, t0, t1, seam_gap=1.0, min_ratio=0.85):
+    """
+    Ajusta um bloco à linha do tempo: limita cada segmento a [t0, t1] e descarta
+    vazios; na emenda, o 1º segmento que repete o último do bloco anterior
+    (texto igual/parecido a menos de seam_gap s) é descartado — vence sempre o bloco anterior
+    """
+    from difflib import SequenceMatcher
+    out = []
+    for s in segs:
+        start, end = max(s["start"], t0), min(s["end"], t1)
+        if end - start < 0.01 or not s["text"]:
+            continue
+        out.append(dict(s, start=round(start, 3), end=round(end, 3)))
+    while out and prev is not None and out[0]["start"] - prev["end"] < seam_gap:
+        a, b = _asr_norm(prev["text"]), _asr_norm(out[0]["text"])
+        if not b or a.endswith(b) or SequenceMatcher(None, a, b).ratio() >= min_ratio:
+            out.pop(0)
+        else:
+            break
+    return out
+
+def iter_whisper_chunked(wav_path, src_lang, workers, threads=None, chunk_s=120.0, pause_index=None, use_vad=True):
+    """Segmentos do ASR em blocos paralelos, em ordem (o bloco k sai assim que k-1..0 terminaram)"""
+    duration = ffprobe_duration(wav_path)
+    if pause_index is None:
+        pause_index = dub_audio.PauseIndex(detect_speech_pauses(wav_path, min_silence_dur=0.3))
+    chunks = plan_asr_chunks(duration, pause_index, chunk_s)
+    threads = threads or max(1, (os.cpu_count() or 1) // workers)
+    print(f"ASR em {len(chunks)} blocos (~{chunk_s:.0f}s) | {workers} workers x {threads} threads")
+
+    pool = get_asr_pool(workers, threads)
+    jobs = [(k, str(wav_path), t0, t1, src_lang, use_vad) for k, (t0, t1) in enumerate(chunks)]
+    prev = None
+    for k, segs, secs in pool.imap(_asr_worker_chunk, jobs):
+        t0, t1 = chunks[k]
+        stitched = stitch_asr_chunk(prev, segs, t0, t1)
+        dropped = len(segs) - len(stitched)
+        print(f"  [ASR] Bloco {k + 1}/{len(chunks)} ({t0:.0f}s-{t1:.0f}s): {len(stitched)} segmentos em {secs:.1f}s"
+              + (f" ({dropped} descartados na emenda)" if dropped else ""))
+        dub_metrics.segment("asr_chunk", k + 1, secs)
+        for s in stitched:
+            yield s
+        if stitched:
+            prev = stitched[-1]
+
+def iter_asr(wav_path, src_lang, workers=1, threads=None, chunk_s=120.0, pause_index=None):
+    """ASR serial (um modelo, arquivo inteiro) ou em blocos paralelos (workers > 1)"""
+    if workers and workers > 1:
+        yield from iter_whisper_chunked(wav_path, src_lang, workers, threads, chunk_s, pause_index)
+    else:
+        yield from iter_whisper_segments(load_whisper_model(), wav_path, src_lang)
+
+def write_asr_outputs(segs, workdir, src_lang):
     srt_path = Path(workdir, "asr.srt")
     json_path = Path(workdir, "asr.json")
     with open(srt_path, "w", encoding="utf-8") as f:
@@ -455,28 +762,99 @@ def transcribe_faster_whisper(wav_path, workdir, src_lang):
             f.write(f"{i}\n{ts_stamp(s['start'])} --> {ts_stamp(s['end'])}\n{s['text']}\n\n")
     with open(json_path, "w", encoding="utf-8") as f:
         json.dump({"language": src_lang, "segments": segs}, f, ensure_ascii=False, indent=2)
+    return json_path, srt_path
+
+def transcribe_faster_whisper(wav_path, workdir, src_lang, workers=1, threads=None, chunk_s=120.0, pause_index=None):
+    print("\n=== ETAPA 3: Transcrição (Whisper) ===")
+
+    # Estima duração do áudio
+    audio_duration = ffprobe_duration(wav_path)
+    estimated_segments = int(audio_duration / 3)  # ~1 segmento a cada 3 segundos
+    estimated_time_min = int(audio_duration / 60)  # ~1min de processamento por 1min de áudio
+
+    print(f"\n{'='*60}")
+    print(f"  Duração do áudio: {int(audio_duration/60)}m {int(audio_duration%60)}s")
+    print(f"  Segmentos estimados: ~{estimated_segments}")
+    print(f"  Tempo estimado: ~{estimated_time_min} minuto(s)" + (f" / {workers} workers" if workers > 1 else ""))
+    print(f"{'='*60}\n")
+
+    print("Transcrevendo áudio...")
+
+    segs = []
+    print("\nProcessando segmentos...")
+    for s in iter_asr(wav_path, src_lang, workers, threads, chunk_s, pause_index):
+        segs.append(s)
+        if len(segs) % 10 == 0:
+            print(f"  Processados {len(segs)} segmentos...")
+
+    print(f"\n{'='*60}")
+    print(f"  [OK] TOTAL: {len(segs)} segmentos transcritos")
+    print(f"  (Estimativa: {estimated_segments} | Real: {len(segs)})")
+    print(f"{'='*60}")
+
+    json_path, srt_path = write_asr_outputs(segs, workdir, src_lang)
     print(f"Transcrito: {len(segs)} segmentos")
     return json_path, srt_path, segs
 
 # ---------------- TRADUÇÃO MELHORADA PARA CONTEÚDO TÉCNICO ----------------
-def translate_segments_technical(segs, src, tgt, workdir, simplify=True):
+def load_m2m100(model_name=M2M100_MODEL):
+    if not dub_models.is_loaded("m2m100", model_name):
+        print("\nCarregando modelo M2M100 (pode baixar ~2GB na primeira vez)...")
+    tok, model = dub_models.m2m100(model_name)
+    print("[OK] Modelo carregado!\n")
+    return tok, model
+
+def m2m100_lang_codes(tok, src, tgt):
+    src = (src or "en").lower()
+    tgt = (tgt or "pt").lower()
+    if hasattr(tok, "lang_code_to_id"):
+        if src not in tok.lang_code_to_id: src = "en"
+        if tgt not in tok.lang_code_to_id: tgt = "pt"
+    return src, tgt
+
+def build_translated_segment(s, translation, tgt, simplify=True, duration_model=None):
+    """Segmento da ETAPA 4: tradução (simplificada pela duração) + métricas de densidade"""
+    text = s.get("text", "").strip()
+    dur = s["end"] - s["start"]
+
+    # Simplifica se necessário
+    if simplify:
+        # Calcula palavras máximas baseado na duração
+        if duration_model is not None:
+            max_words = duration_model.max_words(dur)  # velocidade medida da voz + 10% margem
+        else:
+            max_words = int((dur * 2.5) * 1.1)  # 2.5 palavras/seg + 10% margem
+        translation = simplify_for_dubbing(translation, max_words)
+
+    item = dict(s)
+    item["text_trad"] = translation
+    item["text_original"] = text
+    item["original_wps"] = LinguisticDensity.calculate_wps(text, dur)
+    item["trad_wps"] = LinguisticDensity.calculate_wps(translation, dur)
+    item["trad_estimated_dur"] = estimate_tts_duration(translation, tgt, model=duration_model)
+    item["compression_ratio"] = len(translation.split()) / max(len(text.split()), 1)
+    return item
+
+def write_trad_outputs(out, workdir, tgt):
+    srt_t = Path(workdir, "asr_trad.srt")
+    json_t = Path(workdir, "asr_trad.json")
+    with open(srt_t, "w", encoding="utf-8") as f:
+        for i, s in enumerate(out, 1):
+            f.write(f"{i}\n{ts_stamp(s['start'])} --> {ts_stamp(s['end'])}\n{s['text_trad']}\n\n")
+    with open(json_t, "w", encoding="utf-8") as f:
+        json.dump({"language": tgt, "segments": out}, f, ensure_ascii=False, indent=2)
+    return json_t, srt_t
+
+def translate_segments_technical(segs, src, tgt, workdir, simplify=True, batch_size=8, num_beams=5, tm=None,
+                                 duration_model=None):
     print("\n=== ETAPA 4: Tradução TÉCNICA com controle de comprimento ===")
     import time
-    from transformers import AutoTokenizer, AutoModelForSeq2SeqLM
 
     total_segments = len(segs)
 
     # Carrega modelo ANTES de mostrar estimativa
-    print("\nCarregando modelo M2M100 (pode baixar ~2GB na primeira vez)...")
-    model_name = "facebook/m2m100_418M"
-
-    print("  - Carregando tokenizer...")
-    tok = AutoTokenizer.from_pretrained(model_name)
-
-    print("  - Carregando modelo de tradução...")
-    model = AutoModelForSeq2SeqLM.from_pretrained(model_name)
-
-    print("[OK] Modelo carregado!\n")
+    model_name = M2M100_MODEL
+    tok, model = load_m2m100(model_name)
 
     # AGORA mostra estimativa
     estimated_minutes = int(total_segments * 0.5 / 60)  # ~0.5s por segmento
@@ -487,57 +865,41 @@ def translate_segments_technical(segs, src, tgt, workdir, simplify=True):
     print(f"  (Apenas tradução, modelo já carregado)")
     print(f"{'='*60}\n")
 
-    src = (src or "en").lower()
-    tgt = (tgt or "pt").lower()
-    if hasattr(tok, "lang_code_to_id"):
-        if src not in tok.lang_code_to_id: src = "en"
-        if tgt not in tok.lang_code_to_id: tgt = "pt"
-
-    out = []
+    src, tgt = m2m100_lang_codes(tok, src, tgt)
 
     print(f"  Modo técnico: preservando {len(PRESERVE_TERMS)} termos")
     print(f"  Simplificação: {'ATIVA' if simplify else 'DESATIVA'}")
+    print(f"  Lote: {batch_size} | Beams: {num_beams}")
     print(f"  Traduzindo {src} -> {tgt}...\n")
 
     start_time = time.time()
 
-    for i, s in enumerate(segs):
-        text = s.get("text", "").strip()
-        dur = s["end"] - s["start"]
+    last_report = [0]
+    def report(done):
+        if done - last_report[0] < 10 and done < total_segments:
+            return
+        last_report[0] = done
+        elapsed = time.time() - start_time
+        rate = done / max(elapsed, 1e-6)
+        eta_sec = int((total_segments - done) / max(rate, 1e-6))
+        print(f"  Traduzidos {done}/{total_segments} ({done/total_segments*100:.1f}%) - "
+              f"{rate:.2f} seg/s - ETA: {eta_sec}s")
+
+    # Traduz em lotes agrupados por tamanho de tokens
+    texts = [s.get("text", "").strip() for s in segs]
+    translations = translate_batch_with_length_control(
+        texts, src, tgt, tok, model, num_beams=num_beams, batch_size=batch_size, progress=report,
+        tm=tm, model_name=model_name)
+    if tm is not None:
+        print(f"  Memória de tradução: {tm.stats['exact_hits']} exatos, "
+              f"{tm.stats['fuzzy_hits']} aproximados, {tm.stats['misses']} novos")
+
+    out = [build_translated_segment(s, translations[i], tgt, simplify, duration_model) for i, s in enumerate(segs)]
 
-        # Traduz com controle de comprimento
-        translation = translate_with_length_control(text, src, tgt, dur, tok, model)
-
-        # Simplifica se necessário
-        if simplify:
-            # Calcula palavras máximas baseado na duração
-            max_words = int((dur * 2.5) * 1.1)  # 2.5 palavras/seg + 10% margem
-            translation = simplify_for_dubbing(translation, max_words)
-
-        item = dict(s)
-        item["text_trad"] = translation
-        item["text_original"] = text
-        item["original_wps"] = LinguisticDensity.calculate_wps(text, dur)
-        item["trad_wps"] = LinguisticDensity.calculate_wps(translation, dur)
-        item["trad_estimated_dur"] = estimate_tts_duration(translation, tgt)
-        item["compression_ratio"] = len(translation.split()) / max(len(text.split()), 1)
-
-        out.append(item)
-
-        if (i + 1) % 10 == 0:
-            elapsed = time.time() - start_time
-            avg_speed = elapsed / (i + 1)
-            remaining = (total_segments - i - 1) * avg_speed
-            eta_sec = int(remaining)
-            print(f"  Traduzidos {i+1}/{total_segments} ({(i+1)/total_segments*100:.1f}%) - ETA: {eta_sec}s")
+    total_time = time.time() - start_time
+    print(f"\n  Vazão: {len(out) / max(total_time, 1e-6):.2f} segmentos/s ({total_time:.1f}s)")
 
-    srt_t = Path(workdir, "asr_trad.srt")
-    json_t = Path(workdir, "asr_trad.json")
-    with open(srt_t, "w", encoding="utf-8") as f:
-        for i, s in enumerate(out, 1):
-            f.write(f"{i}\n{ts_stamp(s['start'])} --> {ts_stamp(s['end'])}\n{s['text_trad']}\n\n")
-    with open(json_t, "w", encoding="utf-8") as f:
-        json.dump({"language": tgt, "segments": out}, f, ensure_ascii=False, indent=2)
+    json_t, srt_t = write_trad_outputs(out, workdir, tgt)
 
     # Estatísticas
     avg_compression = np.mean([s['compression_ratio'] for s in out])
@@ -549,230 +911,515 @@ def translate_segments_technical(segs, src, tgt, workdir, simplify=True):
 # [Resto do código igual ao dublar_sync_v2.py - split, TTS, sync, concat, etc.]
 # Copiando funções necessárias...
 
-def split_long_segments_vad(segments, maxdur, audio_src_path=None):
+def split_segment(s, maxdur, pause_index):
+    """Divide um segmento longo nas pausas do VAD ou, sem pausas úteis, na pontuação"""
+    start, end = s["start"], s["end"]
+    text = (s.get("text_trad") or "").strip()
+    dur = max(0.001, end - start)
+
+    if dur <= maxdur or len(text.split()) < 16:
+        return [s]
+
+    out = []
+    segment_pauses = pause_index.within(start, end)
+
+    if segment_pauses:
+        parts_by_pause = []
+        current_start = start
+
+        for pause_start, pause_end in segment_pauses:
+            if pause_start - current_start >= 1.0:
+                parts_by_pause.append((current_start, pause_start))
+                current_start = pause_end
+
+        if end - current_start >= 0.5:
+            parts_by_pause.append((current_start, end))
+
+        if parts_by_pause:
+            total_dur = sum(p[1] - p[0] for p in parts_by_pause)
+            words = text.split()
+            word_idx = 0
+
+            for i, (p_start, p_end) in enumerate(parts_by_pause):
+                part_dur = p_end - p_start
+                proportion = part_dur / total_dur
+                num_words = max(1, int(len(words) * proportion))
+
+                if i == len(parts_by_pause) - 1:
+                    part_text = " ".join(words[word_idx:])
+                else:
+                    part_text = " ".join(words[word_idx:word_idx + num_words])
+                    word_idx += num_words
+
+                if part_text.strip():
+                    out.append({
+                        "start": p_start,
+                        "end": p_end,
+                        "text_trad": part_text.strip(),
+                        "split_method": "vad"
+                    })
+            return out
+
+    parts = re.split(r'([\.!\?:;,\u2026])', text)
+    cps = max(len(text)/dur, 8.0)
+
+    def good(t):
+        t2 = re.sub(r"\s+"," ", (t or "")).strip()
+        return len(re.findall(r"[A-Za-zÀ-ÿ0-9]", t2)) >= 3
+
+    buf = ""; pieces = []
+    for ch in parts:
+        if ch is None: continue
+        cand = (buf + ch).strip()
+        est = len(cand)/cps if cand else 0
+        if cand and est > maxdur and good(buf):
+            pieces.append(buf.strip()); buf = ch.strip()
+        else:
+            buf = cand
+    if good(buf): pieces.append(buf.strip())
+
+    if not pieces:
+        return [s]
+
+    cur = start
+    for i, piece in enumerate(pieces):
+        est = max(0.5, len(piece)/cps)
+        nxt = cur + est
+        if i == len(pieces)-1: nxt = end
+        out.append({
+            "start": cur,
+            "end": nxt,
+            "text_trad": piece,
+            "split_method": "punctuation"
+        })
+        cur = nxt
+    return out
+
+def split_long_segments_vad(segments, maxdur, audio_src_path=None, pause_index=None):
     print("\n=== ETAPA 5: Split inteligente com VAD ===")
     if not maxdur or maxdur <= 0:
         print("Split desativado.")
         return segments
 
-    pauses = []
-    if audio_src_path and Path(audio_src_path).exists():
-        print("Detectando pausas naturais no áudio...")
-        pauses = detect_speech_pauses(audio_src_path, min_silence_dur=0.3)
+    if pause_index is None:
+        pauses = []
+        if audio_src_path and Path(audio_src_path).exists():
+            print("Detectando pausas naturais no áudio...")
+            pauses = detect_speech_pauses(audio_src_path, min_silence_dur=0.3)
+        pause_index = dub_audio.PauseIndex(pauses)
 
     out = []
     for s in segments:
-        start, end = s["start"], s["end"]
-        text = (s.get("text_trad") or "").strip()
-        dur = max(0.001, end - start)
-
-        if dur <= maxdur or len(text.split()) < 16:
-            out.append(s)
-            continue
-
-        segment_pauses = [(p[0], p[1]) for p in pauses if start <= p[0] < end]
-
-        if segment_pauses:
-            parts_by_pause = []
-            current_start = start
-
-            for pause_start, pause_end in segment_pauses:
-                if pause_start - current_start >= 1.0:
-                    parts_by_pause.append((current_start, pause_start))
-                    current_start = pause_end
-
-            if end - current_start >= 0.5:
-                parts_by_pause.append((current_start, end))
-
-            if parts_by_pause:
-                total_dur = sum(p[1] - p[0] for p in parts_by_pause)
-                words = text.split()
-                word_idx = 0
-
-                for i, (p_start, p_end) in enumerate(parts_by_pause):
-                    part_dur = p_end - p_start
-                    proportion = part_dur / total_dur
-                    num_words = max(1, int(len(words) * proportion))
-
-                    if i == len(parts_by_pause) - 1:
-                        part_text = " ".join(words[word_idx:])
-                    else:
-                        part_text = " ".join(words[word_idx:word_idx + num_words])
-                        word_idx += num_words
-
-                    if part_text.strip():
-                        out.append({
-                            "start": p_start,
-                            "end": p_end,
-                            "text_trad": part_text.strip(),
-                            "split_method": "vad"
-                        })
-                continue
-
-        parts = re.split(r'([\.!\?:;,\u2026])', text)
-        cps = max(len(text)/dur, 8.0)
-
-        def good(t):
-            t2 = re.sub(r"\s+"," ", (t or "")).strip()
-            return len(re.findall(r"[A-Za-zÀ-ÿ0-9]", t2)) >= 3
-
-        buf = ""; pieces = []
-        for ch in parts:
-            if ch is None: continue
-            cand = (buf + ch).strip()
-            est = len(cand)/cps if cand else 0
-            if cand and est > maxdur and good(buf):
-                pieces.append(buf.strip()); buf = ch.strip()
-            else:
-                buf = cand
-        if good(buf): pieces.append(buf.strip())
-
-        if not pieces:
-            out.append(s)
-            continue
-
-        cur = start
-        for i, piece in enumerate(pieces):
-            est = max(0.5, len(piece)/cps)
-            nxt = cur + est
-            if i == len(pieces)-1: nxt = end
-            out.append({
-                "start": cur,
-                "end": nxt,
-                "text_trad": piece,
-                "split_method": "punctuation"
-            })
-            cur = nxt
+        out.extend(split_segment(s, maxdur, pause_index))
 
     print(f"Após split: {len(out)} segmentos (original: {len(segments)})")
     return out
 
-def tts_bark(segments, workdir, text_temp=0.6, wave_temp=0.6, history_prompt=None):
-    print("\n=== ETAPA 6: TTS (Bark) ===")
-    import time
-    import torch
+# ---------------- TTS: geração por segmento (serial ou pool de processos) ----------------
+# Estado do processo que sintetiza (worker do pool ou o próprio processo no modo serial)
+_TTS_STATE = {}
 
+def _patch_torch_load():
     # Fix para PyTorch 2.6+ - monkey-patch torch.load para aceitar weights_only=False
+    import torch
+    if getattr(torch.load, "_dublar_patched", False):
+        return
     original_load = torch.load
     def patched_load(*args, **kwargs):
         kwargs['weights_only'] = False
         return original_load(*args, **kwargs)
+    patched_load._dublar_patched = True
     torch.load = patched_load
 
-    from bark import generate_audio, SAMPLE_RATE
-    from scipy.io.wavfile import write
-
-    # Detecção automática de GPU/CPU
-    use_gpu = torch.cuda.is_available()
-    if use_gpu:
-        print("GPU detectada! Usando CUDA para TTS (muito mais rápido)...")
-        avg_time_per_segment = 1.5  # ~1.5s por segmento na GPU
+def _tts_worker_init(engine, opts, threads=None):
+    """
+    Prepara o worker; o modelo TTS fica residente no registro do processo (dub_models)
+    Voz e temperaturas vêm em cada tarefa (o mesmo worker atende jobs com vozes diferentes)
+    """
+    import torch
+    if threads:
+        torch.set_num_threads(threads)
+    _TTS_STATE.clear()
+    _TTS_STATE["engine"] = engine
+
+    if engine == "bark":
+        _patch_torch_load()
+        dub_models.bark()
     else:
-        print("GPU não disponível, usando CPU (mais lento)...")
-        avg_time_per_segment = 8  # ~8s por segmento na CPU
+        _TTS_STATE["tts"] = dub_models.coqui(opts["model"], gpu=False)
 
-    # ESTIMATIVA DE TEMPO
-    total_segments = len(segments)
-    estimated_minutes = (total_segments * avg_time_per_segment) / 60
+def _tts_voice(voice):
+    """Prompt de voz do Bark desta tarefa (troca só quando a voz muda)"""
+    if _TTS_STATE.get("voice", ()) != voice:
+        _TTS_STATE["history"] = dub_models.bark_history(voice)
+        _TTS_STATE["voice"] = voice
+    return _TTS_STATE["history"]
 
-    print(f"\n{'='*60}")
-    print(f"  AVISO: PROCESSO DEMORADO!")
-    print(f"{'='*60}")
-    print(f"  Total de segmentos: {total_segments}")
-    print(f"  Tempo estimado: ~{int(estimated_minutes)} minutos")
-    print(f"  (~{avg_time_per_segment}s por segmento em CPU)")
-    print(f"{'='*60}")
-    print("\nGerando áudio dos segmentos...\n")
+def _tts_worker_synth(job):
+    """
+    Sintetiza um segmento e grava seg_XXXX.wav de forma atômica (tmp + replace)
+    job: (idx, texto, saída, opts do motor: voz/temperaturas/idioma)
+    Retorna (idx, segundos gastos)
+    """
+    import time
+    idx, txt, out_path, opts = job
+    t0 = time.time()
+    out = Path(out_path)
+    tmp = out.with_name(out.stem + ".part.wav")
+
+    if _TTS_STATE["engine"] == "bark":
+        from bark import generate_audio, SAMPLE_RATE
+        from scipy.io.wavfile import write
+        audio = generate_audio(txt, history_prompt=_tts_voice(opts.get("voice")),
+                               text_temp=opts["text_temp"], waveform_temp=opts["wave_temp"])
+        write(tmp, SAMPLE_RATE, audio)
+    else:
+        tts = _TTS_STATE["tts"]
+        if opts.get("speaker"):
+            try:
+                tts.tts_to_file(text=txt, file_path=str(tmp), speaker=opts["speaker"], language=opts["lang"])
+            except Exception:
+                tts.tts_to_file(text=txt, file_path=str(tmp))
+        else:
+            tts.tts_to_file(text=txt, file_path=str(tmp))
+
+    os.replace(tmp, out)
+    return idx, time.time() - t0
+
+# Pool reaproveitado entre vídeos do mesmo processo (--batch): os workers carregam
+# o modelo uma vez; voz/temperaturas vão em cada tarefa, então só motor, modelo,
+# workers e threads distinguem um pool. Um pool por vez (cada um tem suas cópias do modelo)
+_TTS_POOLS = {}
+
+def get_tts_pool(engine, opts, workers, threads=None):
+    import multiprocessing
+    key = (engine, opts.get("model"), workers, threads)
+    pool = _TTS_POOLS.get(key)
+    if pool is None:
+        close_tts_pools()
+        ctx = multiprocessing.get_context("spawn")
+        pool = ctx.Pool(workers, initializer=_tts_worker_init, initargs=(engine, opts, threads))
+        _TTS_POOLS[key] = pool
+    return pool
+
+def close_tts_pools(terminate=False):
+    for pool in _TTS_POOLS.values():
+        if terminate:
+            pool.terminate()
+        else:
+            pool.close()
+        pool.join()
+    _TTS_POOLS.clear()
 
-    history = None
-    if history_prompt:
-        try:
-            from bark.generation import load_history_prompt
-            history = load_history_prompt(history_prompt)
-        except Exception:
-            history = history_prompt
+def _tts_text(s):
+    txt = (s.get("text_trad") or "").strip()
+    if len(re.findall(r"[A-Za-zÀ-ÿ0-9]", txt)) < 3:
+        txt = "pausa curta"
+    return txt
 
-    seg_files = []
+def resolve_tts_segment(manifest, cache, idx, txt, tts_params, out):
+    """
+    Reaproveita seg_XXXX.wav pelo manifesto (resume) ou pelo cache de TTS
+    Retorna "manifest", "cache" ou None (precisa sintetizar)
+    """
+    if manifest.is_fresh(idx, txt, tts_params, out):
+        return "manifest"
+    if cache is not None and cache.get(tts_params, txt, out):
+        manifest.record(idx, txt, tts_params, out, ffprobe_duration(out))
+        return "cache"
+    # Remove antes de escrever: o arquivo pode ser hardlink do cache
+    out.unlink(missing_ok=True)
+    return None
+
+def record_tts_segment(manifest, cache, idx, txt, tts_params, out):
+    manifest.record(idx, txt, tts_params, out, ffprobe_duration(out))
+    if cache is not None:
+        cache.put(tts_params, txt, out)
+
+def write_segments_csv(segments, texts, seg_files, workdir, lang):
     tsv = Path(workdir, "segments.csv")
-    start_time = time.time()
-
     with open(tsv, "w", encoding="utf-8", newline="") as fcsv:
         w = csv.writer(fcsv)
         w.writerow(["idx", "t_in","t_out","texto_trad","file","estimated_dur","actual_dur","compression_ratio"])
-
-        for i, s in enumerate(segments, 1):
-            seg_start = time.time()
-
-            txt = (s.get("text_trad") or "").strip()
-            if len(re.findall(r"[A-Za-zÀ-ÿ0-9]", txt)) < 3:
-                txt = "pausa curta"
-
-            estimated = s.get("trad_estimated_dur", estimate_tts_duration(txt, "pt"))
+        for i, (s, txt, out) in enumerate(zip(segments, texts, seg_files), 1):
+            estimated = s.get("trad_estimated_dur", estimate_tts_duration(txt, lang))
             compression = s.get("compression_ratio", 1.0)
-
-            out = Path(workdir, f"seg_{i:04d}.wav")
-            audio = generate_audio(txt, history_prompt=history, text_temp=text_temp, waveform_temp=wave_temp)
-            write(out, SAMPLE_RATE, audio)
-
             actual_dur = ffprobe_duration(out)
-            seg_time = time.time() - seg_start
-
-            seg_files.append(out)
             w.writerow([i, s["start"], s["end"], txt, out.name, f"{estimated:.3f}", f"{actual_dur:.3f}", f"{compression:.2f}"])
+    return tsv
+
+def update_duration_model(model, workdir):
+    """Soma as durações reais do segments.csv ao modelo de duração (linhas já vistas são ignoradas)"""
+    csv_path = Path(workdir, "segments.csv")
+    if model is None or not csv_path.exists():
+        return
+    added = model.update_from_csv(csv_path)
+    if added:
+        model.save()
+        st = model.stats
+        print(f"[DURAÇÃO] {model.key}: +{added} amostras ({model.n} no total) | erro médio nas novas: "
+              f"heurística {st['mae_heuristic']:.2f}s, modelo {st['mae_model']:.2f}s")
+
+RESYNTH_SHRINK = 0.9  # cada nova tentativa corta mais 10% das palavras
+
+def tts_windows(segments):
+    """Janela de cada segmento: até o início do próximo (no mínimo o próprio slot)"""
+    order = sorted(range(len(segments)), key=lambda i: segments[i]["start"])
+    windows = [max(s["end"] - s["start"], 0.05) for s in segments]
+    for a, b in zip(order, order[1:]):
+        windows[a] = max(windows[a], segments[b]["start"] - segments[a]["start"])
+    return windows
+
+def retranslate_shorter(items, src, tgt, shrink):
+    """
+    Re-traduz o texto de origem com max_new_tokens proporcional ao encolhimento pedido
+    items: [(i, texto_origem, tradução_atual, fator)] -> {i: nova tradução}
+    Sem memória de tradução (devolveria a mesma tradução longa)
+    """
+    tok, model = load_m2m100()
+    src, tgt = m2m100_lang_codes(tok, src, tgt)
+    tok.src_lang = tgt
+    caps = [max(int(len(tok(cur)["input_ids"]) * f * shrink), 4) for _, _, cur, f in items]
+    out = translate_batch_with_length_control([t for _, t, _, _ in items], src, tgt, tok, model,
+                                              max_tokens=caps)
+    return {i: (t or "").strip() for (i, _, _, _), t in zip(items, out)}
+
+def _dropped_tail(text, short):
+    """Palavras do fim de text que a simplificação cortou para chegar em short"""
+    base, kept, last = simplify_for_dubbing(text).split(), short.split(), -1
+    j = 0
+    for k, w in enumerate(base):
+        if j < len(kept) and w == kept[j]:
+            j += 1
+            last = k
+    return " ".join(base[last + 1:])
+
+def resynthesize_long(segments, texts, seg_files, manifest, cache, engine, opts, tts_params,
+                      workers=1, threads=None, pool=None, threshold=1.3, retries=2, budget=300.0,
+                      src=None, tgt=None):
+    """
+    Segmentos que passaram de threshold x janela ganham texto mais curto e são re-sintetizados,
+    os piores primeiro. O texto vem de uma re-tradução da origem com max_new_tokens proporcional
+    ao excesso medido (src/tgt; segmentos que o split dividiu não têm origem própria); se ela
+    não couber, simplify_for_dubbing corta as palavras do fim (o corte é avisado)
+    Até `retries` rodadas; para quando o TTS extra somar `budget` segundos
+    Atualiza segments (text_trad; original em text_trad_full) e texts no lugar
+    """
+    windows = tts_windows(segments)
+    spent, attempts, fixed, exhausted = 0.0, 0, set(), False
+    ready = pool is not None
+    retranslated, truncated = 0, set()
+
+    for rnd in range(retries):
+        long = []
+        for i, (w, out) in enumerate(zip(windows, seg_files)):
+            ratio = ffprobe_duration(out) / w
+            if ratio > threshold:
+                long.append((ratio, i))
+        if not long:
+            break
+        print(f"\n[RESYNTH] Rodada {rnd + 1}: {len(long)} segmento(s) acima de {threshold:.2f}x a janela")
+
+        long.sort(reverse=True)
+        shrink = RESYNTH_SHRINK ** rnd
+        alt = {}
+        if src and tgt:
+            items = [(i, segments[i]["text_original"].strip(), texts[i], 1.0 / ratio) for ratio, i in long
+                     if (segments[i].get("text_original") or "").strip()]
+            if items:
+                alt = retranslate_shorter(items, src, tgt, shrink)
+
+        candidates = []
+        for ratio, i in long:
+            max_words = max(int(len(texts[i].split()) / ratio * shrink), 1)
+            shorter = alt.get(i)
+            if shorter and len(shorter.split()) <= max_words and shorter != texts[i]:
+                retranslated += 1
+            else:
+                # Último recurso: corta o fim (da re-tradução, se já ficou mais curta que o texto atual)
+                base = shorter if shorter and len(shorter.split()) < len(texts[i].split()) else texts[i]
+                shorter = simplify_for_dubbing(base, max_words)
+                tail = _dropped_tail(base, shorter) if shorter else ""
+                if tail and i not in truncated:
+                    truncated.add(i)
+                    print(f'  [RESYNTH] seg {i + 1}: cortado "{tail}"')
+            if shorter and shorter != texts[i]:
+                candidates.append((i, shorter))
+
+        # Em blocos do tamanho do pool: o orçamento é conferido entre blocos e
+        # um segmento só é tocado quando o seu bloco vai mesmo rodar
+        step = max(1, workers if pool is not None else 1)
+        for k in range(0, len(candidates), step):
+            if spent >= budget:
+                print(f"[AVISO] Orçamento de re-síntese esgotado ({spent:.0f}s de {budget:.0f}s): "
+                      f"{len(candidates) - k} segmento(s) ficam com o texto original")
+                exhausted = True
+                break
+            batch = []
+            for i, shorter in candidates[k:k + step]:
+                segments[i].setdefault("text_trad_full", segments[i].get("text_trad"))
+                segments[i]["text_trad"] = shorter
+                texts[i] = _tts_text(segments[i])
+                fixed.add(i)
+                if not resolve_tts_segment(manifest, cache, i + 1, texts[i], tts_params, seg_files[i]):
+                    batch.append((i + 1, texts[i], str(seg_files[i]), opts))
+            if batch and not ready:
+                _tts_worker_init(engine, opts, threads)
+                ready = True
+            results = pool.imap_unordered(_tts_worker_synth, batch) if pool is not None else map(_tts_worker_synth, batch)
+            for idx, secs in results:
+                spent += secs; attempts += 1
+                dub_metrics.segment("tts_resynth", idx, secs)
+                record_tts_segment(manifest, cache, idx, texts[idx - 1], tts_params, seg_files[idx - 1])
+        if exhausted:
+            break
+
+    if fixed or attempts:
+        print(f"[RESYNTH] {len(fixed)} segmento(s) encurtado(s) ({retranslated} re-tradução(ões), "
+              f"{len(truncated)} com corte), {attempts} síntese(s) extra, {spent:.1f}s de TTS")
+    return len(fixed)
+
+def run_tts(segments, workdir, engine, opts, tts_params, lang, cache=None,
+            workers=1, threads=None, avg_time_per_segment=8.0, label="TTS", resynth=None):
+    """
+    Driver comum da ETAPA 6
+    1) resolve cada segmento pelo manifesto (resume) ou pelo cache de TTS
+    2) sintetiza só os que faltam: em série ou num pool de processos, onde cada
+       worker carrega o modelo uma vez e puxa segmentos da fila
+    3) opcional (resynth): encurta e re-sintetiza os segmentos longos demais para a janela
+    4) escreve segments.csv na ordem dos segmentos (saída determinística)
+    """
+    import time
 
-            # Progresso com ETA
-            if i % 10 == 0 or i == total_segments:
-                elapsed = time.time() - start_time
-                avg_speed = elapsed / i
-                remaining = (total_segments - i) * avg_speed
-                eta_minutes = int(remaining / 60)
-                eta_seconds = int(remaining % 60)
+    manifest = SegmentManifest(workdir)
+    total_segments = len(segments)
+    texts, seg_files, jobs = [], [], []
+    reused = 0; from_cache = 0
+
+    for i, s in enumerate(segments, 1):
+        txt = _tts_text(s)
+        out = Path(workdir, f"seg_{i:04d}.wav")
+        texts.append(txt); seg_files.append(out)
+        t0 = time.perf_counter()
+        found = resolve_tts_segment(manifest, cache, i, txt, tts_params, out)
+        if found:
+            dub_metrics.segment("tts_reuse", i, time.perf_counter() - t0, source=found)
+        if found == "manifest":
+            reused += 1
+        elif found == "cache":
+            from_cache += 1
+        else:
+            jobs.append((i, txt, str(out), opts))
 
-                print(f"  [{i}/{total_segments}] {(i/total_segments*100):.1f}% - "
-                      f"ETA: {eta_minutes}m {eta_seconds}s - "
-                      f"Último segmento: {seg_time:.1f}s")
+    workers = max(1, min(workers or 1, len(jobs) or 1))
+
+    # ESTIMATIVA DE TEMPO
+    estimated_minutes = (len(jobs) * avg_time_per_segment) / 60 / workers
+    print(f"\n{'='*60}")
+    print(f"  AVISO: PROCESSO DEMORADO!")
+    print(f"{'='*60}")
+    print(f"  Total de segmentos: {total_segments}")
+    print(f"  A sintetizar: {len(jobs)} (manifesto: {reused}, cache: {from_cache})")
+    print(f"  Workers: {workers}" + (f" x {threads} threads" if threads else ""))
+    print(f"  Tempo estimado: ~{int(estimated_minutes)} minutos")
+    print(f"  (~{avg_time_per_segment}s por segmento por worker)")
+    print(f"{'='*60}")
+    print("\nGerando áudio dos segmentos...\n")
+
+    start_time = time.time()
+    done = 0
+
+    def on_done(idx, seg_time):
+        nonlocal done
+        dub_metrics.segment("tts", idx, seg_time)
+        record_tts_segment(manifest, cache, idx, texts[idx - 1], tts_params, seg_files[idx - 1])
+        done += 1
+        # Progresso com ETA (tempo de parede: já considera os workers em paralelo)
+        if done % 10 == 0 or done == len(jobs):
+            elapsed = time.time() - start_time
+            remaining = (len(jobs) - done) * (elapsed / done)
+            eta_minutes = int(remaining / 60)
+            eta_seconds = int(remaining % 60)
+            print(f"  [{done}/{len(jobs)}] {(done/len(jobs)*100):.1f}% - "
+                  f"ETA: {eta_minutes}m {eta_seconds}s - "
+                  f"Último segmento: {seg_time:.1f}s")
+
+    pool = None
+    try:
+        if jobs and workers > 1:
+            pool = get_tts_pool(engine, opts, workers, threads)
+            for idx, seg_time in pool.imap_unordered(_tts_worker_synth, jobs):
+                on_done(idx, seg_time)
+        elif jobs:
+            _tts_worker_init(engine, opts, threads)
+            for job in jobs:
+                on_done(*_tts_worker_synth(job))
+
+        if resynth and resynth.get("threshold"):
+            resynthesize_long(segments, texts, seg_files, manifest, cache, engine, opts, tts_params,
+                              workers=workers, threads=threads, pool=pool, **resynth)
+    finally:
+        manifest.flush()
+
+    write_segments_csv(segments, texts, seg_files, workdir, lang)
 
     total_time = time.time() - start_time
-    print(f"\n[OK] TTS Bark gerou: {len(seg_files)} arquivos em {int(total_time/60)}m {int(total_time%60)}s")
-    return seg_files, 24000
+    print(f"\n[OK] {label} gerou: {len(seg_files)} arquivos em {int(total_time/60)}m {int(total_time%60)}s")
+    if reused:
+        print(f"  (Resume: {reused} reaproveitados do manifesto, {len(jobs)} gerados)")
+    if cache is not None:
+        print(f"  Cache TTS: {cache.stats['hits']} acertos, {cache.stats['misses']} faltas")
+    return seg_files
+
+def tts_engine_config(engine, tgt_lang, voice=None, text_temp=0.6, wave_temp=0.6):
+    """
+    Opções do worker e parâmetros que identificam o áudio (manifesto/cache)
+    Retorna (opts, tts_params, sample_rate, idioma para a estimativa de duração)
+    """
+    if engine == "bark":
+        opts = {"voice": voice, "text_temp": text_temp, "wave_temp": wave_temp}
+        tts_params = {"engine": "bark", "model": "suno/bark", "voice": voice,
+                      "text_temp": text_temp, "wave_temp": wave_temp}
+        return opts, tts_params, 24000, "pt"
 
-def tts_coqui(segments, workdir, tgt_lang, speaker=None):
-    print("\n=== ETAPA 6: TTS (Coqui) ===")
-    from TTS.api import TTS
     lang = (tgt_lang or "en").lower()
     if lang in ("pt","pt-br","pt_pt"):
         model_name = "tts_models/pt/cv/vits"; sample_rate = 22050
     else:
         model_name = "tts_models/en/ljspeech/tacotron2-DDC"; sample_rate = 22050
+    opts = {"model": model_name, "speaker": voice, "lang": tgt_lang}
+    tts_params = {"engine": "coqui", "model": model_name, "voice": voice, "lang": tgt_lang}
+    return opts, tts_params, sample_rate, tgt_lang
 
-    tts = TTS(model_name, gpu=False)
-    seg_files = []
-    tsv = Path(workdir, "segments.csv")
-    with open(tsv, "w", encoding="utf-8", newline="") as fcsv:
-        w = csv.writer(fcsv)
-        w.writerow(["idx", "t_in","t_out","texto_trad","file","estimated_dur","actual_dur","compression_ratio"])
-        for i, s in enumerate(segments, 1):
-            txt = (s.get("text_trad") or "").strip()
-            if len(re.findall(r"[A-Za-zÀ-ÿ0-9]", txt)) < 3:
-                txt = "pausa curta"
-
-            estimated = s.get("trad_estimated_dur", estimate_tts_duration(txt, tgt_lang))
-            compression = s.get("compression_ratio", 1.0)
+def tts_bark(segments, workdir, text_temp=0.6, wave_temp=0.6, history_prompt=None, cache=None,
+             workers=1, threads=None, resynth=None):
+    print("\n=== ETAPA 6: TTS (Bark) ===")
+    import torch
 
-            out = Path(workdir, f"seg_{i:04d}.wav")
-            if speaker:
-                try:
-                    tts.tts_to_file(text=txt, file_path=str(out), speaker=speaker, language=tgt_lang)
-                except Exception:
-                    tts.tts_to_file(text=txt, file_path=str(out))
-            else:
-                tts.tts_to_file(text=txt, file_path=str(out))
+    # Detecção automática de GPU/CPU
+    use_gpu = torch.cuda.is_available()
+    if use_gpu:
+        print("GPU detectada! Usando CUDA para TTS (muito mais rápido)...")
+        avg_time_per_segment = 1.5  # ~1.5s por segmento na GPU
+        if workers and workers > 1:
+            print("  (Pool de workers é só para CPU: usando 1 processo na GPU)")
+            workers = 1
+    else:
+        print("GPU não disponível, usando CPU (mais lento)...")
+        avg_time_per_segment = 8  # ~8s por segmento na CPU
 
-            actual_dur = ffprobe_duration(out)
-            seg_files.append(out)
-            w.writerow([i, s["start"], s["end"], txt, out.name, f"{estimated:.3f}", f"{actual_dur:.3f}", f"{compression:.2f}"])
+    opts, tts_params, sample_rate, lang = tts_engine_config("bark", "pt", history_prompt, text_temp, wave_temp)
+    seg_files = run_tts(segments, workdir, "bark", opts, tts_params, lang, cache=cache,
+                        workers=workers, threads=threads,
+                        avg_time_per_segment=avg_time_per_segment, label="TTS Bark", resynth=resynth)
+    return seg_files, sample_rate
 
-    print(f"TTS Coqui gerou: {len(seg_files)} arquivos")
+def tts_coqui(segments, workdir, tgt_lang, speaker=None, cache=None, workers=1, threads=None, resynth=None):
+    print("\n=== ETAPA 6: TTS (Coqui) ===")
+    opts, tts_params, sample_rate, _ = tts_engine_config("coqui", tgt_lang, speaker)
+    seg_files = run_tts(segments, workdir, "coqui", opts, tts_params, tgt_lang, cache=cache,
+                        workers=workers, threads=threads, avg_time_per_segment=2.0,
+                        label="TTS Coqui", resynth=resynth)
     return seg_files, sample_rate
 
 # [Funções de sync do arquivo anterior]
@@ -783,10 +1430,27 @@ def atempo_chain(factor):
     chain.append(f"atempo={f:.6f}")
     return ",".join(chain)
 
+def apply_audio_chain(in_path, out_path, workdir, fchain, sr=None, **ops):
+    """
+    Aplica fade/tempo/pad/trim em memória (dub_audio) e escreve só o arquivo final
+    Usa ffmpeg com a cadeia -af equivalente se AUDIO_ENGINE="ffmpeg" ou se o WAV não for suportado
+    """
+    if AUDIO_ENGINE == "numpy":
+        try:
+            dub_audio.process_file(Path(workdir, in_path.name), Path(workdir, out_path.name), sr=sr, **ops)
+            return out_path
+        except (ValueError, OSError) as e:
+            print(f"  [AVISO] Motor NumPy falhou em {in_path.name} ({e}), usando ffmpeg")
+    cmd = ["ffmpeg","-y","-i", in_path.name, "-af", fchain]
+    if sr:
+        cmd += ["-ar", str(sr), "-ac","1"]
+    sh(cmd + [out_path.name], cwd=workdir)
+    return out_path
+
 def safe_fade(in_path, out_path, workdir, fad=0.02):
-    sh(["ffmpeg","-y","-i", in_path.name,
-        "-af", f"afade=t=in:ss=0:d={fad},areverse,afade=t=in:ss=0:d={fad},areverse",
-        out_path.name], cwd=workdir)
+    apply_audio_chain(in_path, out_path, workdir,
+                      f"afade=t=in:ss=0:d={fad},areverse,afade=t=in:ss=0:d={fad},areverse",
+                      fade=fad)
 
 def sync_fit(p, target, workdir, sr, tol, maxstretch):
     cur = ffprobe_duration(Path(workdir, p.name))
@@ -801,9 +1465,10 @@ def sync_fit(p, target, workdir, sr, tol, maxstretch):
         out = Path(workdir, p.name.replace(".wav", "_fit.wav"))
         if diff >= 0:
             fchain = f"apad=pad_dur={diff:.6f},atrim=duration={target:.6f}"
+            apply_audio_chain(p, out, workdir, fchain, sr=sr, pad=diff, trim=target)
         else:
             fchain = f"atrim=duration={target:.6f}"
-        sh(["ffmpeg","-y","-i", p.name, "-af", fchain, "-ar", str(sr), "-ac","1", out.name], cwd=workdir)
+            apply_audio_chain(p, out, workdir, fchain, sr=sr, trim=target)
         return out, 1.0
 
     ratio = (cur / target) if target > 0 else 1.0
@@ -811,7 +1476,7 @@ def sync_fit(p, target, workdir, sr, tol, maxstretch):
     f_atempo = atempo_chain(ratio)
     out = Path(workdir, p.name.replace(".wav", "_fit.wav"))
     fchain = f"{f_atempo},atrim=duration={target:.6f}"
-    sh(["ffmpeg","-y","-i", p.name, "-af", fchain, "-ar", str(sr), "-ac","1", out.name], cwd=workdir)
+    apply_audio_chain(p, out, workdir, fchain, sr=sr, tempo=ratio, trim=target)
     return out, ratio
 
 def sync_pad(p, target, workdir, sr):
@@ -820,12 +1485,12 @@ def sync_pad(p, target, workdir, sr):
         return p, 1.0
     if cur >= target:
         out = Path(workdir, p.name.replace(".wav","_pad.wav"))
-        sh(["ffmpeg","-y","-i", p.name, "-af", f"atrim=duration={target:.6f}", "-ar", str(sr), "-ac","1", out.name], cwd=workdir)
+        apply_audio_chain(p, out, workdir, f"atrim=duration={target:.6f}", sr=sr, trim=target)
         return out, 1.0
     pad_dur = max(target - cur, 0.0)
     out = Path(workdir, p.name.replace(".wav","_pad.wav"))
-    sh(["ffmpeg","-y","-i", p.name, "-af", f"apad=pad_dur={pad_dur:.6f},atrim=duration={target:.6f}",
-        "-ar", str(sr), "-ac","1", out.name], cwd=workdir)
+    apply_audio_chain(p, out, workdir, f"apad=pad_dur={pad_dur:.6f},atrim=duration={target:.6f}",
+                      sr=sr, pad=pad_dur, trim=target)
     return out, 1.0
 
 def sync_smart(p, target, workdir, sr, tol, maxstretch):
@@ -839,40 +1504,59 @@ def sync_smart(p, target, workdir, sr, tol, maxstretch):
     else:
         return p, 1.0
 
-def sync_elastic(segments_data, workdir, sr, tol=0.15, maxstretch=1.35):
-    print("\n=== Modo ELASTIC: Redistribuindo tempo entre segmentos ===")
-
-    actual_durations = []
-    for path, target, seg in segments_data:
-        actual = ffprobe_duration(Path(workdir, path.name))
-        actual_durations.append(actual)
-
-    cumulative_offset = 0
-    adjusted_targets = []
-
-    for i, (path, target, seg) in enumerate(segments_data):
-        actual = actual_durations[i]
-        diff = actual - target
-
-        cumulative_offset += diff
-
-        if abs(cumulative_offset) > 0.5 and i < len(segments_data) - 1:
-            lookahead = min(5, len(segments_data) - i - 1)
-            compensation_per_seg = cumulative_offset / lookahead
+def plan_sync(cur, target, mode, tol, maxstretch):
+    """
+    Decisão de sync_fit/sync_pad/sync_smart sem tocar em arquivos
+    Retorna (ops para dub_audio.process_array, ratio); ops vazio = segmento intacto
+    """
+    if cur <= 0 or mode == "none":
+        return {}, 1.0
+    if mode == "smart":
+        if cur < target * (1 - tol):
+            mode = "pad"
+        elif cur > target * (1 + tol):
+            mode = "fit"
+        else:
+            return {}, 1.0
+    if mode == "pad":
+        if cur >= target:
+            return {"trim": target}, 1.0
+        return {"pad": max(target - cur, 0.0), "trim": target}, 1.0
+    # fit
+    diff = target - cur
+    if abs(diff) <= target * tol:
+        if diff >= 0:
+            return {"pad": diff, "trim": target}, 1.0
+        return {"trim": target}, 1.0
+    ratio = (cur / target) if target > 0 else 1.0
+    ratio = max(min(ratio, maxstretch), 1.0 / maxstretch)
+    return {"tempo": ratio, "trim": target}, ratio
 
-            for j in range(i + 1, min(i + 1 + lookahead, len(segments_data))):
-                segments_data[j] = (
-                    segments_data[j][0],
-                    segments_data[j][1] - compensation_per_seg,
-                    segments_data[j][2]
-                )
+def sync_segment(p, target, mode, workdir, sr, tol, maxstretch):
+    """Modos da ETAPA 7 que tratam cada segmento isoladamente (elastic precisa de todos)"""
+    if mode == "fit":
+        return sync_fit(p, target, workdir, sr, tol, maxstretch)
+    if mode == "pad":
+        return sync_pad(p, target, workdir, sr)
+    if mode == "smart":
+        return sync_smart(p, target, workdir, sr, tol, maxstretch)
+    return p, 1.0
 
-            cumulative_offset = 0
+def sync_elastic(segments_data, workdir, sr, tol=0.15, maxstretch=1.35, pause_index=None, total_duration=None):
+    """
+    segments_data: lista de (path, target_duration, segment_info), não é modificada
+    Alvos resolvidos para todos os segmentos de uma vez (dub_audio.elastic_targets)
+    antes de renderizar qualquer áudio
+    """
+    print("\n=== Modo ELASTIC: Redistribuindo tempo entre segmentos ===")
 
-        adjusted_targets.append(target)
+    actual_durations = [ffprobe_duration(Path(workdir, path.name)) for path, _, _ in segments_data]
+    segs = [seg for _, _, seg in segments_data]
+    adjusted = dub_audio.elastic_targets(actual_durations, [s["start"] for s in segs], [s["end"] for s in segs],
+                                         maxstretch, pauses=pause_index, total_duration=total_duration)
 
     results = []
-    for i, (path, target, seg) in enumerate(segments_data):
+    for (path, _, seg), target in zip(segments_data, adjusted):
         adjusted_path, ratio = sync_fit(path, target, workdir, sr, tol, maxstretch)
         results.append((adjusted_path, ratio, seg))
 
@@ -916,8 +1600,256 @@ def calculate_sync_metrics(segments_info):
 
     return metrics
 
-def concat_segments(seg_files, workdir, samplerate, segs_trad=None, preserve_gaps=False, gap_min=0.20):
+# ---------------- MODO STREAMING: ETAPAS 3-7 sobrepostas ----------------
+# ASR -> tradução -> split -> TTS -> fade/sync, cada etapa numa thread ligada por filas limitadas
+# O TTS começa assim que o primeiro segmento é transcrito e traduzido
+STREAM_QUEUE_SIZE = 32
+_STREAM_END = object()
+
+def _stream_put(q, item, stop):
+    # put com timeout: não trava se uma etapa seguinte falhou
+    while not stop.is_set():
+        try:
+            q.put(item, timeout=0.1)
+            return True
+        except queue.Full:
+            continue
+    return False
+
+def _stream_iter(q, stop):
+    while not stop.is_set():
+        try:
+            item = q.get(timeout=0.1)
+        except queue.Empty:
+            continue
+        if item is _STREAM_END:
+            return
+        yield item
+
+def _stream_thread(name, fn, q_out, stop, errors):
+    def run():
+        try:
+            fn()
+        except BaseException as e:
+            errors.append((name, e))
+            stop.set()
+        finally:
+            if q_out is not None:
+                _stream_put(q_out, _STREAM_END, stop)
+    return threading.Thread(target=run, name=f"dublar-{name}", daemon=True)
+
+def run_streaming_pipeline(audio_src, workdir, src, tgt, engine, voice=None, text_temp=0.6, wave_temp=0.6,
+                           simplify=True, batch_size=8, num_beams=5, tm=None, maxdur=10.0, pause_index=None,
+                           tts_cache=None, tts_workers=1, tts_threads=None, fade=0.02, sync="smart",
+                           tolerance=0.0, maxstretch=2.0, asr_workers=1, asr_threads=None, asr_chunk=120.0,
+                           duration_model=None):
+    """
+    ETAPAS 3-7 em fluxo contínuo
+    - tradução em lotes adaptativos (até batch_size, sem esperar lote cheio se a fila esvaziou)
+    - TTS em processo ou em pool (--tts-workers), com manifesto e cache como na ETAPA 6
+    - sync por segmento; no modo elastic só aplica o fade (o elastic precisa de todos os segmentos)
+    Escreve asr.json/asr_trad.json/segments.csv no fim e retorna os mesmos dados das etapas em série
+    """
+    print("\n=== ETAPAS 3-7: Modo STREAMING (ASR -> tradução -> split -> TTS -> sync) ===")
+    import time
+    from collections import deque
+
+    t0 = time.time()
+    stop = threading.Event()
+    errors = []
+    q_asr, q_mt, q_split, q_tts = (queue.Queue(maxsize=STREAM_QUEUE_SIZE) for _ in range(4))
+    counts = {"asr": 0, "mt": 0, "split": 0, "tts": 0, "sync": 0}
+    timing = {}
+    # As threads das etapas não herdam a etapa ativa: registram direto no recorder do job
+    rec = dub_metrics.current()
+
+    def seg_metric(stage, idx, seconds, **extra):
+        if rec is not None:
+            rec.segment(stage, idx, seconds, **extra)
+
+    opts, tts_params, sr_segs, csv_lang = tts_engine_config(engine, tgt, voice, text_temp, wave_temp)
+    if engine == "bark" and tts_workers > 1:
+        import torch
+        if torch.cuda.is_available():
+            print("  (Pool de workers é só para CPU: usando 1 processo na GPU)")
+            tts_workers = 1
+    if pause_index is None:
+        pause_index = dub_audio.PauseIndex([])
+
+    asr_segs, trad_segs = [], []
+    split_segs, texts, raw_files = [], [], []
+    synced = {}
+
+    def asr_stage():
+        try:
+            for s in iter_asr(audio_src, src, asr_workers, asr_threads, asr_chunk, pause_index):
+                if not counts["asr"]:
+                    timing["first_asr_s"] = time.time() - t0
+                asr_segs.append(s)
+                counts["asr"] += 1
+                if not _stream_put(q_asr, s, stop):
+                    return
+        finally:
+            if stop.is_set():
+                close_asr_pools(terminate=True)
+
+    def mt_stage():
+        model_name = M2M100_MODEL
+        tok, model = load_m2m100(model_name)
+        src_c, tgt_c = m2m100_lang_codes(tok, src, tgt)
+        batch = []
+
+        def flush():
+            translations = translate_batch_with_length_control(
+                [s.get("text", "").strip() for s in batch], src_c, tgt_c, tok, model,
+                num_beams=num_beams, batch_size=batch_size, tm=tm, model_name=model_name)
+            for s, translation in zip(batch, translations):
+                item = build_translated_segment(s, translation, tgt_c, simplify, duration_model)
+                trad_segs.append(item)
+                counts["mt"] += 1
+                if not _stream_put(q_mt, item, stop):
+                    return
+            batch.clear()
+
+        for s in _stream_iter(q_asr, stop):
+            batch.append(s)
+            if len(batch) >= batch_size or q_asr.empty():
+                flush()
+        if batch and not stop.is_set():
+            flush()
+
+    def split_stage():
+        for s in _stream_iter(q_mt, stop):
+            parts = split_segment(s, maxdur, pause_index) if maxdur and maxdur > 0 else [s]
+            for part in parts:
+                split_segs.append(part)
+                counts["split"] += 1
+                if not _stream_put(q_split, (counts["split"], part), stop):
+                    return
+
+    def tts_stage():
+        manifest = SegmentManifest(workdir)
+        pending = deque()
+        limit = 2 * tts_workers
+
+        def finish(idx):
+            if "first_tts_s" not in timing:
+                timing["first_tts_s"] = time.time() - t0
+                print(f"  [STREAM] Primeiro segmento sintetizado em {timing['first_tts_s']:.1f}s")
+            counts["tts"] += 1
+            if counts["tts"] % 10 == 0:
+                print(f"  [STREAM] ASR {counts['asr']} | tradução {counts['mt']} | "
+                      f"split {counts['split']} | TTS {counts['tts']} | sync {counts['sync']}")
+            _stream_put(q_tts, (idx, split_segs[idx - 1], raw_files[idx - 1]), stop)
+
+        def collect(res):
+            idx, secs = res.get()
+            seg_metric("tts", idx, secs)
+            record_tts_segment(manifest, tts_cache, idx, texts[idx - 1], tts_params, raw_files[idx - 1])
+            finish(idx)
+
+        pool = None
+        if tts_workers > 1:
+            pool = get_tts_pool(engine, opts, tts_workers, tts_threads)
+        else:
+            _tts_worker_init(engine, opts, tts_threads)
+        try:
+            for idx, s in _stream_iter(q_split, stop):
+                txt = _tts_text(s)
+                out = Path(workdir, f"seg_{idx:04d}.wav")
+                texts.append(txt); raw_files.append(out)
+                t_seg = time.perf_counter()
+                found = resolve_tts_segment(manifest, tts_cache, idx, txt, tts_params, out)
+                if found:
+                    seg_metric("tts_reuse", idx, time.perf_counter() - t_seg, source=found)
+                    finish(idx)
+                elif pool is None:
+                    seg_metric("tts", idx, _tts_worker_synth((idx, txt, str(out), opts))[1])
+                    record_tts_segment(manifest, tts_cache, idx, txt, tts_params, out)
+                    finish(idx)
+                else:
+                    pending.append(pool.apply_async(_tts_worker_synth, ((idx, txt, str(out), opts),)))
+                    while len(pending) >= limit or (pending and pending[0].ready()):
+                        collect(pending.popleft())
+            while pending and not stop.is_set():
+                collect(pending.popleft())
+        finally:
+            manifest.flush()
+            if pool is not None and stop.is_set():
+                close_tts_pools(terminate=True)
+
+    def sync_stage():
+        for idx, s, p in _stream_iter(q_tts, stop):
+            if fade and fade > 0:
+                xf = Path(workdir, f"seg_{idx:04d}_xf.wav")
+                t0 = time.perf_counter()
+                safe_fade(p, xf, workdir, fade)
+                seg_metric("fade", idx, time.perf_counter() - t0)
+                p = xf
+            target = max(0.05, s["end"] - s["start"])
+            if sync == "elastic":
+                synced[idx] = (p, 1.0, target)
+            else:
+                t0 = time.perf_counter()
+                out, ratio = sync_segment(p, target, sync, workdir, sr_segs, tolerance, maxstretch)
+                seg_metric("sync", idx, time.perf_counter() - t0, ratio=round(ratio, 4))
+                synced[idx] = (out, ratio, target)
+            counts["sync"] += 1
+
+    threads = [
+        _stream_thread("asr", asr_stage, q_asr, stop, errors),
+        _stream_thread("traducao", mt_stage, q_mt, stop, errors),
+        _stream_thread("split", split_stage, q_split, stop, errors),
+        _stream_thread("tts", tts_stage, q_tts, stop, errors),
+        _stream_thread("sync", sync_stage, None, stop, errors),
+    ]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    if errors:
+        name, err = errors[0]
+        print(f"ERRO na etapa '{name}' do modo streaming: {err}")
+        raise err
+
+    total_time = time.time() - t0
+    asr_json, asr_srt = write_asr_outputs(asr_segs, workdir, src)
+    trad_json, trad_srt = write_trad_outputs(trad_segs, workdir, tgt)
+    write_segments_csv(split_segs, texts, raw_files, workdir, csv_lang)
+
+    seg_files = [synced[i][0] for i in range(1, len(split_segs) + 1)]
+    sync_info = [{"target": synced[i][2], "actual": ffprobe_duration(synced[i][0]), "ratio": synced[i][1]}
+                 for i in range(1, len(split_segs) + 1)]
+
+    stats = {"segments_asr": len(asr_segs), "segments_tts": len(split_segs),
+             "first_asr_s": timing.get("first_asr_s"), "first_tts_s": timing.get("first_tts_s"),
+             "total_s": total_time, "queue_size": STREAM_QUEUE_SIZE}
+    print(f"\n{'='*60}")
+    print(f"  [OK] Streaming: {len(asr_segs)} segmentos transcritos, {len(split_segs)} sintetizados")
+    if stats["first_tts_s"] is not None:
+        print(f"  Primeiro segmento sintetizado: {stats['first_tts_s']:.1f}s")
+    print(f"  Tempo total (ETAPAS 3-7): {int(total_time/60)}m {int(total_time%60)}s")
+    if tts_cache is not None:
+        print(f"  Cache TTS: {tts_cache.stats['hits']} acertos, {tts_cache.stats['misses']} faltas")
+    print(f"{'='*60}")
+
+    return {"segs": asr_segs, "segs_trad": split_segs, "seg_files": seg_files, "sync_info": sync_info,
+            "sr": sr_segs, "asr_json": asr_json, "asr_srt": asr_srt,
+            "trad_json": trad_json, "trad_srt": trad_srt, "stats": stats}
+
+def concat_segments(seg_files, workdir, samplerate, segs_trad=None, preserve_gaps=False, gap_min=0.20,
+                    render="concat", total_duration=None):
     print("\n=== ETAPA 8: Concatenação ===")
+    out = Path(workdir, "dub_raw.wav")
+
+    # Linha do tempo: cada segmento no seu "start", numa única escrita
+    if render == "timeline" and segs_trad is not None and len(segs_trad) == len(seg_files):
+        print(f"Renderizando linha do tempo ({len(seg_files)} segmentos)...")
+        return dub_audio.render_timeline(seg_files, [s["start"] for s in segs_trad], out,
+                                         samplerate, total_duration)
+    if render == "timeline":
+        print("  [AVISO] Segmentos sem timestamps correspondentes, usando concat")
+
     lst = Path(workdir, "list.txt")
     files_for_concat = []
 
@@ -936,35 +1868,127 @@ def concat_segments(seg_files, workdir, samplerate, segs_trad=None, preserve_gap
         for p in files_for_concat:
             f.write(f"file '{p.name}'\n")
 
-    out = Path(workdir, "dub_raw.wav")
     sh([
         "ffmpeg","-y","-f","concat","-safe","0","-i", lst.name,
         "-c:a","pcm_s16le","-ar", str(samplerate),"-ac","1", out.name
     ], cwd=workdir)
     return out
 
-def postprocess_audio(wav_in, workdir, samplerate):
+POSTPROCESS_EQ = "afftdn=nf=-25,equalizer=f=6500:t=h:width=2000:g=-4"
+POSTPROCESS_FX = "loudnorm=I=-16:TP=-1.5:LRA=11," + POSTPROCESS_EQ
+
+def postprocess_audio(wav_in, workdir, samplerate, loudnorm="dynamic"):
+    """
+    loudnorm="dynamic": uma passada (loudnorm dinâmico)
+    loudnorm="measured": mede uma vez (cache em loudnorm.json pelo hash do dub_raw) e normaliza linear
+    """
     print("\n=== ETAPA 9: Pós-processo ===")
     out = Path(workdir, "dub_final.wav")
-    fx = "loudnorm=I=-16:TP=-1.5:LRA=11,afftdn=nf=-25,equalizer=f=6500:t=h:width=2000:g=-4"
+    fx = POSTPROCESS_FX
+    if loudnorm == "measured":
+        measured = dub_audio.loudnorm_measure(Path(workdir, wav_in.name), Path(workdir, "loudnorm.json"))
+        fx = dub_audio.loudnorm_filter(measured) + "," + POSTPROCESS_EQ
     sh(["ffmpeg","-y","-i", wav_in.name, "-af", fx, "-ar", str(samplerate), "-ac","1", out.name], cwd=workdir)
     return out
 
+def sh_feed(cmd, feed, cwd=None):
+    """Como sh(), mas entrega os dados via stdin: feed(write) escreve enquanto o ffmpeg processa"""
+    print(">>", " ".join(map(str, cmd)))
+    t0 = time.perf_counter()
+    proc = subprocess.Popen(cmd, stdin=subprocess.PIPE, cwd=cwd)
+    try:
+        try:
+            feed(proc.stdin.write)
+        except BrokenPipeError:
+            pass  # ffmpeg saiu antes do fim: o código de retorno diz o motivo
+        finally:
+            try:
+                proc.stdin.close()
+            except BrokenPipeError:
+                pass
+        ret = proc.wait()
+    except BaseException:
+        proc.kill()
+        proc.wait()
+        raise
+    finally:
+        dub_metrics.record_subprocess(cmd, time.perf_counter() - t0, cwd)
+    if ret != 0:
+        raise subprocess.CalledProcessError(ret, cmd)
+
+def render_onepass(seg_files, segs_trad, workdir, sr, out_rate, fade=0.0, sync="none", tol=0.0,
+                   maxstretch=2.0, total_duration=None, postprocess=True, dump=False, pause_index=None):
+    """
+    ETAPAS 6.1-9 numa passada: cada seg_XXXX.wav é lido uma vez, recebe fade + sync
+    em memória (dub_audio) e é mixado no seu timestamp direto no stdin de um único
+    ffmpeg de pós-processo. Sem _xf/_fit/_pad, sem dub_raw.wav (só com dump=True)
+    sync: modo da ETAPA 7 ("none" se os arquivos já vêm sincronizados, ex.: --stream)
+    Retorna (dub_final.wav ou dub_raw.wav se postprocess=False, sync_info)
+    """
+    print("\n=== ETAPAS 6.1-9: Renderização única (fade + sync + linha do tempo + pós-processo) ===")
+    workdir = Path(workdir)
+    curs = [ffprobe_duration(p) for p in seg_files]
+    targets = [max(0.05, s["end"] - s["start"]) for s in segs_trad]
+    if sync == "elastic":
+        targets = dub_audio.elastic_targets(curs, [s["start"] for s in segs_trad], [s["end"] for s in segs_trad],
+                                            maxstretch, pauses=pause_index, total_duration=total_duration)
+        plans = [plan_sync(c, t, "fit", tol, maxstretch) for c, t in zip(curs, targets)]
+    else:
+        plans = [plan_sync(c, t, sync, tol, maxstretch) for c, t in zip(curs, targets)]
+
+    sync_info = [None] * len(seg_files)
+    order = sorted(range(len(seg_files)), key=lambda i: segs_trad[i]["start"])
+
+    def items():
+        for i in order:
+            ops, ratio = plans[i]
+            y, sr_in = dub_audio.read_wav(seg_files[i])
+            y, _ = dub_audio.process_array(y, sr_in, sr=sr, fade=(fade or None), **ops)
+            if dump:
+                dub_audio.write_wav(Path(workdir, f"seg_{i + 1:04d}_onepass.wav"), y, sr)
+            sync_info[i] = {"target": segs_trad[i]["end"] - segs_trad[i]["start"],
+                            "actual": len(y) / float(sr), "ratio": ratio}
+            yield segs_trad[i]["start"], y
+
+    dub_raw = Path(workdir, "dub_raw.wav")
+
+    def feed(write):
+        if postprocess and not dump:
+            dub_audio.stream_timeline(items(), sr, write, total_duration)
+            return
+        # dub_raw.wav em paralelo; o cabeçalho é corrigido no fim (tamanho só é conhecido depois)
+        tmp = dub_raw.with_name(dub_raw.name + ".tmp")
+        with open(tmp, "wb") as raw:
+            raw.write(dub_audio.wav_header_pcm16(0, sr))
+            def tee(b):
+                raw.write(b)
+                if postprocess:
+                    write(b)
+            n = dub_audio.stream_timeline(items(), sr, tee, total_duration)
+            raw.seek(0)
+            raw.write(dub_audio.wav_header_pcm16(n, sr))
+        os.replace(tmp, dub_raw)
+        dub_metrics.count_bytes(written=n * 2)
+
+    if postprocess:
+        out = Path(workdir, "dub_final.wav")
+        sh_feed(["ffmpeg","-y","-f","s16le","-ar", str(sr),"-ac","1","-i","pipe:0",
+                 "-af", POSTPROCESS_FX, "-ar", str(out_rate), "-ac","1", out.name], feed, cwd=workdir)
+    else:
+        feed(None)
+        out = dub_raw
+    print(f"Renderizados {len(seg_files)} segmentos numa passada -> {out.name}")
+    return out, sync_info
+
 def mux_video(video_in, wav_in, out_mp4, bitrate):
     print("\n=== ETAPA 10: Mux final ===")
     sh(["ffmpeg","-y","-i", str(video_in), "-i", str(wav_in),
         "-map","0:v:0","-map","1:a:0","-c:v","copy","-c:a","aac","-b:a", bitrate, str(out_mp4)])
 
 # ---------------- MAIN ----------------
-def main():
-    print("="*70)
-    print("  PIPELINE DE DUBLAGEM TÉCNICA v2.0")
-    print("  Otimizado para vídeos de demonstração técnica e programação")
-    print("="*70)
-    print("\n=== ETAPA 1: Entrada/cheques ===")
-
+def build_arg_parser():
     ap = argparse.ArgumentParser(description="Dublagem otimizada para conteúdo técnico")
-    ap.add_argument("--in", dest="inp", required=True)
+    ap.add_argument("--in", dest="inp", default=None)
     ap.add_argument("--out", dest="out", default=None)
     ap.add_argument("--src", required=True)
     ap.add_argument("--tgt", required=True)
@@ -980,36 +2004,96 @@ def main():
     ap.add_argument("--texttemp", type=float, default=0.6)
     ap.add_argument("--wavetemp", type=float, default=0.6)
     ap.add_argument("--fade", type=float, default=0.02)
+    ap.add_argument("--audio-engine", choices=["numpy","ffmpeg"], default="numpy",
+                    help="Fade/sync em memória (numpy) ou via ffmpeg por segmento")
 
     ap.add_argument("--preserve-gaps", action="store_true")
     ap.add_argument("--gap-min", type=float, default=0.20)
+    ap.add_argument("--render", choices=["concat","timeline","onepass"], default="concat",
+                    help="ETAPA 8: concat (ffmpeg + silêncios), timeline (cada segmento no seu timestamp, uma passada) "
+                         "ou onepass (fade + sync + linha do tempo + pós-processo numa passada, sem WAVs intermediários)")
+    ap.add_argument("--render-dump", action="store_true",
+                    help="Com --render onepass: grava seg_XXXX_onepass.wav e dub_raw.wav para depuração")
+    ap.add_argument("--loudnorm", choices=["dynamic","measured"], default="dynamic",
+                    help="ETAPA 9: loudnorm dinâmico (uma passada) ou medido (duas passadas, linear; medição em cache no workdir)")
     ap.add_argument("--enable-vad", action="store_true")
 
+    # ASR em blocos paralelos (cortes em pausas do VAD por energia)
+    ap.add_argument("--asr-workers", type=int, default=1, help="Processos de ASR em paralelo (1 = arquivo inteiro num modelo)")
+    ap.add_argument("--asr-threads", type=int, default=None, help="Threads por worker de ASR (padrão: núcleos / workers)")
+    ap.add_argument("--asr-chunk", type=float, default=120.0, help="Duração alvo dos blocos de ASR em segundos")
+
     # NOVO: Opções para conteúdo técnico
     ap.add_argument("--no-simplify", action="store_true", help="Desativa simplificação automática")
+    ap.add_argument("--mt-batch", type=int, default=8, help="Segmentos por lote na tradução")
+    ap.add_argument("--mt-beams", type=int, default=5, help="Número de beams na tradução (1 = greedy, mais rápido)")
+    ap.add_argument("--tm", dest="tm_path", default=None, help="Arquivo SQLite da memória de tradução (padrão: ~/.cache/dublar)")
+    ap.add_argument("--tm-fuzzy", type=float, default=0.0, help="Similaridade mínima para busca aproximada na memória (0 = só exata)")
+    ap.add_argument("--no-tm", action="store_true", help="Desativa a memória de tradução")
+    ap.add_argument("--resynth-threshold", type=float, default=0.0,
+                    help="ETAPA 6: re-sintetiza com texto mais curto os segmentos com duração acima de X vezes a "
+                         "janela até o próximo segmento, em vez de comprimir com atempo (ex.: 1.3; 0 desativa)")
+    ap.add_argument("--resynth-retries", type=int, default=2, help="Rodadas de re-síntese por segmento")
+    ap.add_argument("--resynth-budget", type=float, default=300.0,
+                    help="Tempo máximo de TTS extra gasto nas re-sínteses (segundos)")
+    ap.add_argument("--no-duration-model", action="store_true",
+                    help="Usa a heurística fixa (palavras/s) em vez do modelo de duração aprendido dos segments.csv")
+
+    # Cache de TTS compartilhado entre execuções/vídeos
+    ap.add_argument("--tts-cache-dir", default=None, help="Diretório do cache de TTS (padrão: ~/.cache/dublar/tts)")
+    ap.add_argument("--tts-cache-max-mb", type=int, default=2048, help="Tamanho máximo do cache de TTS (LRU)")
+    ap.add_argument("--no-tts-cache", action="store_true", help="Desativa o cache de TTS")
+    ap.add_argument("--tts-workers", type=int, default=1, help="Processos de TTS em paralelo (CPU); cada um carrega o modelo uma vez")
+    ap.add_argument("--tts-threads", type=int, default=None, help="Threads do torch por worker de TTS (padrão: núcleos / workers)")
+
+    # Modo streaming: ETAPAS 3-7 sobrepostas (TTS começa antes do fim da transcrição)
+    ap.add_argument("--stream", action="store_true",
+                    help="Sobrepõe ASR, tradução, split, TTS e sync com filas limitadas (só numa execução nova)")
+
+    # Lote: vários vídeos numa execução, cada um com seu workdir; modelos compartilhados
+    ap.add_argument("--batch", default=None,
+                    help="Diretório de vídeos ou manifesto CSV/JSON (colunas: in, out, src, tgt, voice, tts, workdir)")
+    ap.add_argument("--workdir", default="dub_work",
+                    help="Diretório de trabalho (no --batch: raiz, um subdiretório por vídeo)")
+
+    # Instrumentação (sempre no logs.json; trace opcional em JSON-lines)
+    ap.add_argument("--trace", default=None, help="Grava eventos de etapa/segmento/subprocesso em JSON-lines neste arquivo")
 
     # Sistema de CHECKPOINT/RESUME
-    ap.add_argument("--continue", dest="resume", action="store_true", help="Continua do último checkpoint salvo")
-
-    args = ap.parse_args()
-
-    ensure_ffmpeg()
-    workdir = Path("dub_work"); workdir.mkdir(exist_ok=True)
-
-    video_in = Path(args.inp).resolve()
-    if not video_in.exists():
-        print("Arquivo de entrada não encontrado:", video_in); sys.exit(1)
-
-    outdir = Path("dublado")
-    outdir.mkdir(exist_ok=True)
-    out_mp4 = Path(args.out) if args.out else (outdir / video_in.name)
-
-    # CHECKPOINT: Detecta qual etapa continuar
+    # Etapas com a mesma chave (parâmetros + etapas anteriores, ver stages.json) são reutilizadas sempre
+    ap.add_argument("--continue", dest="resume", action="store_true",
+                    help="Workdirs antigos (sem stages.json): continua do checkpoint.json; nos novos a reutilização é automática")
+    ap.add_argument("--force", action="store_true", help="Ignora o stages.json e refaz todas as etapas")
+
+    return ap
+
+def open_shared_resources(args):
+    """Recursos compartilhados entre os jobs: memória de tradução, cache e threads do TTS"""
+    tm = None if args.no_tm else TranslationMemory(args.tm_path, fuzzy=args.tm_fuzzy)
+    tts_cache = None
+    if not args.no_tts_cache:
+        tts_cache = TTSCache(args.tts_cache_dir, max_bytes=args.tts_cache_max_mb * 1024 * 1024)
+    tts_threads = args.tts_threads
+    if args.tts_workers > 1 and not tts_threads:
+        tts_threads = max(1, (os.cpu_count() or 1) // args.tts_workers)
+    return {"tm": tm, "tts_cache": tts_cache, "tts_threads": tts_threads}
+
+def make_job(args, video_in, out_mp4, workdir):
+    """Estado de um vídeo: workdir isolado e etapa inicial (checkpoint)"""
+    workdir = Path(workdir); workdir.mkdir(parents=True, exist_ok=True)
+    out_mp4 = Path(out_mp4)
+    out_mp4.parent.mkdir(parents=True, exist_ok=True)
+
+    # Grafo de etapas: reutiliza tudo que tem a mesma chave (parâmetros + etapas anteriores)
     checkpoint_file = Path(workdir, "checkpoint.json")
-    start_from = 2  # Padrão: começa da etapa 2
-
-    if args.resume and checkpoint_file.exists():
-        import json
+    graph = StageGraph(workdir, force=args.force)
+    specs = stage_specs(args, video_in, out_mp4)
+    had_graph = graph.exists() and not args.force
+    first = graph.plan(specs)
+    start_from = first if first is not None else 11
+
+    if args.resume and not had_graph and checkpoint_file.exists():
+        # Workdir antigo (sem stages.json): continua pelo checkpoint linear
         with open(checkpoint_file, 'r', encoding='utf-8') as f:
             ckpt = json.load(f)
             start_from = ckpt.get("next_step", 2)
@@ -1017,168 +2101,336 @@ def main():
             print(f"  MODO RESUME: Continuando da ETAPA {start_from}")
             print(f"  Última etapa completa: {ckpt.get('last_step', 'Nenhuma')}")
             print(f"{'='*60}\n")
+    elif had_graph:
+        name = {num: name for num, name, _ in specs}.get(start_from)
+        print(f"\n{'='*60}")
+        if start_from > 2:
+            print(f"  [DAG] Reutilizando ETAPAS 2-{min(start_from - 1, 10)} (stages.json)")
+        if name:
+            print(f"  [DAG] Refazendo a partir da ETAPA {start_from}: {graph.reason(name)}")
+        print(f"{'='*60}\n")
+    elif args.force:
+        print("[DAG] --force: refazendo todas as etapas")
+
+    rec = dub_metrics.Recorder(args.trace, job=workdir.name)
+    return {"args": args, "video_in": Path(video_in), "out_mp4": out_mp4,
+            "workdir": workdir, "start_from": start_from, "rec": rec,
+            "graph": graph, "specs": specs}
+
+def run_extract(job):
+    """ETAPA 2 (ffmpeg)"""
+    video_in, workdir, start_from = job["video_in"], job["workdir"], job["start_from"]
+    rec = job["rec"]
 
     # ETAPA 2: Extração de áudio
     audio_src = Path(workdir, "audio_src.wav")
     if start_from <= 2:
         print("\n=== ETAPA 2: Extração de áudio ===")
-        sh(["ffmpeg","-y","-i", str(video_in), "-vn", "-ac","1","-ar","48000","-c:a","pcm_s16le", str(audio_src)])
-        save_checkpoint(workdir, 2, "Extração de áudio")
+        with rec.stage("2_extracao"):
+            sh(["ffmpeg","-y","-i", str(video_in), "-vn", "-ac","1","-ar","48000","-c:a","pcm_s16le", str(audio_src)])
+        stage_done(job, 2, "Extração de áudio", [audio_src])
         start_from = 3
     else:
         print(f"\n[SKIP] ETAPA 2 já completa: {audio_src}")
 
+    job["audio_src"] = audio_src
+    job["start_from"] = start_from
+
+def pause_index_for(job):
+    """
+    Pausas do áudio original (--enable-vad), detectadas uma vez e indexadas (split, sync elastic, onepass)
+    Só na primeira etapa que precisa delas: um resume que reaproveita tudo não relê o audio_src.wav
+    """
+    if "pause_index" not in job:
+        job["pause_index"] = None
+        if job["args"].enable_vad and job["audio_src"].exists():
+            print("\nDetectando pausas naturais no áudio...")
+            with job["rec"].stage("vad_pausas"):
+                job["pause_index"] = dub_audio.PauseIndex(detect_speech_pauses(job["audio_src"], min_silence_dur=0.3))
+    return job["pause_index"]
+
+def run_inference(job, shared):
+    """ETAPAS 3-7 (modelos: ASR, tradução, TTS) + fade/sync"""
+    args, workdir, audio_src = job["args"], job["workdir"], job["audio_src"]
+    start_from = job["start_from"]
+    tm, tts_cache, tts_threads = shared["tm"], shared["tts_cache"], shared["tts_threads"]
+    rec = job["rec"]
+    metrics = {}
+
+    # Duração prevista do TTS (simplificação da ETAPA 4): aprendida dos segments.csv desta voz
+    duration_model = None
+    if not args.no_duration_model:
+        duration_model = DurationModel(args.tts, args.voice, args.tgt)
+        state = "modelo ajustado" if duration_model.trained else "heurística, poucas amostras"
+        print(f"[DURAÇÃO] {duration_model.key}: {duration_model.n} amostras ({state})")
+
     # ETAPA 3: Transcrição
     asr_json = Path(workdir, "asr.json")
     asr_srt = Path(workdir, "asr.srt")
+    trad_json = Path(workdir, "asr_trad.json")
+    trad_srt = Path(workdir, "asr_trad.srt")
 
-    if start_from <= 3:
-        asr_json, asr_srt, segs = transcribe_faster_whisper(audio_src, workdir, args.src)
-        save_checkpoint(workdir, 3, "Transcrição")
+    streamed = None
+    if args.stream and start_from > 3:
+        print("[AVISO] --stream só vale numa execução a partir da ETAPA 3; seguindo em série")
+    elif args.stream and resynth_options(args):
+        print("[AVISO] --resynth-threshold não se aplica ao --stream (TTS e sync por segmento); ignorado")
+    if args.stream and start_from <= 3:
+        with rec.stage("3-7_streaming"):
+            streamed = run_streaming_pipeline(
+                audio_src, workdir, args.src, args.tgt, args.tts, voice=args.voice,
+                text_temp=args.texttemp, wave_temp=args.wavetemp, simplify=(not args.no_simplify),
+                batch_size=args.mt_batch, num_beams=args.mt_beams, tm=tm, maxdur=args.maxdur,
+                pause_index=pause_index_for(job), tts_cache=tts_cache, tts_workers=args.tts_workers,
+                tts_threads=tts_threads, fade=args.fade, sync=args.sync,
+                tolerance=args.tolerance, maxstretch=args.maxstretch,
+                asr_workers=args.asr_workers, asr_threads=args.asr_threads, asr_chunk=args.asr_chunk,
+                duration_model=duration_model)
+        segs, segs_trad = streamed["segs"], streamed["segs_trad"]
+        seg_files, sr_segs = streamed["seg_files"], streamed["sr"]
+        asr_json, asr_srt = streamed["asr_json"], streamed["asr_srt"]
+        trad_json, trad_srt = streamed["trad_json"], streamed["trad_srt"]
+        stage_done(job, 3, "Transcrição (streaming)", [asr_json, asr_srt])
+        stage_done(job, 4, "Tradução (streaming)", [trad_json, trad_srt])
+        stage_done(job, 5, "Split de segmentos (streaming)", [save_split(workdir, segs_trad)])
+        raw_files = [Path(workdir, f"seg_{i:04d}.wav") for i in range(1, len(segs_trad) + 1)]
+        if args.sync == "elastic":
+            # Elastic redistribui tempo entre todos os segmentos: roda na ETAPA 7 normal
+            stage_done(job, 6, "Streaming (ASR -> TTS + fade)", raw_files)
+            start_from = 7
+        else:
+            metrics = calculate_sync_metrics(streamed["sync_info"])
+            stage_done(job, 6, "TTS (streaming)", raw_files)
+            sync_json = save_sync_manifest(workdir, seg_files, streamed["sync_info"], sr_segs)
+            stage_done(job, 7, "Streaming (ASR -> sincronização)", [sync_json] + seg_files)
+            start_from = 8
+    elif start_from <= 3:
+        with rec.stage("3_transcricao"):
+            asr_json, asr_srt, segs = transcribe_faster_whisper(audio_src, workdir, args.src,
+                                                                workers=args.asr_workers, threads=args.asr_threads,
+                                                                chunk_s=args.asr_chunk, pause_index=pause_index_for(job))
+        stage_done(job, 3, "Transcrição", [asr_json, asr_srt])
         start_from = 4
     else:
         print(f"\n[SKIP] ETAPA 3 já completa: {asr_json}")
         # Recarrega segmentos do JSON
-        import json
         with open(asr_json, 'r', encoding='utf-8') as f:
             data = json.load(f)
             # O formato é {"language": "en", "segments": [...]}
             segs = data.get("segments", data) if isinstance(data, dict) else data
+    release_models(args, "whisper")
 
     # ETAPA 4: TRADUÇÃO TÉCNICA
-    trad_json = Path(workdir, "asr_trad.json")
-    trad_srt = Path(workdir, "asr_trad.srt")
-
     if start_from <= 4:
-        segs_trad, trad_json, trad_srt = translate_segments_technical(
-            segs, args.src, args.tgt, workdir,
-            simplify=(not args.no_simplify)
-        )
-        save_checkpoint(workdir, 4, "Tradução")
+        with rec.stage("4_traducao"):
+            segs_trad, trad_json, trad_srt = translate_segments_technical(
+                segs, args.src, args.tgt, workdir,
+                simplify=(not args.no_simplify),
+                batch_size=args.mt_batch, num_beams=args.mt_beams, tm=tm, duration_model=duration_model
+            )
+        stage_done(job, 4, "Tradução", [trad_json, trad_srt])
         start_from = 5
-    else:
+    elif not streamed:
         print(f"\n[SKIP] ETAPA 4 já completa: {trad_json}")
         with open(trad_json, 'r', encoding='utf-8') as f:
-            segs_trad = json.load(f)
-
-    # ETAPA 5: Split com VAD
-    if start_from <= 5:
-        if args.enable_vad:
-            segs_trad = split_long_segments_vad(segs_trad, args.maxdur, audio_src)
-        else:
-            segs_trad = split_long_segments_vad(segs_trad, args.maxdur, None)
-        save_checkpoint(workdir, 5, "Split de segmentos")
-        start_from = 6
-    else:
-        print(f"\n[SKIP] ETAPA 5 já completa (split)")
-
-    # ETAPA 6: TTS
-    seg_1 = Path(workdir, "seg_0001.wav")
-    if start_from <= 6:
-        if args.tts == "bark":
-            seg_files, sr_segs = tts_bark(segs_trad, workdir, text_temp=args.texttemp, wave_temp=args.wavetemp, history_prompt=args.voice)
-        else:
-            seg_files, sr_segs = tts_coqui(segs_trad, workdir, args.tgt, speaker=args.voice)
-        save_checkpoint(workdir, 6, "TTS (geração de áudio)")
-        start_from = 7
+            data = json.load(f)
+            # Mesmo formato do asr.json: {"language": "pt", "segments": [...]}
+            segs_trad = data.get("segments", data) if isinstance(data, dict) else data
+    release_models(args, "m2m100")
+
+    # ETAPA 5: Split com VAD (segments_split.json; workdirs antigos sem ele refazem o split, que é barato)
+    split_saved = None if (start_from <= 5 or streamed) else load_split(workdir)
+    if start_from <= 5 or (not streamed and split_saved is None):
+        if start_from > 5:
+            print(f"\n[AVISO] {SPLIT_FILE} ausente: refazendo o split")
+        with rec.stage("5_split"):
+            segs_trad = split_long_segments_vad(segs_trad, args.maxdur, None, pause_index=pause_index_for(job))
+        split_json = save_split(workdir, segs_trad)
+        if start_from <= 5:
+            stage_done(job, 5, "Split de segmentos", [split_json])
+            start_from = 6
+    elif not streamed:
+        segs_trad = split_saved
+        print(f"\n[SKIP] ETAPA 5 já completa: {Path(workdir, SPLIT_FILE)} ({len(segs_trad)} segmentos)")
+
+    # ETAPA 6: TTS (um seg_XXXX.wav por segmento do split; o manifesto só sintetiza os que faltam)
+    if start_from > 6 and not streamed:
+        seg_files = [Path(workdir, f"seg_{i:04d}.wav") for i in range(1, len(segs_trad) + 1)]
+        missing = [p for p in seg_files if not p.exists()]
+        if missing:
+            print(f"\n[AVISO] {len(missing)} segmento(s) de áudio ausente(s) (ex.: {missing[0].name}): refazendo o TTS")
     else:
-        print(f"\n[SKIP] ETAPA 6 já completa: {seg_1} e outros")
-        # Recarrega seg_files
-        seg_files = sorted(workdir.glob("seg_*.wav"))
+        missing = []
+    if start_from <= 6 or missing:
+        with rec.stage("6_tts"):
+            if args.tts == "bark":
+                seg_files, sr_segs = tts_bark(segs_trad, workdir, text_temp=args.texttemp, wave_temp=args.wavetemp, history_prompt=args.voice, cache=tts_cache,
+                                              workers=args.tts_workers, threads=tts_threads, resynth=resynth_options(args))
+            else:
+                seg_files, sr_segs = tts_coqui(segs_trad, workdir, args.tgt, speaker=args.voice, cache=tts_cache,
+                                               workers=args.tts_workers, threads=tts_threads, resynth=resynth_options(args))
+        if any("text_trad_full" in s for s in segs_trad):
+            # Textos encurtados pela re-síntese: o split gravado passa a refletir o áudio
+            job["graph"].done("5_split", [save_split(workdir, segs_trad)])
+        release_models(args, "m2m100")  # carregado de novo se a re-síntese re-traduziu
+        # Registra a ETAPA 6 sempre que o TTS rodou (também ao refazer segmentos ausentes,
+        # senão o registro do split acima a deixaria sem entrada no stages.json)
+        stage_done(job, 6, "TTS (geração de áudio)", seg_files)
+        start_from = max(start_from, 7)
+    elif not streamed:
+        print(f"\n[SKIP] ETAPA 6 já completa: {len(seg_files)} segmentos ({seg_files[0].name if seg_files else '-'} ...)")
         sr_segs = 24000 if args.tts == "bark" else 22050
 
-    # Fade
-    if args.fade and args.fade > 0:
+    update_duration_model(duration_model, workdir)
+
+    # ETAPA 7 já feita: sync_manifest.json diz quais arquivos a ETAPA 8 usa (sem ele, refaz fade + sync)
+    onepass = args.render == "onepass"
+    sync_saved = None if (start_from <= 7 or streamed) else load_sync_manifest(workdir)
+    if sync_saved and sync_saved.get("files") is None and not onepass:
+        sync_saved = None   # manifesto de um onepass (sem arquivos sincronizados)
+    redo_sync = start_from <= 7 or (not streamed and not onepass and sync_saved is None)
+    if redo_sync and start_from > 7:
+        print(f"\n[AVISO] {SYNC_MANIFEST} ausente ou incompleto: refazendo fade e sincronização")
+
+    # Fade (no modo streaming já aplicado por segmento; no onepass, aplicado na renderização)
+    if redo_sync and args.fade and args.fade > 0 and not streamed and not onepass:
         print("\n=== ETAPA 6.1: Micro-fade ===")
         xf_files = []
-        for i, _ in enumerate(segs_trad, 1):
-            base = Path(workdir, f"seg_{i:04d}.wav")
-            out = Path(workdir, f"seg_{i:04d}_xf.wav")
-            safe_fade(base, out, workdir, args.fade)
-            xf_files.append(out)
+        with rec.stage("6.1_fade"):
+            for i, _ in enumerate(segs_trad, 1):
+                base = Path(workdir, f"seg_{i:04d}.wav")
+                out = Path(workdir, f"seg_{i:04d}_xf.wav")
+                t0 = time.perf_counter()
+                safe_fade(base, out, workdir, args.fade)
+                rec.segment("fade", i, time.perf_counter() - t0)
+                xf_files.append(out)
         seg_files = xf_files
 
     # ETAPA 7: Sincronização
     sync_csv = Path(workdir, "segments.csv")
-    if start_from <= 7:
+    if redo_sync and onepass:
+        print("\n[ONEPASS] Fade e sincronização adiados para a renderização única")
+        start_from = 8
+    elif redo_sync:
         print("\n=== ETAPA 7: Sincronização ===")
-        fixed = []
-        sync_info = []
+        with rec.stage("7_sync"):
+            fixed = []
+            sync_info = []
+
+            if args.sync == "elastic":
+                segments_data = []
+                for i, s in enumerate(segs_trad, 1):
+                    target = max(0.05, s["end"] - s["start"])
+                    p = Path(workdir, f"seg_{i:04d}{'_xf' if (args.fade and args.fade > 0) else ''}.wav")
+                    segments_data.append((p, target, s))
+
+                results = sync_elastic(segments_data, workdir, sr_segs, args.tolerance, args.maxstretch,
+                                       pause_index=pause_index_for(job), total_duration=ffprobe_duration(audio_src))
+                for path, ratio, seg in results:
+                    fixed.append(path)
+                    sync_info.append({
+                        "target": seg["end"] - seg["start"],
+                        "actual": ffprobe_duration(path),
+                        "ratio": ratio
+                    })
+            else:
+                for i, s in enumerate(segs_trad, 1):
+                    target = max(0.05, s["end"] - s["start"])
+                    p = Path(workdir, f"seg_{i:04d}{'_xf' if (args.fade and args.fade > 0) else ''}.wav")
 
-        if args.sync == "elastic":
-            segments_data = []
-            for i, s in enumerate(segs_trad, 1):
-                target = max(0.05, s["end"] - s["start"])
-                p = Path(workdir, f"seg_{i:04d}{'_xf' if (args.fade and args.fade > 0) else ''}.wav")
-                segments_data.append((p, target, s))
-
-            results = sync_elastic(segments_data, workdir, sr_segs, args.tolerance, args.maxstretch)
-            for path, ratio, seg in results:
-                fixed.append(path)
-                sync_info.append({
-                    "target": seg["end"] - seg["start"],
-                    "actual": ffprobe_duration(path),
-                    "ratio": ratio
-                })
-        else:
-            for i, s in enumerate(segs_trad, 1):
-                target = max(0.05, s["end"] - s["start"])
-                p = Path(workdir, f"seg_{i:04d}{'_xf' if (args.fade and args.fade > 0) else ''}.wav")
-
-                if args.sync == "none":
-                    fixed.append(p)
-                    ratio = 1.0
-                elif args.sync == "fit":
-                    synced, ratio = sync_fit(p, target, workdir, sr_segs, args.tolerance, args.maxstretch)
-                    fixed.append(synced)
-                elif args.sync == "pad":
-                    synced, ratio = sync_pad(p, target, workdir, sr_segs)
-                    fixed.append(synced)
-                elif args.sync == "smart":
-                    synced, ratio = sync_smart(p, target, workdir, sr_segs, args.tolerance, args.maxstretch)
+                    t0 = time.perf_counter()
+                    synced, ratio = sync_segment(p, target, args.sync, workdir, sr_segs, args.tolerance, args.maxstretch)
+                    rec.segment("sync", i, time.perf_counter() - t0, ratio=round(ratio, 4))
                     fixed.append(synced)
 
-                sync_info.append({
-                    "target": target,
-                    "actual": ffprobe_duration(fixed[-1]),
-                    "ratio": ratio
-                })
+                    sync_info.append({
+                        "target": target,
+                        "actual": ffprobe_duration(fixed[-1]),
+                        "ratio": ratio
+                    })
 
         seg_files = fixed
         metrics = calculate_sync_metrics(sync_info)
-        save_checkpoint(workdir, 7, "Sincronização")
-        start_from = 8
-    else:
-        print(f"\n[SKIP] ETAPA 7 já completa (sincronização)")
-        # Recarrega arquivos sincronizados
-        fixed = sorted(workdir.glob("seg_*_sync.wav"))
-        if not fixed:
-            fixed = sorted(workdir.glob("seg_*.wav"))
-        seg_files = fixed
-        metrics = {}
+        sync_json = save_sync_manifest(workdir, fixed, sync_info, sr_segs)
+        if start_from <= 7:
+            stage_done(job, 7, "Sincronização", [sync_json] + fixed)
+            start_from = 8
+    elif not streamed:
+        print(f"\n[SKIP] ETAPA 7 já completa: {Path(workdir, SYNC_MANIFEST)}")
+        if sync_saved:
+            if sync_saved.get("files") is not None:
+                seg_files = sync_saved["files"]
+            sr_segs = sync_saved.get("sr") or sr_segs
+            metrics = calculate_sync_metrics(sync_saved["sync_info"]) if sync_saved.get("sync_info") else {}
+
+    job.update(start_from=start_from, segs_trad=segs_trad, seg_files=seg_files, sr_segs=sr_segs,
+               metrics=metrics, streamed=streamed, asr_json=asr_json, asr_srt=asr_srt,
+               trad_json=trad_json, trad_srt=trad_srt)
+
+def run_finish(job, shared):
+    """ETAPAS 8-10 (concatenação, pós-processo e mux: ffmpeg) + logs"""
+    args, workdir, audio_src = job["args"], job["workdir"], job["audio_src"]
+    video_in, out_mp4, start_from = job["video_in"], job["out_mp4"], job["start_from"]
+    segs_trad, seg_files, sr_segs = job["segs_trad"], job["seg_files"], job["sr_segs"]
+    metrics, streamed = job["metrics"], job["streamed"]
+    asr_json, asr_srt, trad_json, trad_srt = job["asr_json"], job["asr_srt"], job["trad_json"], job["trad_srt"]
+    tm, tts_cache = shared["tm"], shared["tts_cache"]
+    rec = job["rec"]
+
+    # ETAPAS 6.1-9 numa passada (--render onepass)
+    if args.render == "onepass" and start_from <= 9:
+        if streamed:
+            # Segmentos do --stream já têm fade (e sync, exceto no elastic)
+            files, fade, sync = seg_files, 0.0, ("elastic" if args.sync == "elastic" else "none")
+        else:
+            files = [Path(workdir, f"seg_{i:04d}.wav") for i in range(1, len(segs_trad) + 1)]
+            fade, sync = args.fade, args.sync
+        with rec.stage("6.1-9_onepass"):
+            # Loudnorm medido precisa do dub_raw.wav inteiro antes: a renderização grava e a ETAPA 9 mede
+            measured = args.loudnorm == "measured"
+            dub_final, sync_info = render_onepass(files, segs_trad, workdir, sr_segs, args.rate, fade=fade,
+                                                  sync=sync, tol=args.tolerance, maxstretch=args.maxstretch,
+                                                  total_duration=ffprobe_duration(audio_src),
+                                                  postprocess=not measured, dump=args.render_dump,
+                                                  pause_index=pause_index_for(job) if sync == "elastic" else None)
+            if measured:
+                dub_final = postprocess_audio(dub_final, workdir, args.rate, loudnorm="measured")
+        if sync != "none":
+            metrics = calculate_sync_metrics(sync_info)
+        if not streamed or sync != "none":
+            # No --stream sem elastic o manifesto já veio da sincronização por segmento
+            save_sync_manifest(workdir, None, sync_info, sr_segs)
+        stage_done(job, 7, "Sincronização (onepass)", [Path(workdir, SYNC_MANIFEST)])
+        stage_done(job, 8, "Linha do tempo (onepass)", [dub_final])
+        stage_done(job, 9, "Renderização única (fade + sync + concat + pós-processo)", [dub_final])
+        start_from = 10
 
     # ETAPA 8: Concatenação
     dub_raw = Path(workdir, "dub_raw.wav")
     if start_from <= 8:
-        dub_raw = concat_segments(seg_files, workdir, sr_segs, segs_trad=segs_trad, preserve_gaps=args.preserve_gaps, gap_min=args.gap_min)
-        save_checkpoint(workdir, 8, "Concatenação")
+        with rec.stage("8_concat"):
+            dub_raw = concat_segments(seg_files, workdir, sr_segs, segs_trad=segs_trad, preserve_gaps=args.preserve_gaps, gap_min=args.gap_min,
+                                      render=args.render, total_duration=ffprobe_duration(audio_src))
+        stage_done(job, 8, "Concatenação", [dub_raw])
         start_from = 9
-    else:
+    elif args.render != "onepass":
         print(f"\n[SKIP] ETAPA 8 já completa: {dub_raw}")
 
     # ETAPA 9: Pós-processamento
     dub_final = Path(workdir, "dub_final.wav")
     if start_from <= 9:
-        dub_final = postprocess_audio(dub_raw, workdir, args.rate)
-        save_checkpoint(workdir, 9, "Pós-processamento")
+        with rec.stage("9_posprocesso"):
+            dub_final = postprocess_audio(dub_raw, workdir, args.rate, loudnorm=args.loudnorm)
+        stage_done(job, 9, "Pós-processamento", [dub_final])
         start_from = 10
-    else:
+    elif args.render != "onepass":
         print(f"\n[SKIP] ETAPA 9 já completa: {dub_final}")
 
     # ETAPA 10: Mux final
     if start_from <= 10:
-        mux_video(video_in, dub_final, out_mp4, args.bitrate)
-        save_checkpoint(workdir, 10, "Mux final - COMPLETO")
+        with rec.stage("10_mux"):
+            mux_video(video_in, dub_final, out_mp4, args.bitrate)
+        stage_done(job, 10, "Mux final - COMPLETO", [out_mp4])
     else:
         print(f"\n[SKIP] ETAPA 10 já completa: {out_mp4}")
 
@@ -1195,11 +2447,20 @@ def main():
         "sync": args.sync, "tolerance": args.tolerance, "maxstretch": args.maxstretch,
         "maxdur": args.maxdur, "texttemp": args.texttemp, "wavetemp": args.wavetemp,
         "fade": args.fade, "preserve_gaps": args.preserve_gaps, "gap_min": args.gap_min,
+        "render": args.render, "render_dump": args.render_dump, "loudnorm": args.loudnorm,
         "vad_enabled": args.enable_vad,
         "technical_mode": True,
         "simplify_enabled": not args.no_simplify,
-        "sync_metrics": metrics
+        "mt_batch": args.mt_batch, "mt_beams": args.mt_beams,
+        "asr_workers": args.asr_workers, "asr_chunk": args.asr_chunk,
+        "stream": streamed["stats"] if streamed else None,
+        "sync_metrics": metrics,
+        "tts_cache": dict(tts_cache.stats, dir=str(tts_cache.root)) if tts_cache else None,
+        "translation_memory": dict(tm.stats, path=str(tm.path)) if tm else None,
+        "model_load_s": dict(dub_models.LOAD_TIMES),
+        "instrumentation": rec.summary()
     }
+    rec.close()
     with open(Path(workdir, "logs.json"), "w", encoding="utf-8") as f:
         json.dump(logs, f, ensure_ascii=False, indent=2)
 
@@ -1212,5 +2473,181 @@ def main():
     print(f"  Arquivos intermediários: {workdir}")
     print("="*70)
 
+# ---------------- LOTE ----------------
+VIDEO_EXTS = (".mp4", ".mkv", ".mov", ".webm", ".avi", ".m4v")
+BATCH_OVERRIDES = ("src", "tgt", "voice", "tts")
+
+def load_batch_manifest(spec):
+    """Linhas do lote: diretório de vídeos, CSV (cabeçalho) ou JSON (lista ou {"jobs": [...]})"""
+    spec = Path(spec)
+    if spec.is_dir():
+        return [{"in": str(f)} for f in sorted(spec.iterdir()) if f.suffix.lower() in VIDEO_EXTS]
+    if spec.suffix.lower() == ".json":
+        with open(spec, "r", encoding="utf-8") as f:
+            data = json.load(f)
+        rows = data.get("jobs", []) if isinstance(data, dict) else data
+    elif spec.suffix.lower() == ".csv":
+        with open(spec, "r", encoding="utf-8", newline="") as f:
+            rows = [{k.strip(): (v or "").strip() for k, v in r.items() if k} for r in csv.DictReader(f)]
+    else:
+        raise ValueError(f"Lote não suportado (use diretório, .csv ou .json): {spec}")
+    # Caminhos relativos são relativos ao manifesto
+    for r in rows:
+        for key in ("in", "out", "workdir"):
+            if r.get(key) and not Path(r[key]).is_absolute():
+                r[key] = str(spec.parent / r[key])
+    return rows
+
+def make_batch_jobs(args):
+    import copy
+    rows = load_batch_manifest(args.batch)
+    jobs, used = [], set()
+    for row in rows:
+        if not row.get("in"):
+            print(f"[AVISO] Linha do lote sem 'in', ignorando: {row}")
+            continue
+        job_args = copy.copy(args)
+        for key in BATCH_OVERRIDES:
+            if row.get(key):
+                setattr(job_args, key, row[key])
+        video_in = Path(row["in"]).resolve()
+        # Um workdir por vídeo (nomes repetidos ganham sufixo)
+        name = re.sub(r"[^\w.-]+", "_", video_in.stem) or "video"
+        stem, n = name, 2
+        while name in used:
+            name = f"{stem}_{n}"; n += 1
+        used.add(name)
+        workdir = row.get("workdir") or Path(args.workdir, name)
+        out_mp4 = row.get("out") or Path("dublado", name + video_in.suffix)
+        jobs.append({"video_in": video_in, "out_mp4": out_mp4, "workdir": workdir, "args": job_args})
+    # Dois jobs no mesmo arquivo de saída ou workdir se sobrescreveriam
+    for key in ("out_mp4", "workdir"):
+        seen = {}
+        for job in jobs:
+            path = Path(job[key]).resolve()
+            if path in seen:
+                raise ValueError(f"Lote com {'out' if key == 'out_mp4' else key} repetido: {path} "
+                                 f"({seen[path].name} e {job['video_in'].name})")
+            seen[path] = job["video_in"]
+    return jobs
+
+def run_batch(args, shared):
+    """
+    Executa o lote com duas "faixas":
+    - thread principal: inferência (ETAPAS 3-7), um vídeo por vez, modelos residentes (dub_models)
+    - faixa ffmpeg (1 thread): extração do próximo vídeo e ETAPAS 8-10 do anterior
+    Assim o ffmpeg de um vídeo roda enquanto os modelos trabalham no outro
+    """
+    import time
+    from concurrent.futures import ThreadPoolExecutor
+
+    try:
+        specs = make_batch_jobs(args)
+    except ValueError as e:
+        print(f"[ERRO] {e}")
+        return False
+    print(f"\n=== LOTE: {len(specs)} vídeo(s) de {args.batch} ===")
+    report = []
+    pending = []  # (registro, future das ETAPAS 8-10)
+
+    def prepare(spec):
+        if not spec["video_in"].exists():
+            raise FileNotFoundError(f"Arquivo de entrada não encontrado: {spec['video_in']}")
+        job = make_job(spec["args"], spec["video_in"], spec["out_mp4"], spec["workdir"])
+        run_extract(job)
+        return job
+
+    with ThreadPoolExecutor(max_workers=1, thread_name_prefix="dublar-ffmpeg") as lane:
+        prepared = lane.submit(prepare, specs[0]) if specs else None
+        for i, spec in enumerate(specs):
+            entry = {"in": str(spec["video_in"]), "out": str(spec["out_mp4"]),
+                     "workdir": str(spec["workdir"]), "status": "ok", "error": None}
+            report.append(entry)
+            t0 = time.time()
+            try:
+                job = prepared.result()
+            except Exception as e:
+                job = None
+                entry.update(status="erro", error=f"ETAPA 2: {e}")
+            # Extração do próximo vídeo entra na faixa enquanto este faz inferência
+            prepared = lane.submit(prepare, specs[i + 1]) if i + 1 < len(specs) else None
+            if job is None:
+                print(f"[ERRO] {spec['video_in'].name}: {entry['error']}")
+                continue
+
+            print(f"\n{'#'*70}\n  LOTE [{i+1}/{len(specs)}] {spec['video_in'].name} -> {job['workdir']}\n{'#'*70}")
+            try:
+                run_inference(job, shared)
+            except Exception as e:
+                job["rec"].close()
+                entry.update(status="erro", error=f"inferência: {e}")
+                print(f"[ERRO] {spec['video_in'].name}: {entry['error']}")
+                continue
+            entry["inference_s"] = round(time.time() - t0, 2)
+            pending.append((entry, lane.submit(run_finish, job, shared)))
+
+        # Último vídeo já passou pela inferência: os modelos não servem mais às ETAPAS 8-10
+        close_asr_pools()
+        close_tts_pools()
+        dub_models.release()
+        for entry, fut in pending:
+            try:
+                fut.result()
+            except Exception as e:
+                entry.update(status="erro", error=f"ETAPAS 8-10: {e}")
+
+    report_path = Path(args.workdir, "batch_report.json")
+    report_path.parent.mkdir(parents=True, exist_ok=True)
+    with open(report_path, "w", encoding="utf-8") as f:
+        json.dump({"batch": str(args.batch), "jobs": report,
+                   "model_load_s": dict(dub_models.LOAD_TIMES)}, f, ensure_ascii=False, indent=2)
+
+    failed = [r for r in report if r["status"] != "ok"]
+    print("\n" + "="*70)
+    print(f"  LOTE CONCLUÍDO: {len(report) - len(failed)}/{len(report)} vídeo(s) dublado(s)")
+    for r in failed:
+        print(f"  [ERRO] {Path(r['in']).name}: {r['error']}")
+    print(f"  Relatório: {report_path}")
+    print("="*70)
+    return not failed
+
+def main():
+    print("="*70)
+    print("  PIPELINE DE DUBLAGEM TÉCNICA v2.0")
+    print("  Otimizado para vídeos de demonstração técnica e programação")
+    print("="*70)
+    print("\n=== ETAPA 1: Entrada/cheques ===")
+
+    ap = build_arg_parser()
+    args = ap.parse_args()
+    if not args.inp and not args.batch:
+        ap.error("informe --in (um vídeo) ou --batch (diretório/manifesto)")
+
+    global AUDIO_ENGINE
+    AUDIO_ENGINE = args.audio_engine
+
+    ensure_ffmpeg()
+    shared = open_shared_resources(args)
+    try:
+        if args.batch:
+            if not run_batch(args, shared):
+                sys.exit(1)
+            return
+
+        video_in = Path(args.inp).resolve()
+        if not video_in.exists():
+            print("Arquivo de entrada não encontrado:", video_in); sys.exit(1)
+
+        outdir = Path("dublado")
+        out_mp4 = Path(args.out) if args.out else (outdir / video_in.name)
+
+        job = make_job(args, video_in, out_mp4, args.workdir)
+        run_extract(job)
+        run_inference(job, shared)
+        run_finish(job, shared)
+    finally:
+        close_tts_pools()
+        close_asr_pools()
+
 if __name__ == "__main__":
     main()